@@ -0,0 +1,121 @@
+import os
+import json
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# --- Pricing ---
+# USD per million tokens (input, output). Override or extend with the
+# MODEL_PRICES environment variable, e.g. '{"gemini-1.5-pro": [1.25, 5.0]}'.
+DEFAULT_MODEL_PRICES = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.5-pro": (1.25, 5.00),
+}
+MODEL_PRICES = {**DEFAULT_MODEL_PRICES, **{k: tuple(v) for k, v in json.loads(os.getenv("MODEL_PRICES", "{}")).items()}}
+
+# --- Budgets ---
+# Daily limits on AI grading, as JSON in GRADING_BUDGETS. Global limits apply
+# to all grading; per-subject and per-assignment limits to that scope only:
+#   {"dailyTokens": 2000000, "dailyCostUsd": 20,
+#    "subjects": {"<subject id>": {"dailyTokens": 200000}},
+#    "assignments": {"<assignment id>": {"dailyCostUsd": 1.5}}}
+GRADING_BUDGETS: Dict[str, Any] = json.loads(os.getenv("GRADING_BUDGETS", "{}"))
+
+GROUP_FIELDS = {"day": "day", "subject": "subjectId", "assignment": "assignmentId", "model": "model"}
+TOTAL_FIELDS = ("gradings", "calls", "inputTokens", "outputTokens", "imageBytes", "latencyMs", "costUsd")
+
+
+def _model_key(model: str) -> str:
+    return model[len("models/"):] if model.startswith("models/") else model
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimated cost in USD of a model call (0 for models without a known price)."""
+    input_price, output_price = MODEL_PRICES.get(_model_key(model), (0.0, 0.0))
+    return round((input_tokens * input_price + output_tokens * output_price) / 1_000_000, 6)
+
+def today() -> str:
+    return date.today().isoformat()
+
+def _totals(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    totals = {field: 0 for field in TOTAL_FIELDS}
+    for record in records:
+        for field in TOTAL_FIELDS:
+            totals[field] += record.get(field, 0)
+    totals["latencyMs"] = round(totals["latencyMs"], 3)
+    totals["costUsd"] = round(totals["costUsd"], 6)
+    return totals
+
+def _over_limit(limits: Dict[str, Any], records: List[Dict[str, Any]]) -> Optional[str]:
+    totals = _totals(records)
+    if "dailyTokens" in limits and totals["inputTokens"] + totals["outputTokens"] >= limits["dailyTokens"]:
+        return f"daily token budget of {limits['dailyTokens']} reached"
+    if "dailyCostUsd" in limits and totals["costUsd"] >= limits["dailyCostUsd"]:
+        return f"daily cost budget of ${limits['dailyCostUsd']} reached"
+    if "dailyGradings" in limits and totals["gradings"] >= limits["dailyGradings"]:
+        return f"daily grading budget of {limits['dailyGradings']} reached"
+    return None
+
+def check_budget(subject_id: Optional[str] = None, assignment_id: Optional[str] = None) -> Optional[str]:
+    """Return why AI grading is over budget today for this scope, or None if it may proceed."""
+    if not GRADING_BUDGETS:
+        return None
+
+    records = [r for r in db.get_usage_records() if r.get("day") == today()]
+    reason = _over_limit(GRADING_BUDGETS, records)
+    if reason:
+        return reason
+    if subject_id and subject_id in GRADING_BUDGETS.get("subjects", {}):
+        reason = _over_limit(GRADING_BUDGETS["subjects"][subject_id], [r for r in records if r.get("subjectId") == subject_id])
+        if reason:
+            return f"Subject {subject_id}: {reason}"
+    if assignment_id and assignment_id in GRADING_BUDGETS.get("assignments", {}):
+        reason = _over_limit(GRADING_BUDGETS["assignments"][assignment_id], [r for r in records if r.get("assignmentId") == assignment_id])
+        if reason:
+            return f"Assignment {assignment_id}: {reason}"
+    return None
+
+def seconds_until_tomorrow() -> int:
+    """Seconds until budgets reset at local midnight."""
+    now = datetime.now()
+    return int((datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now).total_seconds()) + 1
+
+def record_usage(usage: Dict[str, Any], subject_id: Optional[str] = None, assignment_id: Optional[str] = None,
+                 submission_id: Optional[str] = None) -> Dict[str, Any]:
+    """Price a grading job's usage and add it to the ledger (and to the submission, if known)."""
+    if usage.get("tiers"):
+        # Cascade: every tier is priced at its own model's rates.
+        usage["costUsd"] = round(sum(tier.get("costUsd", 0.0) for tier in usage["tiers"]), 6)
+    else:
+        usage["costUsd"] = estimate_cost(usage.get("model", ""), usage.get("inputTokens", 0), usage.get("outputTokens", 0))
+    try:
+        db.record_grading_usage(usage, today(), subject_id, assignment_id, submission_id)
+    except Exception as e:
+        # Accounting must never fail a grade that has already been paid for.
+        logger.error(f"Accounting - Could not record usage: {e}", exc_info=True)
+    return usage
+
+def usage_report(group_by: List[str], start: Optional[str] = None, end: Optional[str] = None,
+                 subject_id: Optional[str] = None, assignment_id: Optional[str] = None) -> Dict[str, Any]:
+    """Aggregate the usage ledger by any of day/subject/assignment/model within a date range."""
+    records = [
+        r for r in db.get_usage_records()
+        if (start is None or r.get("day", "") >= start)
+        and (end is None or r.get("day", "") <= end)
+        and (subject_id is None or r.get("subjectId") == subject_id)
+        and (assignment_id is None or r.get("assignmentId") == assignment_id)
+    ]
+
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for record in records:
+        key = tuple(record.get(GROUP_FIELDS[field]) for field in group_by)
+        groups.setdefault(key, []).append(record)
+
+    rows = [
+        {**{GROUP_FIELDS[field]: value for field, value in zip(group_by, key)}, **_totals(group)}
+        for key, group in sorted(groups.items(), key=lambda item: tuple(str(v) for v in item[0]))
+    ]
+    return {"groupBy": group_by, "start": start, "end": end, "rows": rows, "totals": _totals(records), "budgets": GRADING_BUDGETS}
@@ -0,0 +1,293 @@
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import database as db
+
+# --- Grade Analytics ---
+# Grades are gathered once into flat NumPy arrays (percent of max grade,
+# submission time, student/assignment codes) and every statistic is computed
+# with vectorized operations over those columns. Results are cached per scope
+# and dropped when database.py reports a write that affects that scope.
+
+# Same ranges as the frontend's AssignmentAnalyzer (upper bounds inclusive).
+DISTRIBUTION_EDGES = np.array([50, 60, 70, 80, 90])
+DISTRIBUTION_LABELS = ["0-50", "51-60", "61-70", "71-80", "81-90", "91-100"]
+PERCENTILES = (10, 25, 50, 75, 90)
+PASSING_PERCENT = 60
+
+SECONDS_PER_DAY = 86400
+# 1970-01-05 was a Monday, so weeks counted from it start on Mondays.
+WEEK_ORIGIN_DAYS = 4
+
+
+def _is_graded(submission: Dict[str, Any]) -> bool:
+    return submission.get("grade") is not None and submission.get("status") == "graded"
+
+
+class _Columns:
+    """Graded submissions of a scope as parallel NumPy arrays."""
+
+    def __init__(self, assignments: List[Dict[str, Any]], student_id: Optional[str] = None):
+        percent, submitted, students, assignment_index = [], [], [], []
+        self.assignments = assignments
+        self.student_names: Dict[str, str] = {}
+        for index, assignment in enumerate(assignments):
+            max_grade = assignment.get("maxGrade") or 100
+            for submission in assignment.get("submissions") or []:
+                if not _is_graded(submission):
+                    continue
+                if student_id is not None and submission.get("studentId") != student_id:
+                    continue
+                percent.append(submission["grade"] * 100.0 / max_grade)
+                submitted.append(_timestamp(submission.get("submittedAt")))
+                students.append(submission.get("studentId"))
+                assignment_index.append(index)
+                self.student_names.setdefault(submission.get("studentId"), submission.get("studentName"))
+
+        self.percent = np.asarray(percent, dtype=np.float64)
+        self.submitted = np.asarray(submitted, dtype=np.float64)
+        self.assignment = np.asarray(assignment_index, dtype=np.int64)
+        self.student_ids, self.student = np.unique(np.asarray(students, dtype=object).astype(str), return_inverse=True) \
+            if students else (np.array([], dtype=str), np.array([], dtype=np.int64))
+
+
+def _timestamp(value: Optional[str]) -> float:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _round(value: float, digits: int = 2) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _group_means(codes: np.ndarray, values: np.ndarray, groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    counts = np.bincount(codes, minlength=groups)
+    sums = np.bincount(codes, weights=values, minlength=groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return counts, sums / counts
+
+
+def summarize(percent: np.ndarray) -> Dict[str, Any]:
+    """Count, mean, spread, percentiles, pass rate and distribution of grades (in percent)."""
+    count = int(percent.size)
+    distribution = np.bincount(np.digitize(percent, DISTRIBUTION_EDGES, right=True), minlength=len(DISTRIBUTION_LABELS))
+    summary: Dict[str, Any] = {
+        "count": count,
+        "distribution": [{"name": name, "count": int(n)} for name, n in zip(DISTRIBUTION_LABELS, distribution)],
+    }
+    if not count:
+        return {**summary, "mean": None, "stdDev": None, "min": None, "max": None,
+                "percentiles": {f"p{p}": None for p in PERCENTILES}, "passRate": None}
+
+    percentiles = np.percentile(percent, PERCENTILES)
+    return {
+        **summary,
+        "mean": _round(percent.mean()),
+        "stdDev": _round(percent.std()),
+        "min": _round(percent.min()),
+        "max": _round(percent.max()),
+        "percentiles": {f"p{p}": _round(v) for p, v in zip(PERCENTILES, percentiles)},
+        "passRate": _round(np.count_nonzero(percent >= PASSING_PERCENT) * 100.0 / count),
+    }
+
+
+def weekly_averages(columns: _Columns) -> List[Dict[str, Any]]:
+    """Average grade per calendar week (Monday start) of submission."""
+    known = ~np.isnan(columns.submitted)
+    if not known.any():
+        return []
+    days = np.floor(columns.submitted[known] / SECONDS_PER_DAY).astype(np.int64)
+    weeks = (days - WEEK_ORIGIN_DAYS) // 7
+    unique_weeks, codes = np.unique(weeks, return_inverse=True)
+    counts, means = _group_means(codes, columns.percent[known], unique_weeks.size)
+    starts = (unique_weeks * 7 + WEEK_ORIGIN_DAYS).astype("datetime64[D]")
+    return [
+        {"week": str(start), "count": int(n), "mean": _round(mean)}
+        for start, n, mean in zip(starts, counts, means)
+    ]
+
+
+def student_trends(columns: _Columns) -> List[Dict[str, Any]]:
+    """
+    Per-student average and trend: the least-squares slope of grade over time,
+    in percentage points per week, fitted for all students at once from
+    per-student sums.
+    """
+    groups = columns.student_ids.size
+    if not groups:
+        return []
+    known = ~np.isnan(columns.submitted)
+    codes = columns.student[known]
+    x = columns.submitted[known] / (7 * SECONDS_PER_DAY)
+    y = columns.percent[known]
+    # Centre x to keep the sums well conditioned.
+    x = x - (x.mean() if x.size else 0.0)
+
+    n = np.bincount(codes, minlength=groups)
+    sx = np.bincount(codes, weights=x, minlength=groups)
+    sy = np.bincount(codes, weights=y, minlength=groups)
+    sxx = np.bincount(codes, weights=x * x, minlength=groups)
+    sxy = np.bincount(codes, weights=x * y, minlength=groups)
+    denominator = n * sxx - sx * sx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where((n >= 2) & (np.abs(denominator) > 1e-9), (n * sxy - sx * sy) / denominator, np.nan)
+
+    counts, means = _group_means(columns.student, columns.percent, groups)
+    return [
+        {
+            "studentId": student_id,
+            "studentName": columns.student_names.get(student_id),
+            "count": int(count),
+            "mean": _round(mean),
+            "trendPerWeek": _round(trend, 3),
+        }
+        for student_id, count, mean, trend in zip(columns.student_ids.tolist(), counts, means, slope)
+    ]
+
+
+def assignment_breakdown(columns: _Columns) -> List[Dict[str, Any]]:
+    """Average grade per assignment, ordered by due date."""
+    counts, means = _group_means(columns.assignment, columns.percent, len(columns.assignments))
+    rows = [
+        {
+            "assignmentId": assignment.get("id"),
+            "title": assignment.get("title"),
+            "subjectId": assignment.get("subjectId"),
+            "dueDate": assignment.get("dueDate"),
+            "count": int(count),
+            "mean": _round(mean),
+        }
+        for assignment, count, mean in zip(columns.assignments, counts, means)
+    ]
+    return sorted(rows, key=lambda row: row["dueDate"] or "")
+
+
+# --- Scopes ---
+def _assignment_analytics(assignment_id: str) -> Optional[Dict[str, Any]]:
+    assignment = db.get_assignment_by_id(assignment_id)
+    if not assignment:
+        return None
+    columns = _Columns([assignment])
+    submissions = assignment.get("submissions") or []
+    # Share of graded submissions that were appealed; only graded work can be appealed.
+    graded = [s for s in submissions if _is_graded(s)]
+    appeals = sum(1 for s in graded if s.get("appeal"))
+    return {
+        "scope": "assignment",
+        "assignmentId": assignment_id,
+        "subjectId": assignment.get("subjectId"),
+        "submissions": len(submissions),
+        "appealRate": _round(appeals * 100.0 / len(graded)) if graded else None,
+        **summarize(columns.percent),
+        "overTime": weekly_averages(columns),
+    }
+
+
+def _subject_analytics(subject_id: str) -> Optional[Dict[str, Any]]:
+    assignments = db.get_assignments_for_subject(subject_id)
+    if not assignments and not db.get_subject_by_id(subject_id):
+        return None
+    columns = _Columns(assignments)
+    return {
+        "scope": "subject",
+        "subjectId": subject_id,
+        **summarize(columns.percent),
+        "overTime": weekly_averages(columns),
+        "assignments": assignment_breakdown(columns),
+        "students": student_trends(columns),
+    }
+
+
+def _student_analytics(student_id: str) -> Optional[Dict[str, Any]]:
+    assignments = [
+        a for a in db.get_assignments()
+        if any(s.get("studentId") == student_id for s in a.get("submissions") or [])
+    ]
+    if not assignments and not db.get_user_by_id(student_id):
+        return None
+    columns = _Columns(assignments, student_id=student_id)
+    trend = student_trends(columns)
+    subject_ids = np.asarray([a.get("subjectId") or "" for a in assignments], dtype=object).astype(str)
+    subjects, subject_codes = np.unique(subject_ids[columns.assignment], return_inverse=True) \
+        if columns.assignment.size else (np.array([], dtype=str), np.array([], dtype=np.int64))
+    counts, means = _group_means(subject_codes, columns.percent, subjects.size)
+    return {
+        "scope": "student",
+        "studentId": student_id,
+        **summarize(columns.percent),
+        "trendPerWeek": trend[0]["trendPerWeek"] if trend else None,
+        "overTime": weekly_averages(columns),
+        "subjects": [
+            {"subjectId": subject, "count": int(count), "mean": _round(mean)}
+            for subject, count, mean in zip(subjects.tolist(), counts, means)
+        ],
+        "assignments": assignment_breakdown(columns),
+    }
+
+
+# --- Cache ---
+_SCOPES: Dict[str, Callable[[str], Optional[Dict[str, Any]]]] = {
+    "assignment": _assignment_analytics,
+    "subject": _subject_analytics,
+    "student": _student_analytics,
+}
+
+# Writes that can change a grade in the affected assignment, subject and student.
+GRADE_EVENTS = {"submission.created", "submission.graded", "appeal.created", "appeal.reviewed"}
+
+# Collections the results are computed from. Events only cover this process's
+# writes; writes by another worker or the bulk import CLI are found through
+# their external write counts and clear the whole cache.
+SOURCES = ("assignments", "users")
+
+_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_cache_lock = threading.Lock()
+_generation = 0
+_external: Optional[Tuple[int, ...]] = None
+
+
+def get_analytics(scope: str, scope_id: str) -> Optional[Dict[str, Any]]:
+    """Analytics for an assignment, subject or student; None if it doesn't exist."""
+    global _generation, _external
+    key = (scope, scope_id)
+    external = tuple(db.VERSIONS.external_writes(name) for name in SOURCES)
+    with _cache_lock:
+        if external != _external:
+            _generation += 1
+            _cache.clear()
+            _external = external
+        cached = _cache.get(key)
+        generation = _generation
+    if cached is not None:
+        return cached
+
+    result = _SCOPES[scope](scope_id)
+    if result is not None:
+        result["computedAt"] = datetime.now().isoformat()
+        with _cache_lock:
+            # Skip caching if a write landed while we were computing.
+            if generation == _generation:
+                _cache[key] = result
+    return result
+
+
+def invalidate(event_type: str, data: Dict[str, Any]) -> None:
+    """Drop cached results affected by a database write."""
+    global _generation
+    with _cache_lock:
+        if event_type in GRADE_EVENTS:
+            _generation += 1
+            for key in (("assignment", data.get("assignmentId")), ("subject", data.get("subjectId")), ("student", data.get("studentId"))):
+                _cache.pop(key, None)
+        elif event_type.startswith(("assignment.", "user.")):
+            # May move an assignment between subjects or rename students.
+            _generation += 1
+            _cache.clear()
+
+
+db.subscribe(invalidate)
@@ -0,0 +1,149 @@
+import io
+import os
+import re
+import csv
+import json
+import logging
+import zipfile
+from datetime import datetime
+from typing import List, Dict, Any, Iterator
+from blobstore import BlobStore, key_from_url
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FIELDS = [
+    "studentId", "studentName", "submissionId", "submittedAt", "status",
+    "grade", "maxGrade", "feedback", "appealStatus", "files", "missingFiles",
+]
+
+
+class _StreamBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable sink for zipfile. Whatever zipfile writes is held
+    only until the next drain(), so memory use is bounded by one file chunk.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def safe_name(name: str, fallback: str = "unnamed") -> str:
+    """Make a string safe to use as a file or folder name inside the archive."""
+    cleaned = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", name or "").strip(" .")
+    return cleaned or fallback
+
+def _student_folders(submissions: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Map student IDs to folder names, disambiguating students who share a name."""
+    names: Dict[str, str] = {}
+    for submission in submissions:
+        names.setdefault(submission.get("studentId", ""), safe_name(submission.get("studentName", ""), "unknown student"))
+
+    counts: Dict[str, int] = {}
+    for name in names.values():
+        counts[name] = counts.get(name, 0) + 1
+
+    return {
+        student_id: name if counts[name] == 1 else f"{name} ({safe_name(student_id)})"
+        for student_id, name in names.items()
+    }
+
+def _manifest_csv(rows: List[Dict[str, Any]]) -> str:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=MANIFEST_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({**row, "files": ";".join(row["files"]), "missingFiles": ";".join(row["missingFiles"])})
+    return output.getvalue()
+
+def iter_submissions_archive(store: BlobStore, assignment: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    Stream a ZIP of every submission file of an assignment, one folder per
+    student, followed by manifest.json and manifest.csv with grades and feedback.
+
+    Files are stored uncompressed (student uploads are already-compressed images
+    and PDFs) and copied chunk by chunk, so the archive is never held in memory.
+    """
+    submissions = assignment.get("submissions") or []
+    folders = _student_folders(submissions)
+    attempts: Dict[str, int] = {}
+    for submission in submissions:
+        attempts[submission.get("studentId", "")] = attempts.get(submission.get("studentId", ""), 0) + 1
+
+    buffer = _StreamBuffer()
+    timestamp = datetime.now().timetuple()[:6]
+    manifest: List[Dict[str, Any]] = []
+    seen: Dict[str, int] = {}
+
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for submission in submissions:
+            student_id = submission.get("studentId", "")
+            folder = folders[student_id]
+            seen[student_id] = seen.get(student_id, 0) + 1
+            if attempts[student_id] > 1:
+                folder = f"{folder}/attempt-{seen[student_id]}"
+
+            appeal = submission.get("appeal") or {}
+            row = {
+                "studentId": student_id,
+                "studentName": submission.get("studentName", ""),
+                "submissionId": submission.get("id", ""),
+                "submittedAt": submission.get("submittedAt", ""),
+                "status": submission.get("status", ""),
+                "grade": submission.get("grade"),
+                "maxGrade": assignment.get("maxGrade"),
+                "feedback": submission.get("feedback", ""),
+                "appealStatus": appeal.get("status", ""),
+                "files": [],
+                "missingFiles": [],
+            }
+
+            for page, url in enumerate(submission.get("files") or [], start=1):
+                key = key_from_url(url)
+                extension = os.path.splitext(key)[1]
+                arcname = f"{folder}/page-{page:02d}{extension}"
+                try:
+                    chunks = store.open(key)
+                except FileNotFoundError:
+                    logger.warning(f"Archive - Missing file {url} for submission {row['submissionId']}")
+                    row["missingFiles"].append(url)
+                    continue
+
+                info = zipfile.ZipInfo(arcname, date_time=timestamp)
+                info.compress_type = zipfile.ZIP_STORED
+                with zf.open(info, mode="w", force_zip64=True) as dest:
+                    for chunk in chunks:
+                        dest.write(chunk)
+                        yield buffer.drain()
+                row["files"].append(arcname)
+                yield buffer.drain()
+
+            manifest.append(row)
+
+        zf.writestr(zipfile.ZipInfo("manifest.json", date_time=timestamp), json.dumps({
+            "assignmentId": assignment.get("id"),
+            "title": assignment.get("title"),
+            "maxGrade": assignment.get("maxGrade"),
+            "exportedAt": datetime.now().isoformat(),
+            "submissions": manifest,
+        }, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr(zipfile.ZipInfo("manifest.csv", date_time=timestamp), _manifest_csv(manifest), compress_type=zipfile.ZIP_DEFLATED)
+        yield buffer.drain()
+
+    yield buffer.drain()
@@ -0,0 +1,283 @@
+"""
+Benchmarks for database.py and the HTTP API on synthetic data.
+
+Generates a synthetic school (see synthetic.py) in a scratch directory, times
+every database.py function and the main endpoints (in-process through the ASGI
+app, with the AI grader stubbed out) and writes machine-readable results.
+Pass a previous results file as --baseline to get a before/after comparison.
+
+    python benchmarks/bench.py --scale small --output after.json --baseline before.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from urllib.parse import quote
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Run `fn` `repeat` times and summarise the wall-clock durations in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": min(durations),
+        "median_ms": statistics.median(durations),
+        "mean_ms": statistics.fmean(durations),
+        "max_ms": max(durations),
+        "runs": repeat,
+    }
+
+
+def bench_database(db: Any, repeat: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    """Time every public database.py function."""
+    users = db.get_users()
+    subjects = db.get_subjects()
+    assignments = db.get_assignments()
+    materials = db.get_materials()
+
+    user = rng.choice(users)
+    subject = rng.choice(subjects)
+    material = rng.choice(materials)
+    assignment = rng.choice([a for a in assignments if a.get("submissions")] or assignments)
+    submission = rng.choice(assignment.get("submissions") or [{"id": "missing"}])
+    student_id = submission.get("studentId", user["id"])
+    deletable = iter(users[-repeat:])
+    del users, subjects, assignments, materials
+
+    def new_submission() -> Dict[str, Any]:
+        return db.submit_assignment(assignment["id"], {"studentId": student_id, "studentName": "Bench", "files": []})
+
+    graded = new_submission()
+    db.grade_submission(graded["id"], 70, "Benchmark")
+    appealed = db.submit_appeal(graded["id"], "Benchmark appeal")
+
+    cases: Dict[str, Callable[[], Any]] = {
+        "get_users": db.get_users,
+        "get_user_by_id": lambda: db.get_user_by_id(user["id"]),
+        "save_user (update)": lambda: db.save_user(dict(user)),
+        "save_user (insert)": lambda: db.save_user({"name": "Bench", "email": "bench@school.test", "role": "student"}),
+        "delete_user": lambda: db.delete_user(next(deletable)["id"]),
+        "get_subjects": db.get_subjects,
+        "get_subject_by_id": lambda: db.get_subject_by_id(subject["id"]),
+        "save_subject (update)": lambda: db.save_subject(dict(subject)),
+        "get_assignments": db.get_assignments,
+        "get_assignment_by_id": lambda: db.get_assignment_by_id(assignment["id"]),
+        "get_assignments_for_subject": lambda: db.get_assignments_for_subject(subject["id"]),
+        "save_assignment (update)": lambda: db.save_assignment(db.get_assignment_by_id(assignment["id"])),
+        "get_materials": db.get_materials,
+        "get_material_by_id": lambda: db.get_material_by_id(material["id"]),
+        "get_materials_for_subject": lambda: db.get_materials_for_subject(subject["id"]),
+        "save_material (update)": lambda: db.save_material(dict(material)),
+        "get_submission_by_id": lambda: db.get_submission_by_id(submission["id"]),
+        "get_submissions_for_assignment": lambda: db.get_submissions_for_assignment(assignment["id"]),
+        "get_submissions_by_student": lambda: db.get_submissions_by_student(student_id),
+        "submit_assignment": new_submission,
+        "grade_submission": lambda: db.grade_submission(graded["id"], 80, "Benchmark"),
+        "submit_appeal": lambda: db.submit_appeal(graded["id"], "Benchmark appeal"),
+        "review_appeal": lambda: db.review_appeal(appealed["submissionId"], 85, "Benchmark review"),
+        "get_assignment_stats": lambda: db.get_assignment_stats(assignment["id"]),
+        "get_all_assignment_stats": db.get_all_assignment_stats,
+        "get_referenced_files": db.get_referenced_files,
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        results[f"db.{name}"] = measure(fn, repeat)
+        print(f"  db.{name:<36} {results[f'db.{name}']['median_ms']:>10.2f} ms")
+    return results
+
+
+def bench_api(main: Any, db: Any, repeat: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    """Time the main endpoints in-process through the ASGI app with the grader stubbed."""
+    from fastapi.testclient import TestClient
+
+    main.grade_homework_with_task_file = lambda *args, **kwargs: {"score": 90, "feedback": "Stubbed grade"}
+
+    assignments = db.get_assignments()
+    assignment = rng.choice([a for a in assignments if a.get("submissions")] or assignments)
+    submission = rng.choice(assignment.get("submissions") or [{"id": "missing", "studentId": "missing"}])
+    subject_id = assignment["subjectId"]
+    grader_id = next((u["id"] for u in db.get_users() if u.get("role") == "grader"), submission["studentId"])
+    del assignments
+
+    headers = {"Accept-Encoding": "gzip, br"}
+    page = b"\xff\xd8\xff" + b"0" * 2048
+
+    def get(path: str) -> Callable[[], Any]:
+        def request():
+            response = client.get(path, headers=headers)
+            response.raise_for_status()
+        return request
+
+    def post(path: str, **kwargs: Any) -> Callable[[], Any]:
+        def request():
+            response = client.post(path, headers=headers, **kwargs)
+            response.raise_for_status()
+        return request
+
+    cases: Dict[str, Callable[[], Any]] = {
+        "GET /api/users": get("/api/users"),
+        "GET /api/subjects": get("/api/subjects"),
+        "GET /api/assignments": get("/api/assignments"),
+        "GET /api/assignments/{id}": get(f"/api/assignments/{assignment['id']}"),
+        "GET /api/subjects/{id}/assignments": get(f"/api/subjects/{subject_id}/assignments"),
+        "GET /api/materials": get("/api/materials"),
+        "GET /api/subjects/{id}/materials": get(f"/api/subjects/{subject_id}/materials"),
+        "GET /api/submissions/{id}": get(f"/api/submissions/{submission['id']}"),
+        "GET /api/assignments/{id}/submissions": get(f"/api/assignments/{assignment['id']}/submissions"),
+        "GET /api/assignments/{id}/stats": get(f"/api/assignments/{assignment['id']}/stats"),
+        "GET /api/analytics/subjects/{id}": get(f"/api/analytics/subjects/{subject_id}"),
+        "GET /api/assignments/{id}/duplicates": get(f"/api/assignments/{assignment['id']}/duplicates"),
+        "GET /api/search": get(f"/api/search?q={quote(assignment.get('title') or 'assignment')}"),
+        "GET /api/students/{id}/submissions": get(f"/api/students/{submission['studentId']}/submissions"),
+        "GET /api/bootstrap (student)": get(f"/api/bootstrap?user_id={submission['studentId']}"),
+        "GET /api/bootstrap (grader)": get(f"/api/bootstrap?user_id={grader_id}"),
+        "GET /api/subjects/{id}/overview (grader)": get(f"/api/subjects/{subject_id}/overview?user_id={grader_id}"),
+        "POST /api/assignments/{id}/submit": post(
+            f"/api/assignments/{assignment['id']}/submit",
+            data={"student_id": "bench_student", "student_name": "Bench Student"},
+            files=[("files", ("page1.jpg", page, "image/jpeg"))],
+        ),
+        "POST /api/submissions/{id}/grade": post(
+            f"/api/submissions/{submission['id']}/grade", json={"grade": 88, "feedback": "Benchmark"}
+        ),
+        "POST /api/grade (stubbed)": post(
+            "/api/grade",
+            data={"criteria": "Benchmark criteria"},
+            files=[("task_file", ("task.jpg", page, "image/jpeg")), ("solution_file", ("page1.jpg", page, "image/jpeg"))],
+        ),
+    }
+
+    # Entering the client runs the app's lifespan (directory setup etc.).
+    results = {}
+    with TestClient(main.app) as client:
+        for name, fn in cases.items():
+            results[f"api.{name}"] = measure(fn, repeat)
+            print(f"  api.{name:<40} {results[f'api.{name}']['median_ms']:>10.2f} ms")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[Dict[str, Any]]:
+    """Compare median timings against a baseline; ratio > 1 means slower."""
+    rows = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("median_ms"):
+            continue
+        ratio = current["median_ms"] / before["median_ms"]
+        rows.append({
+            "name": name,
+            "baseline_ms": before["median_ms"],
+            "current_ms": current["median_ms"],
+            "ratio": ratio,
+            "status": "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "unchanged",
+        })
+    return rows
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark database.py and the HTTP API on synthetic data.")
+    parser.add_argument("--scale", choices=sorted(synthetic.SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark")
+    parser.add_argument("--only", choices=["db", "api"], help="Run only one group of benchmarks")
+    parser.add_argument("--workdir", help="Scratch directory (default: a new temporary directory)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as a regression/improvement")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if anything regressed")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="gradiator-bench-")
+    print(f"Generating '{args.scale}' dataset in {workdir} ...")
+    start = time.perf_counter()
+    counts = synthetic.generate(os.path.join(workdir, "database"), args.scale, args.seed)
+    print(f"Generated {counts} in {time.perf_counter() - start:.1f}s")
+
+    # The API resolves its data and upload directories relative to the
+    # working directory, so run everything from inside the scratch directory.
+    os.chdir(workdir)
+    # Synthetic due dates lie in the past; keep their appeal windows open so
+    # submit_appeal can be timed.
+    os.environ.setdefault("APPEAL_WINDOW_DAYS", "36500")
+    import database as db
+    db.initialize_if_empty()
+
+    rng = random.Random(args.seed)
+    results: Dict[str, Dict[str, float]] = {}
+    if args.only in (None, "db"):
+        print("database.py:")
+        results.update(bench_database(db, args.repeat, rng))
+    if args.only in (None, "api"):
+        import logging
+        # No background upload sweeps while timing requests.
+        os.environ.setdefault("SWEEP_INTERVAL_SECONDS", "0")
+        import main as api
+        logging.getLogger().setLevel(logging.WARNING)
+        print("HTTP API:")
+        results.update(bench_api(api, db, args.repeat, rng))
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "scale": args.scale,
+            "seed": args.seed,
+            "counts": counts,
+            "repeat": args.repeat,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print(f"Warning: baseline was recorded at scale '{baseline.get('meta', {}).get('scale')}'")
+        comparison = compare(results, baseline.get("results", {}), args.threshold)
+        report["comparison"] = comparison
+        print(f"\nComparison with {args.baseline}:")
+        for row in comparison:
+            print(f"  {row['name']:<44} {row['baseline_ms']:>10.2f} -> {row['current_ms']:>10.2f} ms  x{row['ratio']:.2f}  {row['status']}")
+        if args.fail_on_regression and any(row["status"] == "regression" for row in comparison):
+            exit_code = 1
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
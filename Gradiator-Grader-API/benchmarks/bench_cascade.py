@@ -0,0 +1,154 @@
+"""
+Cost, latency and accuracy benchmark for the grading model cascade.
+
+Grades synthetic cases through grading.grade_homework_with_task_file with the
+Gemini client replaced by simulated models. Each simulated model has its own
+latency, price (from accounting.py), score noise and confidence calibration,
+and is noisier on hard cases than on easy ones. The script compares single
+models with cascades, reporting mean latency, mean cost, how often each tier
+was used, and the mean absolute error on easy and hard cases.
+
+    python benchmarks/bench_cascade.py --cases 300 --output cascade.json
+
+Simulated latencies are slept at --time-scale (0.01 = 100x faster) and
+reported at full scale.
+"""
+import os
+import sys
+import json
+import logging
+import random
+import argparse
+import platform
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.environ.setdefault("OCR_BACKEND", "none")
+os.environ.setdefault("PRESCREEN_ENABLED", "0")  # measured by bench_prescreen.py
+
+import grading
+from bench import git_revision
+
+# (latency s, score noise on easy cases, on hard cases, how well confidence tracks the error)
+MODELS = {
+    "gemini-1.5-flash-8b": (0.6, 3, 22, 0.7),
+    "gemini-1.5-flash": (1.2, 2, 14, 0.8),
+    "gemini-1.5-pro": (4.0, 1, 5, 0.9),
+}
+CONFIGURATIONS = {
+    "flash only": ["gemini-1.5-flash"],
+    "pro only": ["gemini-1.5-pro"],
+    "flash -> pro": ["gemini-1.5-flash", "gemini-1.5-pro"],
+    "flash-8b -> flash -> pro": ["gemini-1.5-flash-8b", "gemini-1.5-flash", "gemini-1.5-pro"],
+}
+INPUT_TOKENS, OUTPUT_TOKENS = 1800, 120
+HARD_SHARE = 0.3
+
+
+class SimulatedModel:
+    cases: Dict[str, Dict[str, Any]] = {}
+    time_scale = 0.01
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def generate_content(self, content: List[Any], request_options: Any = None) -> Any:
+        latency, easy_noise, hard_noise, calibration = MODELS[self.name]
+        case = next(self.cases[part.split("CASE:")[1].split()[0]] for part in content if isinstance(part, str) and "CASE:" in part)
+        rng = random.Random(f"{case['id']}-{self.name}")
+        time.sleep(latency * rng.uniform(0.7, 1.5) * self.time_scale)
+        error = rng.gauss(0, hard_noise if case["hard"] else easy_noise)
+        score = int(min(100, max(0, round(case["score"] + error))))
+        # Confidence falls with the size of the error, blurred by imperfect calibration.
+        confidence = calibration * max(0.0, 1 - abs(error) / 40) + (1 - calibration) * rng.uniform(0.5, 1.0)
+        text = json.dumps({"score": score, "feedback": "simulated", "confidence": round(confidence, 2)})
+        usage = SimpleNamespace(prompt_token_count=INPUT_TOKENS, candidates_token_count=OUTPUT_TOKENS)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def build_cases(count: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [{"id": f"c{i}", "score": rng.randint(0, 100), "hard": rng.random() < HARD_SHARE} for i in range(count)]
+
+
+def run_configuration(models: List[str], cases: List[Dict[str, Any]], task: str, solution: str, seed: int) -> Dict[str, Any]:
+    grading.GRADING_CASCADE = models
+    grading.TIER_TIMEOUTS = {model: 60.0 for model in models}
+    grading._breakers.clear()
+    random.seed(seed)  # re-check sampling
+    rows = []
+    for case in cases:
+        result = grading.grade_homework_with_task_file(task, [solution], f"CASE:{case['id']} grade fairly", allow_text_only=False)
+        usage = result["usage"]
+        tiers = usage.get("tiers") or [{"model": usage["model"]}]
+        rows.append({
+            "hard": case["hard"],
+            "error": abs(result["score"] - case["score"]),
+            "latencyMs": usage["latencyMs"] / SimulatedModel.time_scale,
+            "costUsd": sum(t.get("costUsd", 0.0) for t in tiers) if usage.get("tiers") else
+                       grading.accounting.estimate_cost(usage["model"], usage["inputTokens"], usage["outputTokens"]),
+            "models": [t["model"] for t in tiers if t.get("outcome") != "skipped"],
+        })
+    tier_use = {model: sum(model in row["models"] for row in rows) / len(rows) for model in models}
+    return {
+        "models": models,
+        "meanLatencyMs": round(statistics.mean(r["latencyMs"] for r in rows), 1),
+        "meanCostUsd": round(statistics.mean(r["costUsd"] for r in rows), 7),
+        "maeEasy": round(statistics.mean(r["error"] for r in rows if not r["hard"]), 2),
+        "maeHard": round(statistics.mean(r["error"] for r in rows if r["hard"]), 2),
+        "tierUse": {model: round(share, 3) for model, share in tier_use.items()},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare single models with model cascades on simulated grading.")
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--time-scale", type=float, default=0.01, help="Fraction of the simulated latency actually slept")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger("grading").setLevel(logging.ERROR)
+    cases = build_cases(args.cases, args.seed)
+    SimulatedModel.cases = {case["id"]: case for case in cases}
+    SimulatedModel.time_scale = args.time_scale
+    grading._genai = SimpleNamespace(GenerativeModel=SimulatedModel)
+    task, solution = os.path.join(API_DIR, "hw2_task.jpg"), os.path.join(API_DIR, "hw2.jpg")
+
+    results = {}
+    print(f"{'configuration':<26} {'latency ms':>10} {'cost $':>10} {'MAE easy':>9} {'MAE hard':>9}  tier use")
+    for name, models in CONFIGURATIONS.items():
+        row = results[name] = run_configuration(models, cases, task, solution, args.seed)
+        use = ", ".join(f"{m.replace('gemini-1.5-', '')} {share:.0%}" for m, share in row["tierUse"].items())
+        print(f"{name:<26} {row['meanLatencyMs']:>10.0f} {row['meanCostUsd']:>10.6f} {row['maeEasy']:>9.2f} {row['maeHard']:>9.2f}  {use}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "cases": args.cases,
+                "seed": args.seed,
+                "hardShare": HARD_SHARE,
+                "minConfidence": grading.CASCADE_MIN_CONFIDENCE,
+                "recheckRate": grading.CASCADE_RECHECK_RATE,
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": datetime.now().isoformat(),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Roster import benchmark: one database.save_user call per user (what clients
+calling POST /api/users do) against bulk_import.py.
+
+Both start from the same synthetic database in a scratch directory. save_user
+rewrites users.json for every user, so its cost grows with the square of the
+roster size; the bulk import writes once per batch.
+
+    python benchmarks/bench_import.py --users 5000 --output import.json
+"""
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench import git_revision
+from synthetic import SCALES, generate
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare per-user saves with a bulk roster import.")
+    parser.add_argument("--users", type=int, default=5000, help="Roster size")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="Existing data")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    workdir = tempfile.mkdtemp(prefix="gradiator-import-")
+    generate(os.path.join(workdir, "database", "template"), args.scale, args.seed)
+    roster = os.path.join(workdir, "roster.csv")
+    with open(roster, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "email", "role"])
+        for i in range(args.users):
+            writer.writerow([f"Pupil {i}", f"pupil{i}@import.test", "student"])
+
+    # database.py resolves its files relative to the working directory.
+    os.chdir(workdir)
+    import database as db
+    import bulk_import
+
+    def fresh_database() -> None:
+        for name in os.listdir("database"):
+            if name != "template":
+                path = os.path.join("database", name)
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        for name in os.listdir(os.path.join("database", "template")):
+            shutil.copy(os.path.join("database", "template", name), "database")
+
+    results = {}
+    fresh_database()
+    start = time.perf_counter()
+    with open(roster, newline="") as f:
+        for row in csv.DictReader(f):
+            db.save_user(dict(row))
+    results["save_user per row"] = {"seconds": round(time.perf_counter() - start, 3)}
+
+    fresh_database()
+    start = time.perf_counter()
+    job = bulk_import.run_import("users", roster, batch_size=args.batch_size)
+    results["bulk import"] = {"seconds": round(time.perf_counter() - start, 3), "created": job["created"], "batches": job["batches"]}
+
+    for name, row in results.items():
+        print(f"{name:<20} {row['seconds']:>8.2f} s  ({args.users / row['seconds']:,.0f} users/s)")
+    if output:
+        report = {
+            "meta": {
+                "users": args.users,
+                "scale": args.scale,
+                "batchSize": args.batch_size,
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": datetime.now().isoformat(),
+            },
+            "results": results,
+        }
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Accuracy and speed benchmark for the solution pre-screen (prescreen.py).
+
+Runs the sample homework images in the API directory, plus degraded variants
+generated from them (blank and shadowed pages, blurred photos, thumbnails,
+covered lens), through the pre-screen. Prints the measures, the decision and
+whether it matches the expected one, and the time per page.
+
+    python benchmarks/bench_prescreen.py --runs 3 --output prescreen.json
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import prescreen
+from bench import git_revision
+
+# Real pages that must pass; every variant below must be rejected unless noted.
+SAMPLE_PATTERN = "hw*.jpg"
+
+
+def _blank(image: Image.Image) -> Image.Image:
+    return Image.new("RGB", image.size, (246, 244, 238))
+
+def _shadowed_blank(image: Image.Image) -> Image.Image:
+    # Paper photographed under uneven light: a dark gradient, no writing.
+    page = Image.new("L", image.size)
+    draw = ImageDraw.Draw(page)
+    for x in range(image.size[0]):
+        draw.line([(x, 0), (x, image.size[1])], fill=250 - int(110 * x / image.size[0]))
+    return page.convert("RGB")
+
+def _black(image: Image.Image) -> Image.Image:
+    # Lens covered / photo taken in the dark.
+    return Image.new("RGB", image.size, (6, 6, 8))
+
+def _blur(radius: float) -> Callable[[Image.Image], Image.Image]:
+    return lambda image: image.filter(ImageFilter.GaussianBlur(radius))
+
+def _resize(side: int) -> Callable[[Image.Image], Image.Image]:
+    def resize(image: Image.Image) -> Image.Image:
+        small = image.copy()
+        small.thumbnail((side, side))
+        return small
+    return resize
+
+# (name, transform, expected to pass)
+VARIANTS: List[Tuple[str, Callable[[Image.Image], Image.Image], bool]] = [
+    ("blank", _blank, False),
+    ("shadowed blank", _shadowed_blank, False),
+    ("black", _black, False),
+    ("blur 2px", _blur(2), True),
+    ("blur 4px", _blur(4), False),
+    ("blur 8px", _blur(8), False),
+    ("thumbnail 300px", _resize(300), False),
+    ("tiny 64px", _resize(64), False),
+]
+
+
+def build_cases(workdir: str) -> List[Dict[str, Any]]:
+    samples = sorted(glob.glob(os.path.join(API_DIR, SAMPLE_PATTERN)))
+    cases = [{"name": os.path.basename(path), "path": path, "expectPass": True} for path in samples]
+    if not samples:
+        return cases
+    with Image.open(samples[0]) as source:
+        source = source.convert("RGB")
+        for name, transform, expect_pass in VARIANTS:
+            path = os.path.join(workdir, name.replace(" ", "_") + ".jpg")
+            transform(source).save(path, quality=90)
+            cases.append({"name": f"{os.path.basename(samples[0])}: {name}", "path": path, "expectPass": expect_pass})
+    return cases
+
+
+def run_case(case: Dict[str, Any], runs: int) -> Dict[str, Any]:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        page = prescreen.screen_page(case["path"])
+        durations.append((time.perf_counter() - start) * 1000)
+    passed = page["rejected"] is None
+    return {
+        "name": case["name"],
+        "expectPass": case["expectPass"],
+        "passed": passed,
+        "correct": passed == case["expectPass"],
+        "rejected": page["rejected"],
+        "measures": {key: page.get(key) for key in ("width", "height", "ink", "entropy", "sharpness")},
+        "median_ms": statistics.median(durations),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check pre-screen decisions and speed on sample and degraded pages.")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per page")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="gradiator-prescreen-") as workdir:
+        cases = build_cases(workdir)
+        if not cases:
+            print(f"No sample images ({SAMPLE_PATTERN}) found in {API_DIR}")
+            return 1
+        results = [run_case(case, args.runs) for case in cases]
+
+    print(f"{'page':<28} {'ink':>8} {'entropy':>8} {'sharp':>8} {'ms':>7}  decision")
+    for row in results:
+        m = row["measures"]
+        decision = "pass" if row["passed"] else f"reject ({row['rejected']})"
+        mark = "" if row["correct"] else "   <-- expected " + ("pass" if row["expectPass"] else "reject")
+        print(f"{row['name']:<28} {m['ink'] or 0:>8.4f} {m['entropy'] or 0:>8.2f} {m['sharpness'] or 0:>8.1f} "
+              f"{row['median_ms']:>7.1f}  {decision}{mark}")
+
+    wrong = [row for row in results if not row["correct"]]
+    print(f"\n{len(results) - len(wrong)}/{len(results)} decisions as expected, "
+          f"median {statistics.median(row['median_ms'] for row in results):.1f} ms per page")
+
+    if args.output:
+        report = {
+            "meta": {
+                "runs": args.runs,
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": datetime.now().isoformat(),
+                "thresholds": {
+                    "minSide": prescreen.MIN_SIDE, "minInk": prescreen.MIN_INK,
+                    "minEntropy": prescreen.MIN_ENTROPY, "minSharpness": prescreen.MIN_SHARPNESS,
+                },
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Scale benchmark for the search index (search.py).
+
+Fills a scratch index with synthetic documents whose words follow a Zipf
+distribution (a few very common words, a long tail of rare ones, like real
+feedback text), then times indexing, single-document updates and queries
+ranging from rare to very common words. Results use the same JSON layout as
+bench.py, so --baseline works the same way.
+
+    python benchmarks/bench_search.py --documents 300000 --output search.json
+"""
+import os
+import sys
+import json
+import random
+import itertools
+import argparse
+import platform
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench import compare, git_revision, measure
+
+VOCABULARY_SIZE = 20000
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zi", "pe", "sa", "do", "fu", "gi", "ha", "je"]
+
+
+def vocabulary(rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda _: rng.random())
+
+
+def documents(count: int, words: List[str], rng: random.Random) -> List[Any]:
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    types = ["feedback"] * 8 + ["assignment", "material"]
+    docs = []
+    for i in range(count):
+        doc_type = rng.choice(types)
+        title = " ".join(rng.choices(words, cum_weights=cumulative, k=4))
+        body = " ".join(rng.choices(words, cum_weights=cumulative, k=rng.randint(15, 60)))
+        docs.append((doc_type, f"doc_{i}", title, body, f"subject_{i % 50}", f"assignment_{i % 5000}"))
+    return docs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure search indexing and query times at scale.")
+    parser.add_argument("--documents", type=int, default=300000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as a regression/improvement")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gradiator-search-")
+    os.chdir(workdir)
+    import search
+
+    rng = random.Random(args.seed)
+    words = vocabulary(rng)
+    docs = documents(args.documents, words, rng)
+    index = search.SearchIndex(os.path.join(workdir, "search.sqlite"))
+
+    start = time.perf_counter()
+    batch = 5000
+    for i in range(0, len(docs), batch):
+        index.index(docs[i:i + batch])
+    # Filled directly, not from the JSON files: mark it as current for them.
+    index._checked = True
+    index._external_seen, index._versions_seen = index._external_writes(), index._data_versions()
+    print(f"Indexed {len(docs)} documents in {time.perf_counter() - start:.1f} s "
+          f"({os.path.getsize(index.path) / 1e6:.0f} MB)")
+
+    updated = iter(rng.sample(docs, args.repeat))
+    cases = {
+        "index 1 document": lambda: index.index([next(updated)]),
+        "query rare word": lambda: index.search(words[-1]),
+        "query mid word": lambda: index.search(words[500]),
+        "query common word": lambda: index.search(words[0]),
+        "query two words": lambda: index.search(f"{words[3]} {words[40]}"),
+        "query prefix": lambda: index.search(words[200][:3]),
+        "query filtered": lambda: index.search(words[10], types=["feedback"], subject_id="subject_7"),
+        "query page 10": lambda: index.search(words[10], offset=200),
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    for name, fn in cases.items():
+        results[f"search.{name}"] = measure(fn, args.repeat)
+        total = "" if name.startswith("index") else f"  ({fn()['total']} matches)"
+        print(f"  search.{name:<24} {results[f'search.{name}']['median_ms']:>8.2f} ms{total}")
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "documents": args.documents,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline.get("results", {}), args.threshold)
+        for row in report["comparison"]:
+            print(f"  {row['name']:<32} {row['baseline_ms']:>8.2f} -> {row['current_ms']:>8.2f} ms  x{row['ratio']:.2f}  {row['status']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Startup and access benchmark for the binary collection snapshots (snapshot.py).
+
+Generates a synthetic database, then measures in fresh interpreters, once with
+DB_SNAPSHOTS=0 (JSON only) and once with snapshots:
+
+- ready: import main and run the lifespan until /health/ready answers
+- first assignment / first submission: the first GET of one record by ID
+- full load: database.get_assignments() in a new process
+
+Snapshots are built before the timed runs, as they would be by the first start
+after an upgrade. Results use the same JSON layout as bench.py, so --baseline
+works the same way.
+
+    python benchmarks/bench_snapshot.py --scale medium --runs 5 --output snapshot.json
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench import compare, git_revision
+from synthetic import SCALES, generate
+
+PROBE = """
+import sys, time, json, logging
+sys.path.insert(0, {api_dir!r})
+logging.disable(logging.CRITICAL)
+start = time.perf_counter()
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    assert client.get("/health/ready").status_code == 200
+    ready = time.perf_counter()
+    assert client.get("/api/assignments/{assignment_id}").status_code == 200
+    assignment = time.perf_counter()
+    assert client.get("/api/submissions/{submission_id}").status_code == 200
+    submission = time.perf_counter()
+print(json.dumps({{"ready_ms": (ready - start) * 1000, "first assignment_ms": (assignment - ready) * 1000,
+                  "first submission_ms": (submission - assignment) * 1000}}))
+"""
+
+LOAD_PROBE = """
+import sys, time, json
+sys.path.insert(0, {api_dir!r})
+import database as db
+start = time.perf_counter()
+db.get_assignments()
+print(json.dumps({{"full load_ms": (time.perf_counter() - start) * 1000}}))
+"""
+
+
+def run_probe(probe: str, workdir: str, snapshots: bool, **values: str) -> Dict[str, float]:
+    env = {**os.environ, "SWEEP_INTERVAL_SECONDS": "0", "SCHEDULER_ENABLED": "0", "DB_SNAPSHOTS": "1" if snapshots else "0"}
+    output = subprocess.check_output([sys.executable, "-c", probe.format(api_dir=API_DIR, **values)], cwd=workdir, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def summarise(durations: List[float]) -> Dict[str, float]:
+    return {
+        "min_ms": min(durations),
+        "median_ms": statistics.median(durations),
+        "mean_ms": statistics.fmean(durations),
+        "max_ms": max(durations),
+        "runs": len(durations),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare startup and record access with and without snapshots.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per mode")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as a regression/improvement")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gradiator-snapshot-")
+    counts = generate(os.path.join(workdir, "database"), args.scale, args.seed)
+    json_bytes = os.path.getsize(os.path.join(workdir, "database", "assignments.json"))
+    print(f"Generated {counts} in {workdir} (assignments.json: {json_bytes / 1e6:.0f} MB)")
+
+    with open(os.path.join(workdir, "database", "assignments.json")) as f:
+        assignment = random.Random(args.seed).choice(json.load(f))
+    ids = {"assignment_id": assignment["id"], "submission_id": assignment["submissions"][0]["id"]}
+    run_probe(LOAD_PROBE, workdir, snapshots=True)  # builds the snapshots
+    snapshot_bytes = os.path.getsize(os.path.join(workdir, "database", "assignments.snapshot"))
+    print(f"assignments.snapshot: {snapshot_bytes / 1e6:.0f} MB")
+
+    results: Dict[str, Dict[str, float]] = {}
+    for mode, snapshots in (("json", False), ("snapshot", True)):
+        samples: Dict[str, List[float]] = {}
+        for _ in range(args.runs):
+            for probe in (PROBE, LOAD_PROBE):
+                for name, value in run_probe(probe, workdir, snapshots, **ids).items():
+                    samples.setdefault(name[:-3], []).append(value)
+        for name, durations in samples.items():
+            results[f"{mode}.{name}"] = summarise(durations)
+            print(f"  {mode + '.' + name:<28} {results[f'{mode}.{name}']['median_ms']:>9.1f} ms")
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "scale": args.scale,
+            "counts": counts,
+            "jsonBytes": json_bytes,
+            "snapshotBytes": snapshot_bytes,
+            "runs": args.runs,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline.get("results", {}), args.threshold)
+        for row in report["comparison"]:
+            print(f"  {row['name']:<32} {row['baseline_ms']:>8.2f} -> {row['current_ms']:>8.2f} ms  x{row['ratio']:.2f}  {row['status']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
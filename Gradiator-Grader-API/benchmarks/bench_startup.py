@@ -0,0 +1,117 @@
+"""
+Cold-start benchmark for the API.
+
+Measures, in fresh interpreters, how long `import main` takes and how long the
+app then needs until /health/ready answers 200 (the lifespan startup work).
+Results use the same JSON layout as bench.py, so --baseline works the same way.
+
+    python benchmarks/bench_startup.py --runs 10 --output after.json --baseline before.json
+"""
+import os
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench import compare, git_revision
+
+# Run in a child interpreter so every sample pays the full import cost.
+PROBE = """
+import sys, time, json, logging
+sys.path.insert(0, {api_dir!r})
+logging.disable(logging.CRITICAL)
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    status = client.get("/health/ready").status_code
+ready = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000, "ready_ms": (ready - start) * 1000, "status": status}}))
+"""
+
+
+def sample(workdir: str) -> Dict[str, float]:
+    env = {**os.environ, "SWEEP_INTERVAL_SECONDS": "0"}
+    output = subprocess.check_output([sys.executable, "-c", PROBE.format(api_dir=API_DIR)], cwd=workdir, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def summarise(durations: List[float]) -> Dict[str, float]:
+    return {
+        "min_ms": min(durations),
+        "median_ms": statistics.median(durations),
+        "mean_ms": statistics.fmean(durations),
+        "max_ms": max(durations),
+        "runs": len(durations),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure API import and startup time in fresh interpreters.")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters to start")
+    parser.add_argument("--workdir", help="Working directory for the API (default: a new temporary directory)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as a regression/improvement")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if anything regressed")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="gradiator-startup-")
+    samples = []
+    for i in range(args.runs):
+        result = sample(workdir)
+        if result["status"] != 200:
+            print(f"Run {i + 1}: /health/ready returned {result['status']}")
+            return 1
+        samples.append(result)
+        print(f"  run {i + 1:>3}: import {result['import_ms']:8.1f} ms   ready {result['ready_ms']:8.1f} ms")
+
+    results = {
+        "startup.import main": summarise([s["import_ms"] for s in samples]),
+        "startup.ready": summarise([s["ready_ms"] for s in samples]),
+    }
+    for name, stats in results.items():
+        print(f"{name:<24} median {stats['median_ms']:8.1f} ms")
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "runs": args.runs,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare(results, baseline.get("results", {}), args.threshold)
+        report["comparison"] = comparison
+        print(f"\nComparison with {args.baseline}:")
+        for row in comparison:
+            print(f"  {row['name']:<24} {row['baseline_ms']:>10.1f} -> {row['current_ms']:>10.1f} ms  x{row['ratio']:.2f}  {row['status']}")
+        if args.fail_on_regression and any(row["status"] == "regression" for row in comparison):
+            exit_code = 1
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Synthetic school generator for the benchmarks.
+
+Writes users.json, subjects.json, assignments.json (with embedded submissions)
+and materials.json into a database directory, in the same shape the API
+produces. Output is deterministic for a given scale and seed.
+
+    python benchmarks/synthetic.py --scale small --output /tmp/gradiator-db
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, Any
+
+# Number of records per collection for each preset.
+SCALES: Dict[str, Dict[str, int]] = {
+    "tiny": {"users": 50, "subjects": 5, "assignments": 100, "submissions": 2_000, "materials": 50},
+    "small": {"users": 500, "subjects": 50, "assignments": 2_000, "submissions": 50_000, "materials": 500},
+    "medium": {"users": 2_000, "subjects": 200, "assignments": 8_000, "submissions": 250_000, "materials": 2_000},
+    "school": {"users": 5_000, "subjects": 500, "assignments": 20_000, "submissions": 1_000_000, "materials": 5_000},
+}
+
+WORDS = (
+    "algebra geometry derivative integral vector matrix equation proof theorem lemma "
+    "photosynthesis mitochondria velocity momentum energy essay poetry history revolution "
+    "grammar vocabulary chemistry reaction molecule probability statistics function limit"
+).split()
+
+START_DATE = datetime(2025, 9, 1)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def _timestamp(rng: random.Random, days: int = 270) -> str:
+    return (START_DATE + timedelta(seconds=rng.randrange(days * 86400))).isoformat()
+
+
+def generate(output_dir: str, scale: str = "small", seed: int = 42) -> Dict[str, int]:
+    """Generate a synthetic database in `output_dir` and return the record counts."""
+    counts = SCALES[scale]
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    students = [
+        {"id": f"user_{i}", "name": f"Student {i}", "email": f"student{i}@school.test", "role": "student"}
+        for i in range(counts["users"])
+    ]
+    graders = max(1, counts["users"] // 50)
+    for student in students[:graders]:
+        student["role"] = "grader"
+        student["name"] = student["name"].replace("Student", "Teacher")
+    with open(os.path.join(output_dir, "users.json"), "w") as f:
+        json.dump(students, f)
+
+    subjects = [
+        {
+            "id": f"subject_{i}",
+            "title": f"{rng.choice(WORDS).capitalize()} {i}",
+            "description": _sentence(rng, 12),
+            "code": f"SUB{i:04d}",
+            "imageUrl": None,
+        }
+        for i in range(counts["subjects"])
+    ]
+    with open(os.path.join(output_dir, "subjects.json"), "w") as f:
+        json.dump(subjects, f)
+
+    materials = [
+        {
+            "id": f"material_{i}",
+            "title": _sentence(rng, 4),
+            "subjectId": f"subject_{rng.randrange(counts['subjects'])}",
+            "description": _sentence(rng, 15),
+            "type": rng.choice(["document", "video", "presentation", "other"]),
+            "fileUrl": f"/uploads/material_{i:08x}.pdf",
+            "dateAdded": _timestamp(rng),
+        }
+        for i in range(counts["materials"])
+    ]
+    with open(os.path.join(output_dir, "materials.json"), "w") as f:
+        json.dump(materials, f)
+
+    # Assignments are streamed to disk one by one so the generator itself does
+    # not need to hold a million submissions in memory.
+    student_ids = [s["id"] for s in students[graders:]] or [students[0]["id"]]
+    per_assignment, remainder = divmod(counts["submissions"], counts["assignments"])
+    submission_id = 0
+    with open(os.path.join(output_dir, "assignments.json"), "w") as f:
+        f.write("[")
+        for i in range(counts["assignments"]):
+            due = START_DATE + timedelta(days=rng.randrange(270))
+            submissions = []
+            for _ in range(per_assignment + (1 if i < remainder else 0)):
+                student = rng.choice(student_ids)
+                submission = {
+                    "studentId": student,
+                    "studentName": f"Student {student.split('_')[1]}",
+                    "files": [f"/uploads/submission_{submission_id:08x}.jpg"],
+                    "id": f"sub_{submission_id}",
+                    "assignmentId": f"assignment_{i}",
+                    "submittedAt": (due - timedelta(hours=rng.randrange(1, 240))).isoformat(),
+                    "status": "submitted",
+                }
+                if rng.random() < 0.8:
+                    submission["status"] = "graded"
+                    submission["grade"] = int(min(100, max(0, rng.gauss(75, 15))))
+                    submission["feedback"] = _sentence(rng, 20)
+                    if rng.random() < 0.05:
+                        submission["appeal"] = {
+                            "id": f"appeal_{submission_id}",
+                            "submissionId": submission["id"],
+                            "reason": _sentence(rng, 10),
+                            "status": rng.choice(["pending", "reviewed"]),
+                            "createdAt": _timestamp(rng),
+                            "originalGrade": submission["grade"],
+                        }
+                submissions.append(submission)
+                submission_id += 1
+
+            assignment = {
+                "id": f"assignment_{i}",
+                "title": f"Assignment {i}: {_sentence(rng, 3)}",
+                "subjectId": f"subject_{rng.randrange(counts['subjects'])}",
+                "description": _sentence(rng, 25),
+                "dueDate": due.isoformat(),
+                "type": rng.choice(["homework", "exam", "quiz"]),
+                "status": "graded" if submissions else "upcoming",
+                "maxGrade": 100,
+                "criteria": _sentence(rng, 30),
+                "files": [f"/uploads/assignment_{i:08x}.pdf"],
+                "submissions": submissions,
+                "appealDeadline": None,
+                "hasAppeal": any(s.get("appeal", {}).get("status") == "pending" for s in submissions),
+            }
+            if i:
+                f.write(",")
+            f.write(json.dumps(assignment))
+        f.write("]")
+
+    return dict(counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Gradiator database.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help="Directory to write the JSON collections to")
+    args = parser.parse_args()
+
+    result = generate(args.output, args.scale, args.seed)
+    json.dump(result, sys.stdout)
+    print()
@@ -0,0 +1,261 @@
+import os
+import shutil
+import hashlib
+import logging
+from typing import Any, BinaryIO, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Blob Store Configuration ---
+BLOB_STORE = os.getenv("BLOB_STORE", "local")
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", "uploads")
+# Number of two-hex-character directory levels used by the local backend.
+# Two levels give 65,536 leaf directories, enough for tens of millions of files.
+SHARD_DEPTH = int(os.getenv("BLOB_SHARD_DEPTH", "2"))
+S3_BUCKET = os.getenv("S3_BUCKET", "gradiator-uploads")
+S3_PREFIX = os.getenv("S3_PREFIX", "uploads/")
+# Point this at MinIO, LocalStack or a moto server to run against a local stand-in.
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+
+CHUNK_SIZE = 64 * 1024
+URL_PREFIX = "/uploads/"
+PART_SUFFIX = ".part"  # local uploads in progress (or left by a crashed one)
+
+
+# --- URL Helpers ---
+def url_for(key: str) -> str:
+    """Public URL of a blob. The API serves it regardless of the backend."""
+    return f"{URL_PREFIX}{key}"
+
+def key_from_url(url: str) -> str:
+    """Blob key of an '/uploads/<key>' URL (absolute URLs are accepted too)."""
+    return url.rsplit(URL_PREFIX, 1)[-1]
+
+
+class BlobStore:
+    """Interface shared by every storage backend for uploaded files."""
+
+    def put(self, key: str, fileobj: BinaryIO) -> int:
+        """Store the contents of `fileobj` under `key` and return the number of bytes written."""
+        raise NotImplementedError
+
+    def open(self, key: str, chunk_size: int = CHUNK_SIZE, start: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Stream the contents of a blob in chunks, optionally only `length` bytes
+        from offset `start`. Raises FileNotFoundError if missing.
+        """
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        """(size in bytes, modified timestamp) of a blob, or None if it does not exist."""
+        raise NotImplementedError
+
+    def size(self, key: str) -> Optional[int]:
+        """Size of a blob in bytes, or None if it does not exist."""
+        stat = self.stat(key)
+        return stat[0] if stat else None
+
+    def exists(self, key: str) -> bool:
+        """Check whether a blob exists."""
+        return self.size(key) is not None
+
+    def delete(self, key: str) -> None:
+        """Delete a blob. Missing blobs are ignored."""
+        raise NotImplementedError
+
+    def iter_blobs(self) -> Iterator[Tuple[str, int, float]]:
+        """Yield (key, size, modified timestamp) for every stored blob, including unfinished uploads."""
+        raise NotImplementedError
+
+    def read(self, key: str) -> bytes:
+        """Read a whole blob into memory (only for small files)."""
+        return b"".join(self.open(key))
+
+    def download_to(self, key: str, path: str) -> None:
+        """Copy a blob to a local file, e.g. to hand it to a library that needs a path."""
+        with open(path, "wb") as f:
+            for chunk in self.open(key):
+                f.write(chunk)
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Stores blobs on the local filesystem, sharded into hash-prefixed
+    subdirectories (uploads/ab/cd/<key>) so no single directory grows huge.
+    Files written by older versions directly into uploads/ are still found.
+    """
+
+    def __init__(self, root: str = UPLOADS_DIR, shard_depth: int = SHARD_DEPTH):
+        self.root = root
+        self.shard_depth = shard_depth
+        os.makedirs(root, exist_ok=True)
+
+    def _sharded_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        shards = [digest[2 * i:2 * i + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, key)
+
+    def _validate(self, key: str) -> None:
+        if not key or "/" in key or "\\" in key or key.startswith("."):
+            raise FileNotFoundError(key)
+
+    def path(self, key: str) -> Optional[str]:
+        """Local path of an existing blob, or None if it does not exist."""
+        self._validate(key)
+        for candidate in (self._sharded_path(key), os.path.join(self.root, key)):
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def put(self, key: str, fileobj: BinaryIO) -> int:
+        self._validate(key)
+        path = self._sharded_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}{PART_SUFFIX}"
+        written = 0
+        with open(temp_path, "wb") as f:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(temp_path, path)
+        return written
+
+    def open(self, key: str, chunk_size: int = CHUNK_SIZE, start: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+        path = self.path(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        return self._iter_file(path, chunk_size, start, length)
+
+    @staticmethod
+    def _iter_file(path: str, chunk_size: int, start: int, length: Optional[int]) -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        try:
+            path = self.path(key)
+            if path is None:
+                return None
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def _part_path(self, key: str) -> Optional[str]:
+        """Path of an unfinished upload ('<key>.part' sits next to where <key> will go)."""
+        self._validate(key)
+        path = f"{self._sharded_path(key[:-len(PART_SUFFIX)])}{PART_SUFFIX}"
+        return path if os.path.isfile(path) else None
+
+    def delete(self, key: str) -> None:
+        # Unfinished uploads are listed by iter_blobs so the sweeper can reclaim them,
+        # but are never served.
+        path = self._part_path(key) if key.endswith(PART_SUFFIX) else self.path(key)
+        if path:
+            os.remove(path)
+
+    def iter_blobs(self) -> Iterator[Tuple[str, int, float]]:
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    continue  # an upload finished (or was deleted) while walking
+                yield name, stat.st_size, stat.st_mtime
+
+    def download_to(self, key: str, path: str) -> None:
+        source = self.path(key)
+        if source is None:
+            raise FileNotFoundError(key)
+        shutil.copyfile(source, path)
+
+
+class _CountingReader:
+    """File wrapper that counts the bytes read through it."""
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.fileobj.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class S3BlobStore(BlobStore):
+    """Stores blobs in an S3-compatible bucket (AWS S3, MinIO, LocalStack, moto)."""
+
+    def __init__(self, bucket: str = S3_BUCKET, prefix: str = S3_PREFIX, endpoint_url: Optional[str] = S3_ENDPOINT_URL, client: Any = None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("The S3 blob store needs boto3. Install it with: pip install -r requirements-s3.txt")
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _is_missing(self, error: Exception) -> bool:
+        code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, key: str, fileobj: BinaryIO) -> int:
+        reader = _CountingReader(fileobj)
+        self.client.upload_fileobj(reader, self.bucket, self._object_key(key))
+        return reader.bytes_read
+
+    def open(self, key: str, chunk_size: int = CHUNK_SIZE, start: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if start or length is not None:
+            params["Range"] = f"bytes={start}-{'' if length is None else start + length - 1}"
+        try:
+            response = self.client.get_object(**params)
+        except Exception as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+        return response["Body"].iter_chunks(chunk_size)
+
+    def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return response["ContentLength"], response["LastModified"].timestamp()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def iter_blobs(self) -> Iterator[Tuple[str, int, float]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["Size"], item["LastModified"].timestamp()
+
+
+def create_blob_store() -> BlobStore:
+    """Create the blob store selected by the BLOB_STORE environment variable."""
+    if BLOB_STORE == "s3":
+        logger.info(f"Using S3 blob store: bucket={S3_BUCKET}, prefix={S3_PREFIX}, endpoint={S3_ENDPOINT_URL or 'AWS'}")
+        return S3BlobStore()
+    if BLOB_STORE != "local":
+        raise ValueError(f"Unknown BLOB_STORE backend: {BLOB_STORE}")
+    return LocalBlobStore()
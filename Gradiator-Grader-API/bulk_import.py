@@ -0,0 +1,344 @@
+"""
+Bulk import of users, subjects and legacy submissions from CSV or JSONL.
+
+Rows are streamed from the file, validated, and written in batches: one read
+and one write of the collection per batch (database.upsert_users and friends)
+instead of one per record as with POST /api/users. Records are matched by ID,
+else by email (users), code (subjects) or assignment, student and submission
+time (submissions), so importing a file twice updates instead of duplicating.
+
+Progress is saved after every batch in database/imports/, keyed by a hash of
+the kind and the file contents. Running an interrupted import again continues
+after the last saved batch; running a finished one returns its report.
+
+    python bulk_import.py users roster.csv
+    python bulk_import.py submissions legacy.jsonl --batch-size 2000
+
+CSV files need a header row. Columns (JSONL uses the same keys):
+
+- users: name, email, role (default "student"), id
+- subjects: title, code, description, imageUrl, id
+- submissions: assignmentId, studentId or studentEmail, submittedAt, files
+  (';'-separated in CSV), grade, feedback, studentName, id
+
+The API accepts the same files at POST /api/imports/{kind}.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import uuid
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+
+import database as db
+import metrics
+
+logger = logging.getLogger("bulk_import")
+
+# --- Import Configuration ---
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))  # row errors kept in a report
+IMPORTS_DIR = os.path.join(db.DB_PATH, "imports")
+# Legacy submissions without an ID get one derived from their natural key.
+SUBMISSION_NAMESPACE = uuid.UUID("6f0d8c2e-52a4-4c1e-9a57-3b1f4c9d2e10")
+
+Row = Tuple[int, Any]  # (row number, parsed row or the reason it couldn't be parsed)
+
+
+# --- Row Models ---
+class UserRow(BaseModel):
+    id: Optional[str] = None
+    name: str = Field(min_length=1)
+    email: str = Field(pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+    role: Optional[str] = None
+
+class SubjectRow(BaseModel):
+    id: Optional[str] = None
+    title: str = Field(min_length=1)
+    code: str = Field(min_length=1)
+    description: Optional[str] = None
+    imageUrl: Optional[str] = None
+
+class SubmissionRow(BaseModel):
+    id: Optional[str] = None
+    assignmentId: str = Field(min_length=1)
+    studentId: Optional[str] = None
+    studentEmail: Optional[str] = None
+    studentName: Optional[str] = None
+    submittedAt: datetime
+    files: List[str] = []
+    grade: Optional[int] = Field(None, ge=0)
+    feedback: Optional[str] = None
+
+    @field_validator("files", mode="before")
+    @classmethod
+    def split_files(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return [f.strip() for f in value.split(";") if f.strip()]
+        return value
+
+    @field_validator("submittedAt", mode="before")
+    @classmethod
+    def parse_submitted_at(cls, value: Any) -> Any:
+        # Legacy exports often have dates only; fromisoformat reads those as midnight.
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value.strip())
+            except ValueError:
+                raise ValueError(f"'{value}' is not an ISO 8601 date or date and time")
+        return value
+
+    @model_validator(mode="after")
+    def needs_student(self) -> "SubmissionRow":
+        if not self.studentId and not self.studentEmail:
+            raise ValueError("studentId or studentEmail is required")
+        return self
+
+
+# --- Reading ---
+def detect_format(path: str, name: Optional[str] = None) -> str:
+    """"csv" or "jsonl", from the file name or else the first character."""
+    extension = os.path.splitext(name or path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            if line.strip():
+                return "jsonl" if line.lstrip().startswith("{") else "csv"
+    return "csv"
+
+def read_rows(path: str, fmt: str) -> Iterator[Row]:
+    """Rows numbered from 1, with empty CSV cells left out; unparseable JSONL lines yield a ValueError."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(f), 1):
+                yield number, {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            return
+        number = 0
+        for line in f:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, ValueError(f"Invalid JSON: {e}")
+                continue
+            yield number, row if isinstance(row, dict) else ValueError("Expected a JSON object")
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors())
+
+
+# --- Kinds ---
+class _Students:
+    """Users by email, loaded on first use, for submissions that name their student by email."""
+
+    def __init__(self):
+        self._by_email: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        if self._by_email is None:
+            self._by_email = {}
+            for user in db.get_users():
+                if user.get("email"):
+                    self._by_email.setdefault(user["email"].strip().lower(), user)
+        return self._by_email.get(email.strip().lower())
+
+def _user_record(row: Dict[str, Any], students: _Students) -> Dict[str, Any]:
+    return UserRow.model_validate(row).model_dump(exclude_none=True)
+
+def _subject_record(row: Dict[str, Any], students: _Students) -> Dict[str, Any]:
+    return SubjectRow.model_validate(row).model_dump(exclude_none=True)
+
+def _submission_record(row: Dict[str, Any], students: _Students) -> Dict[str, Any]:
+    parsed = SubmissionRow.model_validate(row)
+    student_name = parsed.studentName
+    if not parsed.studentId:
+        student = students.by_email(parsed.studentEmail)
+        if student is None:
+            raise ValueError(f"No user with email {parsed.studentEmail}")
+        parsed.studentId = student["id"]
+        student_name = student_name or student.get("name")
+    submitted_at = parsed.submittedAt.isoformat()
+    record = {
+        "id": parsed.id or f"sub_{uuid.uuid5(SUBMISSION_NAMESPACE, f'{parsed.assignmentId}|{parsed.studentId}|{submitted_at}')}",
+        "assignmentId": parsed.assignmentId,
+        "studentId": parsed.studentId,
+        "studentName": student_name or parsed.studentId,
+        "files": parsed.files,
+        "submittedAt": submitted_at,
+        "status": "submitted",
+    }
+    if parsed.grade is not None:
+        record.update(grade=parsed.grade, feedback=parsed.feedback or "", status="graded")
+    return record
+
+# kind -> (row to record, batch writer)
+KINDS: Dict[str, Tuple[Callable[[Dict[str, Any], _Students], Dict[str, Any]], Callable[[List[Dict[str, Any]]], List[db.BulkResult]]]] = {
+    "users": (_user_record, db.upsert_users),
+    "subjects": (_subject_record, db.upsert_subjects),
+    "submissions": (_submission_record, db.import_submissions),
+}
+
+
+# --- Import Jobs ---
+def import_id(kind: str, path: str) -> str:
+    """Same kind and same file contents, same import."""
+    digest = hashlib.sha256(kind.encode() + b"\0")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(IMPORTS_DIR, f"{job_id}.json")
+
+def _load_job(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def get_import(job_id: str) -> Optional[Dict[str, Any]]:
+    """The saved progress or report of an import, or None."""
+    return _load_job(_job_path(job_id)) if job_id.isalnum() else None
+
+def list_imports(limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent imports first, without their row errors."""
+    if not os.path.isdir(IMPORTS_DIR):
+        return []
+    jobs = [job for name in os.listdir(IMPORTS_DIR) if name.endswith(".json")
+            for job in [_load_job(os.path.join(IMPORTS_DIR, name))] if job]
+    jobs.sort(key=lambda job: job.get("startedAt") or "", reverse=True)
+    return [{k: v for k, v in job.items() if k != "errors"} for job in jobs[:limit]]
+
+def _save_job(job: Dict[str, Any]) -> None:
+    os.makedirs(IMPORTS_DIR, exist_ok=True)
+    tmp_path = f"{_job_path(job['id'])}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, _job_path(job["id"]))
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+def _lock_for(job_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(job_id, threading.Lock())
+
+
+def run_import(kind: str, path: str, fmt: Optional[str] = None, batch_size: int = IMPORT_BATCH_SIZE,
+               restart: bool = False, source: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Import a file and return the report. An earlier, interrupted import of the
+    same file is resumed unless `restart` is set; a finished one is returned as is.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown import kind '{kind}', expected one of: {', '.join(KINDS)}")
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    fmt = fmt or detect_format(path, source)
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown format '{fmt}', expected csv or jsonl")
+    to_record, write_batch = KINDS[kind]
+    job_id = import_id(kind, path)
+
+    # A second request for the same file waits and then gets the finished report.
+    with _lock_for(job_id):
+        job = None if restart else get_import(job_id)
+        if job and job.get("status") == "completed":
+            return job
+        if job:
+            logger.info(f"Import - Resuming {job_id} ({kind}) after row {job['rows']}")
+        else:
+            job = {
+                "id": job_id, "kind": kind, "source": source or os.path.basename(path), "format": fmt,
+                "status": "running", "rows": 0, "created": 0, "updated": 0, "failed": 0, "batches": 0,
+                "errors": [], "startedAt": datetime.now().isoformat(), "finishedAt": None,
+            }
+            _save_job(job)
+
+        students = _Students()
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        errors: List[Dict[str, Any]] = []  # failed rows since the last saved batch
+        last_row = job["rows"]
+
+        def commit() -> None:
+            start = time.perf_counter()
+            results = write_batch([record for _, record in batch]) if batch else []
+            for (number, _), (outcome, saved) in zip(batch, results):
+                if outcome == "error":
+                    errors.append({"row": number, "error": saved["error"]})
+                else:
+                    job[outcome] += 1
+                    metrics.IMPORT_ROWS.labels(kind, outcome).inc()
+            metrics.IMPORT_BATCH_DURATION.labels(kind).observe(time.perf_counter() - start)
+            metrics.IMPORT_ROWS.labels(kind, "error").inc(len(errors))
+            job["failed"] += len(errors)
+            job["errors"].extend(sorted(errors, key=lambda e: e["row"])[:max(0, IMPORT_MAX_ERRORS - len(job["errors"]))])
+            job["rows"] = last_row
+            job["batches"] += 1
+            _save_job(job)
+            batch.clear()
+            errors.clear()
+
+        for number, row in read_rows(path, fmt):
+            if number <= job["rows"]:
+                continue  # saved by an earlier run
+            last_row = number
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                batch.append((number, to_record(row, students)))
+            except ValidationError as e:
+                errors.append({"row": number, "error": _describe(e)})
+            except ValueError as e:
+                errors.append({"row": number, "error": str(e)})
+            if len(batch) >= batch_size:
+                commit()
+
+        commit()
+        job["status"] = "completed"
+        job["finishedAt"] = datetime.now().isoformat()
+        _save_job(job)
+        logger.info(f"Import - {job_id} ({kind}) finished: {job['created']} created, {job['updated']} updated, {job['failed']} failed")
+        return job
+
+
+# --- Command Line ---
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import users, subjects or legacy submissions from CSV or JSONL.")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("file", help="CSV with a header row, or JSONL")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Default: from the file name or contents")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Records per write")
+    parser.add_argument("--restart", action="store_true", help="Start over instead of resuming an earlier import of this file")
+    parser.add_argument("--errors", type=int, default=20, help="Row errors to print")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    start = time.perf_counter()
+    job = run_import(args.kind, args.file, args.format, args.batch_size, args.restart)
+    print(f"{job['rows']} rows in {time.perf_counter() - start:.1f}s: "
+          f"{job['created']} created, {job['updated']} updated, {job['failed']} failed (import {job['id']})")
+    for error in job["errors"][:args.errors]:
+        print(f"  row {error['row']}: {error['error']}")
+    if job["failed"] > args.errors:
+        print(f"  ... {job['failed'] - args.errors} more in {_job_path(job['id'])}")
+    return 1 if job["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
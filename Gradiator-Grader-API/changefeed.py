@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+import database as db
+from versions import file_lock
+
+logger = logging.getLogger(__name__)
+
+# --- Change Feed Configuration ---
+# Every write reported by database.py becomes an event with a sequence number
+# that only ever grows, also across restarts: events are appended to
+# changes.jsonl and the last CHANGE_FEED_RETENTION of them are kept for
+# clients resuming after a disconnect.
+#
+# The file is the feed shared by every server process (and the bulk import
+# CLI): the next sequence number is taken from it under a file lock, and each
+# process reads the events others appended, so Last-Event-ID means the same on
+# every worker. Streams wake up at once for events published by their own
+# process and check the file for the others' every POLL_SECONDS.
+CHANGES_FILE = os.path.join(db.DB_PATH, "changes.jsonl")
+CHANGE_FEED_RETENTION = int(os.getenv("CHANGE_FEED_RETENTION", "1000"))
+HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "1"))
+
+
+def _delta(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Event payload without embedded submission lists, which can be huge."""
+    if "assignment" in data:
+        data = {**data, "assignment": {k: v for k, v in data["assignment"].items() if k != "submissions"}}
+    return data
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, types: Optional[Set[str]], subject_id: Optional[str]):
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+        self.types = types
+        self.subject_id = subject_id
+        self.start_seq = 0
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        if self.types and event["type"] not in self.types:
+            return False
+        if self.subject_id:
+            subject_id = event["data"].get("subjectId") or (event["data"].get("assignment") or {}).get("subjectId") \
+                or (event["data"].get("material") or {}).get("subjectId") or (event["data"].get("subject") or {}).get("id")
+            return subject_id in (None, self.subject_id)
+        return True
+
+    def notify(self) -> None:
+        # Runs on the subscriber's event loop; the stream reads the events from the feed in order.
+        self.wakeup.set()
+
+
+class ChangeFeed:
+    """Sequenced, persisted log of database writes with live subscribers."""
+
+    def __init__(self, path: str = CHANGES_FILE, retention: int = CHANGE_FEED_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=retention)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._subscribers: List[_Subscriber] = []
+        self._lines_on_disk = 0
+        self._inode: Optional[int] = None
+        self._offset = 0  # end of the last complete line read
+
+    def _sync(self) -> None:
+        """Read the events appended to the file, by any process, since the last read."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # New or compacted file: read it again from the start.
+            self._events.clear()
+            self._seq, self._offset, self._lines_on_disk, self._inode = 0, 0, 0, stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A line without its newline is still being written (or was torn by a crash).
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self._lines_on_disk += 1
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event["seq"] > self._seq:
+                self._events.append(event)
+                self._seq = event["seq"]
+        self._offset += end
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        line = json.dumps(event) + "\n"
+        if self._lines_on_disk >= 2 * self.retention:
+            # Compact: rewrite only the retained tail.
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                for retained in self._events:
+                    f.write(json.dumps(retained) + "\n")
+                f.write(line)
+            os.replace(tmp_path, self.path)
+        else:
+            torn = os.path.exists(self.path) and os.path.getsize(self.path) > self._offset
+            with open(self.path, "a") as f:
+                # End a line torn by a crash, so it is skipped rather than joined to this one.
+                f.write(("\n" if torn else "") + line)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Record a write and wake up live subscribers; None if it could not be recorded."""
+        with self._lock:
+            try:
+                with file_lock(self.path):
+                    self._sync()
+                    event = {"seq": self._seq + 1, "type": event_type, "at": datetime.now().isoformat(), "data": _delta(data)}
+                    self._append(event)
+                    self._sync()
+            except OSError as e:
+                logger.error(f"Change feed - Could not persist {event_type} event: {e}")
+                return None
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            if subscriber.wants(event):
+                subscriber.loop.call_soon_threadsafe(subscriber.notify)
+        return event
+
+    @property
+    def last_seq(self) -> int:
+        with self._lock:
+            self._sync()
+            return self._seq
+
+    def since(self, seq: int, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Events after `seq`, or None if some of them are no longer retained."""
+        with self._lock:
+            self._sync()
+            if seq >= self._seq:
+                return []
+            oldest = self._events[0]["seq"] if self._events else self._seq + 1
+            if seq < oldest - 1:
+                return None
+            events = [event for event in self._events if event["seq"] > seq]
+        return events[:limit] if limit else events
+
+    def subscribe(self, types: Optional[Set[str]] = None, subject_id: Optional[str] = None) -> _Subscriber:
+        subscriber = _Subscriber(asyncio.get_running_loop(), types, subject_id)
+        with self._lock:
+            self._sync()
+            # The stream sends everything after start_seq.
+            subscriber.start_seq = self._seq
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+
+feed = ChangeFeed()
+db.subscribe(feed.publish)
+
+
+# --- Server-Sent Events ---
+def _sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def _reset(seq: int) -> str:
+    # Tells the client its position is gone: refetch, then resume from `seq`.
+    return f"id: {seq}\nevent: reset\ndata: {json.dumps({'seq': seq})}\n\n"
+
+async def stream(since: Optional[int], types: Optional[Set[str]] = None, subject_id: Optional[str] = None,
+                 is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[str]:
+    """SSE stream: missed events after `since` (if given), then live events."""
+    subscriber = feed.subscribe(types, subject_id)
+    try:
+        yield "retry: 3000\n\n"
+        last_sent = subscriber.start_seq if since is None else since
+        if since is not None:
+            backlog = feed.since(since)
+            if backlog is None:
+                last_sent = feed.last_seq
+                yield _reset(last_sent)
+            else:
+                for event in backlog:
+                    if subscriber.wants(event):
+                        yield _sse(event)
+                    last_sent = event["seq"]
+
+        last_activity = time.monotonic()
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            subscriber.wakeup.clear()
+            # Read from the feed rather than the wakeups, so events from every
+            # process come out in sequence order.
+            events = feed.since(last_sent)
+            if events is None:
+                # The client is too far behind: it gets a reset and refetches instead.
+                last_sent = feed.last_seq
+                yield _reset(last_sent)
+                continue
+            sent = False
+            for event in events:
+                last_sent = event["seq"]
+                if subscriber.wants(event):
+                    sent = True
+                    yield _sse(event)
+            if sent:
+                last_activity = time.monotonic()
+            elif time.monotonic() - last_activity >= HEARTBEAT_SECONDS:
+                last_activity = time.monotonic()
+                if is_disconnected and await is_disconnected():
+                    return
+                yield ": heartbeat\n\n"
+    finally:
+        feed.unsubscribe(subscriber)
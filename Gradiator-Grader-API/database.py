@@ -1,21 +1,90 @@
 
 import json
 import os
-from typing import List, Dict, Any, Optional, Union
-from datetime import datetime
+import time
+import logging
+import functools
+import threading
+from typing import Callable, Iterable, List, Dict, Any, Optional, Set, Tuple, Union
+from datetime import datetime, timedelta
 import uuid
+import orjson
+import metrics
+import snapshot
+import versions
+
+logger = logging.getLogger(__name__)
 
 # Define path for database files
 DB_PATH = "database"
-os.makedirs(DB_PATH, exist_ok=True)
 
 # Database file paths
 USERS_FILE = os.path.join(DB_PATH, "users.json")
 SUBJECTS_FILE = os.path.join(DB_PATH, "subjects.json")
 ASSIGNMENTS_FILE = os.path.join(DB_PATH, "assignments.json")
 MATERIALS_FILE = os.path.join(DB_PATH, "materials.json")
+USAGE_FILE = os.path.join(DB_PATH, "usage.json")
+STATS_FILE = os.path.join(DB_PATH, "assignment_stats.json")
+
+# Students can appeal a grade until this many days after the assignment's due date.
+APPEAL_WINDOW_DAYS = float(os.getenv("APPEAL_WINDOW_DAYS", "5"))
+
+# Collection and record versions for conditional requests (see versions.py).
+# Submissions share the assignments collection, keyed by submission ID.
+VERSIONS = versions.VersionStore(os.path.join(DB_PATH, "versions.json"))
+
+# Write lock
+# Every load-modify-save runs under this lock, so writers in other threads
+# (background OCR and hashing, the scheduler, imports started from the API)
+# cannot save over each other's changes. It is re-entrant because some
+# writers call others. The outermost call also holds an exclusive lock on
+# database/writes.lock, which covers writers in other processes (more server
+# workers, the bulk import CLI); see versions.file_lock.
+WRITE_LOCK_PATH = os.path.join(DB_PATH, "writes")
+_write_lock = threading.RLock()
+_writing = threading.local()  # depth of _locked calls in this thread
+
+def _locked(func: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with _write_lock:
+            depth = getattr(_writing, "depth", 0)
+            _writing.depth = depth + 1
+            try:
+                if depth:
+                    return func(*args, **kwargs)
+                # flock locks belong to an open file, so a nested call must not take it again.
+                with versions.file_lock(WRITE_LOCK_PATH):
+                    return func(*args, **kwargs)
+            finally:
+                _writing.depth = depth
+    return wrapper
+
+def _in_write() -> bool:
+    return getattr(_writing, "depth", 0) > 0
+
+# Change notifications
+# Listeners are called with (event type, data) after a write has been saved,
+# e.g. ("submission.graded", {"assignmentId": ..., "submission": {...}}).
+_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+def subscribe(listener: Callable[[str, Dict[str, Any]], None]) -> None:
+    """Register a function to be called after every write."""
+    _listeners.append(listener)
+
+def _emit(event_type: str, **data: Any) -> None:
+    for listener in _listeners:
+        try:
+            listener(event_type, data)
+        except Exception as e:
+            # A failing listener must not fail a write that has already been saved.
+            logger.error(f"Database - Listener failed for {event_type}: {e}", exc_info=True)
 
 # Helper functions
+def _collection_name(file_path: str) -> str:
+    """Name of the collection stored in a database file, e.g. 'assignments'."""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
 def load_json(file_path: str, default: Any = None) -> Any:
     """Load data from a JSON file or return default if file doesn't exist."""
     if default is None:
@@ -24,16 +93,61 @@ def load_json(file_path: str, default: Any = None) -> Any:
     if not os.path.exists(file_path):
         return default
     
+    collection = _collection_name(file_path)
+    start = time.perf_counter()
+    snap = snapshot.current(file_path)
+    if snap is not None:
+        data = snap.load()
+        metrics.DB_LOAD_DURATION.labels(collection).observe(time.perf_counter() - start)
+        metrics.DB_LOAD_BYTES.labels(collection).observe(snap.size)
+        return data
+
     try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            source = snapshot.source_of(os.fstat(f.fileno()))
+            raw = f.read()
+        size = len(raw)
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            data = json.loads(raw)  # e.g. integers beyond 64 bits
     except (json.JSONDecodeError, FileNotFoundError):
         return default
 
-def save_json(file_path: str, data: Any) -> None:
-    """Save data to a JSON file."""
-    with open(file_path, 'w') as f:
+    metrics.DB_LOAD_DURATION.labels(collection).observe(time.perf_counter() - start)
+    metrics.DB_LOAD_BYTES.labels(collection).observe(size)
+    # Snapshots are built lazily, by the first read after a save. A read inside
+    # a writer is followed by another save, so it would only build one to discard.
+    if not _in_write():
+        snapshot.refresh(file_path, data, source)
+    return data
+
+def _find_record(file_path: str, record_id: str) -> Optional[Dict[str, Any]]:
+    """A record by ID, decoding only that record when the collection has a current snapshot."""
+    snap = snapshot.current(file_path)
+    if snap is not None:
+        return snap.get(record_id)
+    for record in load_json(file_path):
+        if record.get("id") == record_id:
+            return record
+    return None
+
+def save_json(file_path: str, data: Any, changed_ids: Optional[Iterable[str]] = None) -> None:
+    """Save data to a JSON file and bump its version (only for `changed_ids`, if given)."""
+    collection = _collection_name(file_path)
+    start = time.perf_counter()
+    # Write a temporary file and swap it in, so readers (requests, the scheduler)
+    # never see a half-written file.
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(data, f, indent=2)
+        size = f.tell()
+        f.flush()
+    os.replace(tmp_path, file_path)
+
+    metrics.DB_SAVE_DURATION.labels(collection).observe(time.perf_counter() - start)
+    metrics.DB_SAVE_BYTES.labels(collection).observe(size)
+    VERSIONS.bump(collection, changed_ids)
 
 # User operations
 def get_users() -> List[Dict[str, Any]]:
@@ -42,12 +156,10 @@ def get_users() -> List[Dict[str, Any]]:
 
 def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     """Get a user by ID."""
-    users = get_users()
-    for user in users:
-        if user.get("id") == user_id:
-            return user
-    return None
+    return _find_record(USERS_FILE, user_id)
 
+
+@_locked
 def save_user(user: Dict[str, Any]) -> Dict[str, Any]:
     """Save a user to the database."""
     users = get_users()
@@ -56,16 +168,19 @@ def save_user(user: Dict[str, Any]) -> Dict[str, Any]:
     for i, existing_user in enumerate(users):
         if existing_user.get("id") == user.get("id"):
             users[i] = user
-            save_json(USERS_FILE, users)
+            save_json(USERS_FILE, users, [user["id"]])
+            _emit("user.saved", user=user)
             return user
     
     # If user doesn't exist, add new user
     if not user.get("id"):
         user["id"] = str(uuid.uuid4())
     users.append(user)
-    save_json(USERS_FILE, users)
+    save_json(USERS_FILE, users, [user["id"]])
+    _emit("user.saved", user=user)
     return user
 
+@_locked
 def delete_user(user_id: str) -> bool:
     """Delete a user from the database."""
     users = get_users()
@@ -73,7 +188,8 @@ def delete_user(user_id: str) -> bool:
     users = [user for user in users if user.get("id") != user_id]
     
     if len(users) < initial_count:
-        save_json(USERS_FILE, users)
+        save_json(USERS_FILE, users, [user_id])
+        _emit("user.deleted", userId=user_id)
         return True
     return False
 
@@ -84,12 +200,10 @@ def get_subjects() -> List[Dict[str, Any]]:
 
 def get_subject_by_id(subject_id: str) -> Optional[Dict[str, Any]]:
     """Get a subject by ID."""
-    subjects = get_subjects()
-    for subject in subjects:
-        if subject.get("id") == subject_id:
-            return subject
-    return None
+    return _find_record(SUBJECTS_FILE, subject_id)
+
 
+@_locked
 def save_subject(subject: Dict[str, Any]) -> Dict[str, Any]:
     """Save a subject to the database."""
     subjects = get_subjects()
@@ -98,14 +212,16 @@ def save_subject(subject: Dict[str, Any]) -> Dict[str, Any]:
     for i, existing_subject in enumerate(subjects):
         if existing_subject.get("id") == subject.get("id"):
             subjects[i] = subject
-            save_json(SUBJECTS_FILE, subjects)
+            save_json(SUBJECTS_FILE, subjects, [subject["id"]])
+            _emit("subject.saved", subject=subject)
             return subject
     
     # If subject doesn't exist, add new subject
     if not subject.get("id"):
         subject["id"] = str(uuid.uuid4())
     subjects.append(subject)
-    save_json(SUBJECTS_FILE, subjects)
+    save_json(SUBJECTS_FILE, subjects, [subject["id"]])
+    _emit("subject.saved", subject=subject)
     return subject
 
 # Assignment operations
@@ -115,17 +231,27 @@ def get_assignments() -> List[Dict[str, Any]]:
 
 def get_assignment_by_id(assignment_id: str) -> Optional[Dict[str, Any]]:
     """Get an assignment by ID."""
-    assignments = get_assignments()
-    for assignment in assignments:
-        if assignment.get("id") == assignment_id:
-            return assignment
-    return None
+    return _find_record(ASSIGNMENTS_FILE, assignment_id)
+
+def get_assignments_by_ids(assignment_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Assignments by ID; with a current snapshot only those are decoded, otherwise the file is read once."""
+    wanted = set(assignment_ids)
+    snap = snapshot.current(ASSIGNMENTS_FILE)
+    if snap is not None:
+        found = {assignment_id: snap.get(assignment_id) for assignment_id in wanted}
+        return {assignment_id: assignment for assignment_id, assignment in found.items() if assignment}
+    found: Dict[str, Dict[str, Any]] = {}
+    for assignment in get_assignments():
+        if assignment.get("id") in wanted:
+            found.setdefault(assignment["id"], assignment)
+    return found
 
 def get_assignments_for_subject(subject_id: str) -> List[Dict[str, Any]]:
     """Get all assignments for a subject."""
     assignments = get_assignments()
     return [a for a in assignments if a.get("subjectId") == subject_id]
 
+@_locked
 def save_assignment(assignment: Dict[str, Any]) -> Dict[str, Any]:
     """Save an assignment to the database."""
     assignments = get_assignments()
@@ -134,14 +260,20 @@ def save_assignment(assignment: Dict[str, Any]) -> Dict[str, Any]:
     for i, existing_assignment in enumerate(assignments):
         if existing_assignment.get("id") == assignment.get("id"):
             assignments[i] = assignment
-            save_json(ASSIGNMENTS_FILE, assignments)
+            # The new record may add or drop submissions; they change too.
+            changed = [assignment["id"]] + [s.get("id") for s in (existing_assignment.get("submissions") or []) + (assignment.get("submissions") or [])]
+            save_json(ASSIGNMENTS_FILE, assignments, changed)
+            _save_stats_for(assignment, compute_assignment_stats(assignment))
+            _emit("assignment.saved", assignment=assignment)
             return assignment
     
     # If assignment doesn't exist, add new assignment
     if not assignment.get("id"):
         assignment["id"] = str(uuid.uuid4())
     assignments.append(assignment)
-    save_json(ASSIGNMENTS_FILE, assignments)
+    save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"]] + [s.get("id") for s in assignment.get("submissions") or []])
+    _save_stats_for(assignment, compute_assignment_stats(assignment))
+    _emit("assignment.saved", assignment=assignment)
     return assignment
 
 # Material operations
@@ -151,17 +283,15 @@ def get_materials() -> List[Dict[str, Any]]:
 
 def get_material_by_id(material_id: str) -> Optional[Dict[str, Any]]:
     """Get a material by ID."""
-    materials = get_materials()
-    for material in materials:
-        if material.get("id") == material_id:
-            return material
-    return None
+    return _find_record(MATERIALS_FILE, material_id)
+
 
 def get_materials_for_subject(subject_id: str) -> List[Dict[str, Any]]:
     """Get all materials for a subject."""
     materials = get_materials()
     return [m for m in materials if m.get("subjectId") == subject_id]
 
+@_locked
 def save_material(material: Dict[str, Any]) -> Dict[str, Any]:
     """Save a material to the database."""
     materials = get_materials()
@@ -170,21 +300,26 @@ def save_material(material: Dict[str, Any]) -> Dict[str, Any]:
     for i, existing_material in enumerate(materials):
         if existing_material.get("id") == material.get("id"):
             materials[i] = material
-            save_json(MATERIALS_FILE, materials)
+            save_json(MATERIALS_FILE, materials, [material["id"]])
+            _emit("material.saved", material=material)
             return material
     
     # If material doesn't exist, add new material
     if not material.get("id"):
         material["id"] = str(uuid.uuid4())
     materials.append(material)
-    save_json(MATERIALS_FILE, materials)
+    save_json(MATERIALS_FILE, materials, [material["id"]])
+    _emit("material.saved", material=material)
     return material
 
 # Submission operations
 def get_submission_by_id(submission_id: str) -> Optional[Dict[str, Any]]:
     """Get a submission by ID."""
-    assignments = get_assignments()
+    snap = snapshot.current(ASSIGNMENTS_FILE)
+    assignments = [snap.parent_of(submission_id)] if snap is not None else get_assignments()
     for assignment in assignments:
+        if not assignment:
+            continue
         submissions = assignment.get("submissions", [])
         for submission in submissions:
             if submission.get("id") == submission_id:
@@ -211,6 +346,7 @@ def get_submissions_by_student(student_id: str) -> List[Dict[str, Any]]:
     
     return student_submissions
 
+@_locked
 def submit_assignment(assignment_id: str, submission_data: Dict[str, Any]) -> Dict[str, Any]:
     """Submit an assignment."""
     assignments = get_assignments()
@@ -235,25 +371,35 @@ def submit_assignment(assignment_id: str, submission_data: Dict[str, Any]) -> Di
     if not assignments[assignment_idx].get("submissions"):
         assignments[assignment_idx]["submissions"] = []
     
+    all_stats, stats = _stats_for(assignments[assignment_idx])
     assignments[assignment_idx]["submissions"].append(submission)
-    assignments[assignment_idx]["status"] = "submitted"
+    _count_submission(stats, submission, 1)
+    _apply_stats(assignments[assignment_idx], stats)
     
-    save_json(ASSIGNMENTS_FILE, assignments)
+    save_json(ASSIGNMENTS_FILE, assignments, [assignment_id, submission["id"]])
+    _save_stats(all_stats)
+    _emit("submission.created", assignmentId=assignment_id, subjectId=assignments[assignment_idx].get("subjectId"),
+          studentId=submission.get("studentId"), submission=submission)
     return submission
 
+@_locked
 def grade_submission(submission_id: str, grade: int, feedback: str) -> Dict[str, Any]:
     """Grade a submission."""
     assignments = get_assignments()
     updated_submission = None
+    all_stats = None
     
     for i, assignment in enumerate(assignments):
         submissions = assignment.get("submissions", [])
         for j, submission in enumerate(submissions):
             if submission.get("id") == submission_id:
+                all_stats, stats = _stats_for(assignment)
+                _count_submission(stats, submission, -1)
                 assignments[i]["submissions"][j]["grade"] = grade
                 assignments[i]["submissions"][j]["feedback"] = feedback
                 assignments[i]["submissions"][j]["status"] = "graded"
-                assignments[i]["status"] = "graded"
+                _count_submission(stats, submission, 1)
+                _apply_stats(assignment, stats)
                 updated_submission = assignments[i]["submissions"][j]
                 break
         if updated_submission:
@@ -262,9 +408,13 @@ def grade_submission(submission_id: str, grade: int, feedback: str) -> Dict[str,
     if not updated_submission:
         raise ValueError(f"Submission with ID {submission_id} not found")
     
-    save_json(ASSIGNMENTS_FILE, assignments)
+    save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"], submission_id])
+    _save_stats(all_stats)
+    _emit("submission.graded", assignmentId=assignment["id"], subjectId=assignment.get("subjectId"),
+          studentId=updated_submission.get("studentId"), submission=updated_submission)
     return updated_submission
 
+@_locked
 def submit_appeal(submission_id: str, reason: str) -> Dict[str, Any]:
     """Submit an appeal for a graded submission."""
     assignments = get_assignments()
@@ -288,6 +438,10 @@ def submit_appeal(submission_id: str, reason: str) -> Dict[str, Any]:
     
     if not submission.get("grade"):
         raise ValueError("Cannot appeal a submission that hasn't been graded")
+
+    deadline = appeal_deadline(assignments[assignment_idx])
+    if deadline and datetime.now().astimezone() > deadline:
+        raise ValueError(f"The appeal window for this assignment closed on {deadline.isoformat()}")
     
     appeal = {
         "id": f"appeal_{str(uuid.uuid4())}",
@@ -298,37 +452,39 @@ def submit_appeal(submission_id: str, reason: str) -> Dict[str, Any]:
         "originalGrade": submission.get("grade")
     }
     
+    all_stats, stats = _stats_for(assignments[assignment_idx])
+    _count_submission(stats, submission, -1)
     assignments[assignment_idx]["submissions"][submission_idx]["appeal"] = appeal
-    assignments[assignment_idx]["hasAppeal"] = True
+    _count_submission(stats, submission, 1)
+    _apply_stats(assignments[assignment_idx], stats)
     
-    save_json(ASSIGNMENTS_FILE, assignments)
+    save_json(ASSIGNMENTS_FILE, assignments, [assignments[assignment_idx]["id"], submission_id])
+    _save_stats(all_stats)
+    _emit("appeal.created", assignmentId=assignments[assignment_idx]["id"], subjectId=assignments[assignment_idx].get("subjectId"),
+          studentId=submission.get("studentId"), appeal=appeal)
     return appeal
 
+@_locked
 def review_appeal(submission_id: str, new_grade: int, feedback: str) -> Dict[str, Any]:
     """Review an appeal."""
     assignments = get_assignments()
     updated_submission = None
+    all_stats = None
     
     for i, assignment in enumerate(assignments):
         submissions = assignment.get("submissions", [])
         for j, submission in enumerate(submissions):
             if submission.get("id") == submission_id and submission.get("appeal"):
+                all_stats, stats = _stats_for(assignment)
+                _count_submission(stats, submission, -1)
                 assignments[i]["submissions"][j]["grade"] = new_grade
                 assignments[i]["submissions"][j]["feedback"] = feedback
                 assignments[i]["submissions"][j]["appeal"]["status"] = "reviewed"
                 assignments[i]["submissions"][j]["appeal"]["reviewedAt"] = datetime.now().isoformat()
+                _count_submission(stats, submission, 1)
+                # hasAppeal follows the pending-appeal counter, no rescan needed
+                _apply_stats(assignment, stats)
                 updated_submission = assignments[i]["submissions"][j]
-                
-                # Check if all appeals are reviewed
-                all_reviewed = True
-                for sub in assignments[i]["submissions"]:
-                    if sub.get("appeal") and sub["appeal"]["status"] != "reviewed":
-                        all_reviewed = False
-                        break
-                
-                if all_reviewed:
-                    assignments[i]["hasAppeal"] = False
-                
                 break
         if updated_submission:
             break
@@ -336,12 +492,413 @@ def review_appeal(submission_id: str, new_grade: int, feedback: str) -> Dict[str
     if not updated_submission:
         raise ValueError(f"Submission with ID {submission_id} not found or has no appeal")
     
-    save_json(ASSIGNMENTS_FILE, assignments)
+    save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"], submission_id])
+    _save_stats(all_stats)
+    _emit("appeal.reviewed", assignmentId=assignment["id"], subjectId=assignment.get("subjectId"),
+          studentId=updated_submission.get("studentId"), submission=updated_submission)
     return updated_submission
 
+# Bulk operations
+# Many records with one read and one write of the collection (see bulk_import.py).
+# The result has one entry per input record, in order: ("created" | "updated",
+# saved record) or ("error", {"error": message}) for a record that wasn't stored.
+BulkResult = Tuple[str, Dict[str, Any]]
+
+@_locked
+def _upsert(file_path: str, records: List[Dict[str, Any]], key_field: str, defaults: Dict[str, Any],
+            event_type: str, event_field: str) -> List[BulkResult]:
+    """Insert or update records matched by ID, else by `key_field` (case-insensitive); given fields win."""
+    existing = load_json(file_path)
+    by_id: Dict[str, int] = {}
+    by_key: Dict[str, int] = {}
+    for position, record in enumerate(existing):
+        if record.get("id"):
+            by_id.setdefault(record["id"], position)
+        if record.get(key_field):
+            by_key.setdefault(str(record[key_field]).strip().lower(), position)
+
+    results: List[BulkResult] = []
+    for record in records:
+        key = str(record.get(key_field) or "").strip().lower()
+        position = by_id.get(record.get("id"))
+        owner = by_key.get(key) if key else None
+        if owner is not None and position is None and not record.get("id"):
+            position = owner
+        elif owner is not None and owner != position:
+            results.append(("error", {"error": f"The {key_field} {record[key_field]} belongs to {existing[owner].get('id')}"}))
+            continue
+        if position is None:
+            saved = {**defaults, **record, "id": record.get("id") or str(uuid.uuid4())}
+            by_id[saved["id"]] = len(existing)
+            existing.append(saved)
+            outcome = "created"
+        else:
+            saved = existing[position] = {**existing[position], **record, "id": existing[position]["id"]}
+            outcome = "updated"
+        if key:
+            by_key[key] = by_id[saved["id"]]
+        results.append((outcome, saved))
+
+    saved_records = [saved for outcome, saved in results if outcome != "error"]
+    if saved_records:
+        save_json(file_path, existing, [saved["id"] for saved in saved_records])
+        for saved in saved_records:
+            _emit(event_type, **{event_field: saved})
+    return results
+
+def upsert_users(users: List[Dict[str, Any]]) -> List[BulkResult]:
+    """Insert or update users, matched by ID or email. New users are students unless a role is given."""
+    return _upsert(USERS_FILE, users, "email", {"role": "student"}, "user.saved", "user")
+
+def upsert_subjects(subjects: List[Dict[str, Any]]) -> List[BulkResult]:
+    """Insert or update subjects, matched by ID or code."""
+    return _upsert(SUBJECTS_FILE, subjects, "code", {"description": ""}, "subject.saved", "subject")
+
+@_locked
+def import_submissions(submissions: List[Dict[str, Any]]) -> List[BulkResult]:
+    """
+    Insert or update submissions, each with an "id" and "assignmentId", matched by
+    ID within their assignment. Status, grade and appeal are stored as given and
+    the assignment statistics follow.
+    """
+    assignments = get_assignments()
+    assignment_positions: Dict[str, int] = {}
+    for position, assignment in enumerate(assignments):
+        assignment_positions.setdefault(assignment.get("id"), position)
+    all_stats = load_json(STATS_FILE, {})
+    touched: Dict[int, Dict[str, int]] = {}  # assignment position -> submission positions by ID
+
+    results: List[BulkResult] = []
+    for submission in submissions:
+        i = assignment_positions.get(submission.get("assignmentId"))
+        if i is None:
+            results.append(("error", {"error": f"Assignment with ID {submission.get('assignmentId')} not found"}))
+            continue
+        assignment = assignments[i]
+        if not assignment.get("submissions"):
+            assignment["submissions"] = []
+        if i not in touched:
+            if assignment["id"] not in all_stats:
+                all_stats[assignment["id"]] = compute_assignment_stats(assignment)
+            touched[i] = {}
+            for j, existing in enumerate(assignment["submissions"]):
+                touched[i].setdefault(existing.get("id"), j)
+        stats = all_stats[assignment["id"]]
+
+        j = touched[i].get(submission["id"])
+        if j is None:
+            touched[i][submission["id"]] = len(assignment["submissions"])
+            assignment["submissions"].append(submission)
+            outcome = "created"
+        else:
+            _count_submission(stats, assignment["submissions"][j], -1)
+            submission = assignment["submissions"][j] = {**assignment["submissions"][j], **submission}
+            outcome = "updated"
+        _count_submission(stats, submission, 1)
+        results.append((outcome, submission))
+
+    if touched:
+        for i in touched:
+            _apply_stats(assignments[i], all_stats[assignments[i]["id"]])
+        changed = [assignments[i]["id"] for i in touched] + [saved["id"] for outcome, saved in results if outcome != "error"]
+        save_json(ASSIGNMENTS_FILE, assignments, changed)
+        _save_stats(all_stats)
+        for i in touched:
+            _emit("assignment.saved", assignment=assignments[i])
+    return results
+
+# Deadlines
+def parse_due_date(value: Optional[str]) -> Optional[datetime]:
+    """A due date as an aware datetime; dates without a time mean the end of that day, local time."""
+    if not value:
+        return None
+    try:
+        due = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if len(value) <= 10:
+        due += timedelta(days=1, microseconds=-1)
+    return due.astimezone() if due.tzinfo is None else due
+
+def appeal_deadline(assignment: Dict[str, Any]) -> Optional[datetime]:
+    """The stored appealDeadline, or the one that follows from the due date if it hasn't been set yet."""
+    deadline = parse_due_date(assignment.get("appealDeadline"))
+    if deadline:
+        return deadline
+    due = parse_due_date(assignment.get("dueDate"))
+    return due + timedelta(days=APPEAL_WINDOW_DAYS) if due else None
+
+@_locked
+def close_assignment(assignment_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Apply the due date: set the appeal deadline and move an assignment nobody
+    submitted to yet from "upcoming" to "closed". None if it doesn't exist.
+    """
+    assignments = get_assignments()
+    for assignment in assignments:
+        if assignment.get("id") != assignment_id:
+            continue
+        due = parse_due_date(assignment.get("dueDate"))
+        if due:
+            assignment["appealDeadline"] = (due + timedelta(days=APPEAL_WINDOW_DAYS)).isoformat()
+        if assignment.get("status") == "upcoming":
+            assignment["status"] = "closed"
+        assignment["closedAt"] = datetime.now().isoformat()
+        save_json(ASSIGNMENTS_FILE, assignments, [assignment_id])
+        _emit("assignment.closed", assignmentId=assignment_id, subjectId=assignment.get("subjectId"),
+              status=assignment["status"], appealDeadline=assignment.get("appealDeadline"))
+        return assignment
+    return None
+
+# Assignment statistics
+# Per-assignment counters kept in assignment_stats.json and updated in place by
+# the submission operations above, so dashboards can read a summary without
+# loading and scanning the submission lists. Entries missing for older data are
+# computed from the submissions the first time they are needed.
+def _empty_stats(assignment: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "assignmentId": assignment.get("id"),
+        "subjectId": assignment.get("subjectId"),
+        "submitted": 0,
+        "graded": 0,
+        "pendingAppeals": 0,
+        "reviewedAppeals": 0,
+        "gradeCount": 0,
+        "gradeSum": 0,
+        "gradeSumSquares": 0,
+        "gradeMin": None,
+        "gradeMax": None,
+    }
+
+def _count_submission(stats: Dict[str, Any], submission: Dict[str, Any], sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) one submission's contribution to the counters."""
+    stats["submitted"] += sign
+    if submission.get("status") == "graded":
+        stats["graded"] += sign
+    appeal_status = (submission.get("appeal") or {}).get("status")
+    if appeal_status == "pending":
+        stats["pendingAppeals"] += sign
+    elif appeal_status == "reviewed":
+        stats["reviewedAppeals"] += sign
+
+    grade = submission.get("grade")
+    if grade is None:
+        return
+    stats["gradeCount"] += sign
+    stats["gradeSum"] += sign * grade
+    stats["gradeSumSquares"] += sign * grade * grade
+    if sign > 0:
+        stats["gradeMin"] = grade if stats["gradeMin"] is None else min(stats["gradeMin"], grade)
+        stats["gradeMax"] = grade if stats["gradeMax"] is None else max(stats["gradeMax"], grade)
+    elif grade in (stats["gradeMin"], stats["gradeMax"]):
+        # An extreme can't be undone incrementally; flag it for a rescan.
+        stats["gradeMin"] = stats["gradeMax"] = None
+        stats["_rescanExtremes"] = True
+
+def compute_assignment_stats(assignment: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute an assignment's counters from its submissions."""
+    stats = _empty_stats(assignment)
+    for submission in assignment.get("submissions") or []:
+        _count_submission(stats, submission, 1)
+    return stats
+
+def _stats_for(assignment: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Load all counters and return them with the (possibly backfilled) entry for one assignment."""
+    all_stats = load_json(STATS_FILE, {})
+    stats = all_stats.get(assignment["id"])
+    if stats is None:
+        stats = all_stats[assignment["id"]] = compute_assignment_stats(assignment)
+    return all_stats, stats
+
+def _apply_stats(assignment: Dict[str, Any], stats: Dict[str, Any]) -> None:
+    """Finish an incremental update and derive the assignment's status fields from the counters."""
+    if stats.pop("_rescanExtremes", False):
+        grades = [s["grade"] for s in assignment.get("submissions") or [] if s.get("grade") is not None]
+        stats["gradeMin"] = min(grades, default=None)
+        stats["gradeMax"] = max(grades, default=None)
+    stats["subjectId"] = assignment.get("subjectId")
+    if stats["submitted"]:
+        assignment["status"] = "graded" if stats["graded"] == stats["submitted"] else "submitted"
+    assignment["hasAppeal"] = stats["pendingAppeals"] > 0
+
+@_locked
+def _save_stats(all_stats: Optional[Dict[str, Any]]) -> None:
+    if all_stats is not None:
+        save_json(STATS_FILE, all_stats)
+
+@_locked
+def _save_stats_for(assignment: Dict[str, Any], stats: Dict[str, Any]) -> None:
+    all_stats = load_json(STATS_FILE, {})
+    all_stats[assignment["id"]] = stats
+    save_json(STATS_FILE, all_stats)
+
+def summarize_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Counters plus the derived mean and standard deviation of the grades."""
+    summary = dict(stats)
+    count = stats["gradeCount"]
+    summary["gradeMean"] = round(stats["gradeSum"] / count, 3) if count else None
+    if count:
+        variance = max(0.0, stats["gradeSumSquares"] / count - (stats["gradeSum"] / count) ** 2)
+        summary["gradeStdDev"] = round(variance ** 0.5, 3)
+    else:
+        summary["gradeStdDev"] = None
+    return summary
+
+def get_assignment_stats(assignment_id: str) -> Optional[Dict[str, Any]]:
+    """Get the counters for one assignment (None if the assignment doesn't exist)."""
+    stats = load_json(STATS_FILE, {}).get(assignment_id)
+    if stats is None:
+        assignment = get_assignment_by_id(assignment_id)
+        if not assignment:
+            return None
+        stats = compute_assignment_stats(assignment)
+        _save_stats_for(assignment, stats)
+    return summarize_stats(stats)
+
+def get_all_assignment_stats(subject_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get the counters for every assignment, optionally only those of one subject."""
+    return [
+        summarize_stats(stats) for stats in load_json(STATS_FILE, {}).values()
+        if subject_id is None or stats.get("subjectId") == subject_id
+    ]
+
+@_locked
+def rebuild_assignment_stats() -> int:
+    """Recompute the counters of every assignment from scratch; returns the number of assignments."""
+    all_stats = {assignment["id"]: compute_assignment_stats(assignment) for assignment in get_assignments() if assignment.get("id")}
+    save_json(STATS_FILE, all_stats)
+    return len(all_stats)
+
+@_locked
+def set_submission_text_extraction(submission_id: str, extraction: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the text extraction summary of a submission (the text itself is stored by content hash)."""
+    assignments = get_assignments()
+    for assignment in assignments:
+        for submission in assignment.get("submissions", []):
+            if submission.get("id") == submission_id:
+                submission["textExtraction"] = extraction
+                save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"], submission_id])
+                _emit("submission.text_extracted", assignmentId=assignment["id"], subjectId=assignment.get("subjectId"),
+                      studentId=submission.get("studentId"), submissionId=submission_id, textExtraction=extraction)
+                return submission
+    raise ValueError(f"Submission with ID {submission_id} not found")
+
+@_locked
+def set_submission_image_hashes(submission_id: str, hashes: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the content and perceptual hashes of a submission's pages."""
+    assignments = get_assignments()
+    for assignment in assignments:
+        for submission in assignment.get("submissions", []):
+            if submission.get("id") == submission_id:
+                submission["imageHashes"] = hashes
+                save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"], submission_id])
+                _emit("submission.hashed", assignmentId=assignment["id"], subjectId=assignment.get("subjectId"),
+                      studentId=submission.get("studentId"), submissionId=submission_id, imageHashes=hashes)
+                return submission
+    raise ValueError(f"Submission with ID {submission_id} not found")
+
+@_locked
+def flag_submission_for_review(submission_id: str, reason: str, details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Mark a submission as needing a teacher's review (e.g. pages rejected by the pre-screen)."""
+    assignments = get_assignments()
+    for assignment in assignments:
+        for submission in assignment.get("submissions", []):
+            if submission.get("id") == submission_id:
+                submission["needsReview"] = True
+                submission["reviewReason"] = reason
+                if details is not None:
+                    submission["prescreen"] = details
+                save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"], submission_id])
+                _emit("submission.flagged", assignmentId=assignment["id"], subjectId=assignment.get("subjectId"),
+                      studentId=submission.get("studentId"), submissionId=submission_id, reason=reason)
+                return submission
+    raise ValueError(f"Submission with ID {submission_id} not found")
+
+@_locked
+def set_grading_key(submission_id: str, key: str) -> Dict[str, Any]:
+    """Remember which task file and criteria a submission was AI-graded against."""
+    assignments = get_assignments()
+    for assignment in assignments:
+        for submission in assignment.get("submissions", []):
+            if submission.get("id") == submission_id:
+                submission["gradingKey"] = key
+                save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"], submission_id])
+                return submission
+    raise ValueError(f"Submission with ID {submission_id} not found")
+
+# AI usage accounting operations
+def get_usage_records() -> List[Dict[str, Any]]:
+    """Get the daily AI usage aggregates (one row per day, subject, assignment and model)."""
+    return load_json(USAGE_FILE)
+
+@_locked
+def record_grading_usage(usage: Dict[str, Any], day: str, subject_id: Optional[str] = None,
+                         assignment_id: Optional[str] = None, submission_id: Optional[str] = None) -> Dict[str, Any]:
+    """Add the usage of one grading (or OCR) job to the daily aggregates and, if given, to the submission."""
+    records = get_usage_records()
+    key = (day, subject_id, assignment_id, usage.get("model"))
+    record = None
+    for existing in records:
+        if (existing.get("day"), existing.get("subjectId"), existing.get("assignmentId"), existing.get("model")) == key:
+            record = existing
+            break
+
+    if record is None:
+        record = {
+            "day": day, "subjectId": subject_id, "assignmentId": assignment_id, "model": usage.get("model"),
+            "gradings": 0, "calls": 0, "inputTokens": 0, "outputTokens": 0, "imageBytes": 0, "latencyMs": 0.0, "costUsd": 0.0
+        }
+        records.append(record)
+
+    if usage.get("mode") != "ocr":
+        record["gradings"] += 1
+    for field in ("calls", "inputTokens", "outputTokens", "imageBytes"):
+        record[field] += usage.get(field, 0)
+    record["latencyMs"] = round(record["latencyMs"] + usage.get("latencyMs", 0.0), 3)
+    record["costUsd"] = round(record["costUsd"] + usage.get("costUsd", 0.0), 6)
+    save_json(USAGE_FILE, records)
+
+    if submission_id:
+        assignments = get_assignments()
+        for assignment in assignments:
+            for submission in assignment.get("submissions", []):
+                if submission.get("id") == submission_id:
+                    submission.setdefault("aiUsage", []).append({**usage, "recordedAt": datetime.now().isoformat()})
+                    save_json(ASSIGNMENTS_FILE, assignments, [assignment["id"], submission_id])
+                    return record
+    return record
+
+# File reference operations
+def get_referenced_files() -> Set[str]:
+    """Get the URLs of every uploaded file referenced by a database record."""
+    referenced = set()
+
+    for subject in get_subjects():
+        if subject.get("imageUrl"):
+            referenced.add(subject["imageUrl"])
+
+    for assignment in get_assignments():
+        referenced.update(assignment.get("files") or [])
+        for submission in assignment.get("submissions") or []:
+            referenced.update(submission.get("files") or [])
+
+    for material in get_materials():
+        if material.get("fileUrl"):
+            referenced.add(material["fileUrl"])
+
+    return referenced
+
+def open_snapshots() -> None:
+    """Map the collection snapshots at startup, building missing or stale ones from the JSON files."""
+    for file_path in (USERS_FILE, SUBJECTS_FILE, ASSIGNMENTS_FILE, MATERIALS_FILE, USAGE_FILE, STATS_FILE):
+        if os.path.exists(file_path) and snapshot.current(file_path) is None:
+            load_json(file_path)
+
 # Initialize database with sample data if empty
+@_locked
 def initialize_if_empty():
     """Initialize the database with sample data if it's empty."""
+    os.makedirs(DB_PATH, exist_ok=True)
     if not os.path.exists(SUBJECTS_FILE) or not load_json(SUBJECTS_FILE):
         # Import sample data
         try:
@@ -365,5 +922,7 @@ def initialize_if_empty():
             
             print("Empty database initialized")
 
-# Initialize the database when this module is imported
-initialize_if_empty()
+    if not os.path.exists(STATS_FILE):
+        count = rebuild_assignment_stats()
+        print(f"Assignment statistics built for {count} assignments")
+
@@ -0,0 +1,323 @@
+import io
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+import database as db
+import metrics
+from blobstore import BlobStore, key_from_url
+from ocr import content_hash, file_hash
+
+logger = logging.getLogger(__name__)
+
+# --- Duplicate Detection Configuration ---
+# Every submission image gets a 64-bit perceptual hash (pHash, from the DCT of
+# a 32x32 thumbnail) and a difference hash (dHash, from brightness gradients)
+# at upload time. Two pages match when both hashes are within the Hamming
+# distances below. On synthetic homework pages a re-compressed, rescaled,
+# slightly rotated or re-photographed page stays within pHash 12 / dHash 8 of
+# the original, a 3% crop reaches dHash 10, and different pages are 16+ apart
+# in both hashes; the dHash default of 10 covers the crop. Pages are looked up
+# in a BK-tree per assignment, so a query only visits the part of the tree
+# within range.
+DUPLICATE_MAX_PHASH_DISTANCE = int(os.getenv("DUPLICATE_MAX_PHASH_DISTANCE", "12"))
+DUPLICATE_MAX_DHASH_DISTANCE = int(os.getenv("DUPLICATE_MAX_DHASH_DISTANCE", "10"))
+# Share of pages that must match for two submissions to be near-duplicates.
+DUPLICATE_MIN_PAGE_SHARE = float(os.getenv("DUPLICATE_MIN_PAGE_SHARE", "1.0"))
+# Grade a near-duplicate of an already graded submission by copying its grade.
+DUPLICATE_REUSE_GRADES = os.getenv("DUPLICATE_REUSE_GRADES", "1") == "1"
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+DCT_SIZE = 32
+HASH_SIZE = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    return np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int("".join("1" if bit else "0" for bit in bits.flatten()), 2)
+
+def _gray(image: Image.Image) -> Image.Image:
+    return ImageOps.exif_transpose(image).convert("L")
+
+def phash(image: Image.Image) -> int:
+    """Perceptual hash: low-frequency DCT coefficients above/below their median."""
+    pixels = np.asarray(_gray(image).resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term (overall brightness) would dominate the median.
+    return _bits_to_int(low > np.median(low[1:]))
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash: whether each pixel is brighter than its left neighbour."""
+    pixels = np.asarray(_gray(image).resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def _hex(value: int) -> str:
+    return f"{value:016x}"
+
+def hash_page(data: bytes, name: str) -> Dict[str, Any]:
+    """Content and perceptual hashes of one page; non-images only get the content hash."""
+    page: Dict[str, Any] = {"sha256": content_hash(data), "phash": None, "dhash": None}
+    if name.lower().endswith(IMAGE_EXTENSIONS):
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                page["phash"], page["dhash"] = _hex(phash(image)), _hex(dhash(image))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Duplicates - Cannot hash {name}: {e}")
+    return page
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance."""
+
+    def __init__(self):
+        # node: [hash, values, {distance: child node}]
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, key: int, value: Any) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [key, [value], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, [value], {}]
+                return
+            node = child
+
+    def search(self, key: int, radius: int) -> List[Tuple[int, Any]]:
+        """(distance, value) of every entry within `radius` of `key`."""
+        found: List[Tuple[int, Any]] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= radius:
+                found.extend((distance, value) for value in node[1])
+            # Triangle inequality: only children at distance d ± radius can hold matches.
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class _AssignmentIndex:
+    """Hashed pages of one assignment's submissions."""
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.pages: Dict[str, List[Dict[str, Any]]] = {}
+
+    def add(self, submission_id: str, pages: List[Dict[str, Any]]) -> None:
+        self.pages[submission_id] = pages
+        for number, page in enumerate(pages):
+            if page.get("phash"):
+                self.tree.add(int(page["phash"], 16), (submission_id, number))
+
+    def matches(self, pages: List[Dict[str, Any]], exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Submissions that are near-duplicates of these pages, closest first."""
+        # candidate -> {query page: (distance, exact)}
+        candidates: Dict[str, Dict[int, Tuple[int, bool]]] = {}
+        for number, page in enumerate(pages):
+            if not page.get("phash"):
+                continue
+            page_dhash = int(page["dhash"], 16)
+            for distance, (submission_id, other_number) in self.tree.search(int(page["phash"], 16), DUPLICATE_MAX_PHASH_DISTANCE):
+                if submission_id == exclude or submission_id not in self.pages:
+                    continue
+                other = self.pages[submission_id][other_number]
+                if hamming(page_dhash, int(other["dhash"], 16)) > DUPLICATE_MAX_DHASH_DISTANCE:
+                    continue
+                best = candidates.setdefault(submission_id, {}).get(number)
+                if best is None or distance < best[0]:
+                    candidates[submission_id][number] = (distance, page["sha256"] == other["sha256"])
+
+        results = []
+        for submission_id, matched in candidates.items():
+            hashed = max(sum(1 for p in pages if p.get("phash")), sum(1 for p in self.pages[submission_id] if p.get("phash")))
+            if len(matched) < DUPLICATE_MIN_PAGE_SHARE * hashed:
+                continue
+            results.append({
+                "submissionId": submission_id,
+                "distance": max(distance for distance, _ in matched.values()),
+                "exact": all(exact for _, exact in matched.values()) and len(pages) == len(self.pages[submission_id]),
+            })
+        return sorted(results, key=lambda match: match["distance"])
+
+
+# --- Index ---
+_indexes: Dict[str, _AssignmentIndex] = {}
+_lock = threading.Lock()
+
+def _index_for(assignment: Dict[str, Any]) -> _AssignmentIndex:
+    with _lock:
+        index = _indexes.get(assignment["id"])
+        if index is None:
+            index = _AssignmentIndex()
+            for submission in assignment.get("submissions") or []:
+                hashes = submission.get("imageHashes")
+                if hashes:
+                    index.add(submission["id"], hashes["pages"])
+            _indexes[assignment["id"]] = index
+        return index
+
+def invalidate(event_type: str, data: Dict[str, Any]) -> None:
+    """Keep the per-assignment indexes in step with database writes."""
+    with _lock:
+        if event_type == "submission.hashed":
+            index = _indexes.get(data.get("assignmentId"))
+            if index is not None:
+                index.add(data["submissionId"], data["imageHashes"]["pages"])
+        elif event_type.startswith("assignment."):
+            _indexes.pop((data.get("assignment") or {}).get("id") or data.get("assignmentId"), None)
+
+db.subscribe(invalidate)
+
+
+# --- Pipeline ---
+def hash_submission(store: BlobStore, submission_id: str) -> Optional[Dict[str, Any]]:
+    """Hash every page of a submission and record the hashes on it."""
+    submission = db.get_submission_by_id(submission_id)
+    if not submission:
+        return None
+    pages = []
+    for url in submission.get("files") or []:
+        key = key_from_url(url)
+        try:
+            data = store.read(key)
+        except FileNotFoundError:
+            logger.warning(f"Duplicates - File {url} of submission {submission_id} is missing")
+            pages.append({"file": url, "sha256": None, "phash": None, "dhash": None})
+            continue
+        pages.append({"file": url, **hash_page(data, key)})
+    hashes = {"pages": pages, "hashedAt": datetime.now().isoformat()}
+    db.set_submission_image_hashes(submission_id, hashes)
+    return hashes
+
+def hash_submission_safely(store: BlobStore, submission_id: str) -> None:
+    """Background-task wrapper: hashing failures are logged, never raised."""
+    try:
+        hash_submission(store, submission_id)
+    except Exception as e:
+        logger.error(f"Duplicates - Hashing submission {submission_id} failed: {e}", exc_info=True)
+
+def hash_missing(store: BlobStore, assignment_id: str) -> int:
+    """Hash the submissions of an assignment uploaded before hashing existed."""
+    assignment = db.get_assignment_by_id(assignment_id)
+    missing = [s["id"] for s in (assignment or {}).get("submissions") or [] if not s.get("imageHashes")]
+    for submission_id in missing:
+        hash_submission_safely(store, submission_id)
+    return len(missing)
+
+
+def _summary(submission: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: submission.get(key) for key in ("id", "studentId", "studentName", "status", "grade", "submittedAt")}
+
+def find_clusters(assignment_id: str) -> Optional[Dict[str, Any]]:
+    """Groups of near-duplicate submissions of an assignment."""
+    assignment = db.get_assignment_by_id(assignment_id)
+    if not assignment:
+        return None
+    index = _index_for(assignment)
+    submissions = {s["id"]: s for s in assignment.get("submissions") or []}
+    parent: Dict[str, str] = {}
+    def root(submission_id: str) -> str:
+        parent.setdefault(submission_id, submission_id)
+        while parent[submission_id] != submission_id:
+            parent[submission_id] = parent[parent[submission_id]]
+            submission_id = parent[submission_id]
+        return submission_id
+
+    # Union-find over every near-duplicate pair.
+    pairs = []
+    with _lock:
+        hashed = len(index.pages)
+        for submission_id, pages in index.pages.items():
+            for match in index.matches(pages, exclude=submission_id):
+                if submission_id < match["submissionId"]:
+                    pairs.append((submission_id, match))
+                    parent[root(match["submissionId"])] = root(submission_id)
+
+    groups: Dict[str, Set[str]] = {}
+    for submission_id, match in pairs:
+        groups.setdefault(root(submission_id), set()).update((submission_id, match["submissionId"]))
+    clusters = []
+    for members in groups.values():
+        links = [(a, m) for a, m in pairs if a in members]
+        clusters.append({
+            "size": len(members),
+            "maxDistance": max(m["distance"] for _, m in links),
+            "exact": all(m["exact"] for _, m in links),
+            "students": len({submissions.get(s, {}).get("studentId") for s in members}),
+            "submissions": [_summary(submissions[s]) for s in sorted(members) if s in submissions],
+            "pairs": [{"a": a, "b": m["submissionId"], "distance": m["distance"], "exact": m["exact"]} for a, m in links],
+        })
+
+    return {
+        "assignmentId": assignment_id,
+        "hashedSubmissions": hashed,
+        "unhashedSubmissions": len(submissions) - hashed,
+        "clusters": sorted(clusters, key=lambda c: (-c["size"], c["maxDistance"])),
+    }
+
+def grading_key(task_path: str, criteria: str) -> str:
+    """Hash of the task file and criteria a grade was given against."""
+    return content_hash(f"{file_hash(task_path)}\n{criteria.strip()}".encode("utf-8"))
+
+def find_graded_duplicate(assignment_id: str, paths: List[str], key: str, exclude: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    The closest graded near-duplicate of these solution files within an assignment, if any.
+    Only grades given against the same task file and criteria (the same grading key) count.
+    """
+    assignment = db.get_assignment_by_id(assignment_id)
+    if not assignment:
+        return None
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pages.append(hash_page(f.read(), path))
+    submissions = {s["id"]: s for s in assignment.get("submissions") or []}
+    index = _index_for(assignment)
+    with _lock:
+        matches = index.matches(pages, exclude=exclude)
+    for match in matches:
+        submission = submissions.get(match["submissionId"])
+        if (submission and submission.get("status") == "graded" and submission.get("grade") is not None
+                and submission.get("gradingKey") == key):
+            metrics.DUPLICATE_MATCHES.labels("exact" if match["exact"] else "near").inc()
+            return {**match, "submission": submission, "maxGrade": assignment.get("maxGrade") or 100}
+    return None
+
+def reused_result(duplicate: Dict[str, Any]) -> Dict[str, Any]:
+    """Grading result copied from a graded near-duplicate (scores are out of 100)."""
+    submission = duplicate["submission"]
+    return {
+        "score": round(submission["grade"] * 100 / duplicate["maxGrade"]),
+        "feedback": submission.get("feedback") or "",
+        "duplicateOf": {
+            "submissionId": submission["id"],
+            "studentId": submission.get("studentId"),
+            "distance": duplicate["distance"],
+            "exact": duplicate["exact"],
+        },
+    }
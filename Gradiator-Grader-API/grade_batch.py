@@ -0,0 +1,309 @@
+"""
+Grade many solutions against one task file from the command line.
+
+Solutions come from a directory (every file is a one-page solution, every
+subdirectory a multi-page one with its files in name order) or a manifest
+(CSV with `id` and `files` columns, files separated by ';', or JSONL with
+"id" and "files"). Items are graded by N worker threads through the same
+grading core as the API (grading.py), results are appended to a JSONL or CSV
+file as they finish, and finished items are recorded in a checkpoint file so
+an interrupted run picks up where it stopped:
+
+    python grade_batch.py --task exam_task.pdf --criteria criteria.txt \\
+        --solutions scans/ --output results.jsonl --workers 8
+
+Rerunning the same command skips every item that was already graded with
+the same task, criteria and files; failed items are tried again. Every
+item's model usage goes to the usage ledger and counts against the grading
+budgets, for the subject and assignment given with --subject-id and
+--assignment-id; items over budget fail and are graded on a later run.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import accounting
+from grading import GRADING_MODEL, grade_homework_with_task_file
+
+logger = logging.getLogger("grade_batch")
+
+# Errors worth retrying: rate limits and transient server/network failures.
+RETRYABLE_MARKERS = ("429", "resource exhausted", "resourceexhausted", "quota", "rate limit",
+                     "500", "502", "503", "504", "unavailable", "deadline", "timed out", "timeout")
+CSV_FIELDS = ["id", "files", "score", "feedback", "error", "attempts", "mode", "calls", "inputTokens", "outputTokens", "gradedAt"]
+
+Item = Tuple[str, List[str]]  # (item ID, solution files in page order)
+
+
+# --- Inputs ---
+def items_from_directory(directory: str) -> List[Item]:
+    items = []
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir():
+            pages = sorted(os.path.join(entry.path, name) for name in os.listdir(entry.path) if not name.startswith("."))
+            if pages:
+                items.append((entry.name, pages))
+        elif entry.is_file():
+            items.append((os.path.splitext(entry.name)[0], [entry.path]))
+    return items
+
+def items_from_manifest(path: str) -> List[Item]:
+    base = os.path.dirname(os.path.abspath(path))
+    resolve = lambda files: [f if os.path.isabs(f) else os.path.join(base, f) for f in files]
+    items = []
+    with open(path, newline="") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    items.append((str(row["id"]), resolve(row["files"])))
+        else:
+            for row in csv.DictReader(f):
+                files = [p.strip() for p in row["files"].split(";") if p.strip()]
+                items.append((row["id"], resolve(files)))
+    return items
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint(task_digest: str, criteria: str, files: List[str]) -> str:
+    """Identifies an item's inputs, so a changed file or criteria regrades it."""
+    digest = hashlib.sha256(task_digest.encode())
+    digest.update(criteria.encode())
+    for path in files:
+        digest.update(_file_digest(path).encode())
+    return digest.hexdigest()[:32]
+
+
+# --- Checkpoint and results ---
+class Checkpoint:
+    """Append-only JSONL of finished items: {"id", "fingerprint", "status"}."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line after a crash
+                    if entry.get("status") == "done":
+                        self.done[entry["id"]] = entry["fingerprint"]
+                    else:
+                        self.done.pop(entry["id"], None)
+        self._file = open(path, "a")
+
+    def is_done(self, item_id: str, item_fingerprint: str) -> bool:
+        return self.done.get(item_id) == item_fingerprint
+
+    def record(self, item_id: str, item_fingerprint: str, status: str) -> None:
+        self._file.write(json.dumps({"id": item_id, "fingerprint": item_fingerprint, "status": status}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ResultWriter:
+    """Appends one JSONL line or CSV row per graded item, flushed immediately."""
+
+    def __init__(self, path: str):
+        self.format = "csv" if path.endswith(".csv") else "jsonl"
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="")
+        self._csv = csv.DictWriter(self._file, CSV_FIELDS, extrasaction="ignore") if self.format == "csv" else None
+        if self._csv and is_new:
+            self._csv.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._csv:
+            usage = row.get("usage") or {}
+            self._csv.writerow({**row, **{k: usage.get(k) for k in ("mode", "calls", "inputTokens", "outputTokens")},
+                                "files": ";".join(row["files"])})
+        else:
+            self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# --- Grading ---
+class RateLimiter:
+    """Spaces item starts so all workers together stay under `per_minute`."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+def is_retryable(error: str) -> bool:
+    error = error.lower()
+    return any(marker in error for marker in RETRYABLE_MARKERS)
+
+def grade_item(item: Item, task: str, criteria: str, limiter: RateLimiter, retries: int,
+               backoff: float, allow_text_only: bool, subject_id: Optional[str] = None,
+               assignment_id: Optional[str] = None) -> Dict[str, Any]:
+    """Grade one item, retrying rate-limit and transient errors with exponential backoff."""
+    item_id, files = item
+    result: Dict[str, Any] = {}
+    attempt = 0
+    for attempt in range(1, retries + 2):
+        limiter.wait()
+        over_budget = accounting.check_budget(subject_id, assignment_id)
+        if over_budget:
+            result = {"error": f"Over budget: {over_budget}"}
+            break
+        result = grade_homework_with_task_file(task, files, criteria, allow_text_only)
+        if (result.get("usage") or {}).get("calls"):
+            # Every attempt that reached the model is paid for, failed ones included.
+            accounting.record_usage(result["usage"], subject_id, assignment_id)
+        if "error" not in result or not is_retryable(result["error"]) or attempt > retries:
+            break
+        delay = backoff * 2 ** (attempt - 1) * (0.5 + random.random())
+        logger.warning(f"Batch - {item_id}: {result['error']} (attempt {attempt}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+    return {
+        "id": item_id,
+        "files": files,
+        "score": result.get("score"),
+        "feedback": result.get("feedback"),
+        "error": result.get("error"),
+        "attempts": attempt,
+        "usage": result.get("usage"),
+        "gradedAt": datetime.now().isoformat(),
+        **{key: result[key] for key in ("needsReview", "prescreen") if key in result},
+    }
+
+
+def run(items: List[Item], task: str, criteria: str, output: str, checkpoint_path: str, workers: int,
+        per_minute: float, retries: int, backoff: float, allow_text_only: bool,
+        subject_id: Optional[str] = None, assignment_id: Optional[str] = None) -> Dict[str, Any]:
+    task_digest = _file_digest(task)
+    checkpoint = Checkpoint(checkpoint_path)
+    pending: List[Tuple[Item, str]] = []
+    skipped = 0
+    for item in items:
+        item_fingerprint = fingerprint(task_digest, criteria, item[1])
+        if checkpoint.is_done(item[0], item_fingerprint):
+            skipped += 1
+        else:
+            pending.append((item, item_fingerprint))
+    logger.info(f"Batch - {len(items)} items, {skipped} already graded, {len(pending)} to grade with {workers} workers")
+
+    writer = ResultWriter(output)
+    limiter = RateLimiter(per_minute)
+    summary = {"items": len(items), "skipped": skipped, "graded": 0, "failed": 0,
+               "calls": 0, "inputTokens": 0, "outputTokens": 0, "costUsd": 0.0, "interrupted": False}
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(grade_item, item, task, criteria, limiter, retries, backoff, allow_text_only,
+                            subject_id, assignment_id): (item, item_fingerprint)
+            for item, item_fingerprint in pending
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            (item_id, _), item_fingerprint = futures[future]
+            row = future.result()
+            # Result first, then checkpoint: a crash in between regrades the item instead of losing it.
+            writer.write(row)
+            checkpoint.record(item_id, item_fingerprint, "failed" if row["error"] else "done")
+            usage = row.get("usage") or {}
+            for key in ("calls", "inputTokens", "outputTokens", "costUsd"):
+                summary[key] += usage.get(key, 0)
+            summary["failed" if row["error"] else "graded"] += 1
+            outcome = f"error: {row['error']}" if row["error"] else f"score {row['score']}"
+            logger.info(f"Batch - [{done}/{len(pending)}] {item_id}: {outcome}")
+    except KeyboardInterrupt:
+        summary["interrupted"] = True
+        logger.warning("Batch - Interrupted; finished items are saved, rerun the same command to continue")
+        executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        executor.shutdown(wait=not summary["interrupted"])
+        writer.close()
+        checkpoint.close()
+    summary["costUsd"] = round(summary["costUsd"], 6)
+    summary["seconds"] = round(time.perf_counter() - start, 1)
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Grade a directory or manifest of solutions against one task.")
+    parser.add_argument("--task", required=True, help="Task file (PDF or image)")
+    criteria_group = parser.add_mutually_exclusive_group(required=True)
+    criteria_group.add_argument("--criteria", help="File with the grading criteria")
+    criteria_group.add_argument("--criteria-text", help="Grading criteria as text")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--solutions", help="Directory: one file or subdirectory per solution")
+    source.add_argument("--manifest", help="CSV (id, files separated by ';') or JSONL ({\"id\", \"files\"})")
+    parser.add_argument("--output", default="results.jsonl", help="Results file, .jsonl or .csv (appended to)")
+    parser.add_argument("--checkpoint", help="Progress file (default: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=4, help="Items graded concurrently")
+    parser.add_argument("--per-minute", type=float, default=0, help="Maximum items started per minute (0: no limit)")
+    parser.add_argument("--retries", type=int, default=5, help="Retries for rate-limit and transient errors")
+    parser.add_argument("--backoff", type=float, default=2.0, help="First retry delay in seconds (doubles every retry)")
+    parser.add_argument("--images-only", action="store_true", help="Never grade from previously extracted text")
+    parser.add_argument("--limit", type=int, help="Grade at most this many items (for trial runs)")
+    parser.add_argument("--subject-id", help="Subject the usage is recorded and budgeted for")
+    parser.add_argument("--assignment-id", help="Assignment the usage is recorded and budgeted for")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    for name in ("grading", "prescreen"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    if args.criteria:
+        with open(args.criteria) as f:
+            criteria = f.read()
+    else:
+        criteria = args.criteria_text
+    items = items_from_directory(args.solutions) if args.solutions else items_from_manifest(args.manifest)
+    if args.limit:
+        items = items[:args.limit]
+    missing = [path for _, files in items for path in files if not os.path.exists(path)]
+    if not os.path.exists(args.task) or missing:
+        print(f"Missing files: {', '.join([args.task] if not os.path.exists(args.task) else missing[:10])}")
+        return 2
+
+    summary = run(items, args.task, criteria, args.output, args.checkpoint or f"{args.output}.checkpoint",
+                  max(1, args.workers), args.per_minute, args.retries, args.backoff, not args.images_only,
+                  args.subject_id, args.assignment_id)
+    print(f"\nGraded {summary['graded']}, failed {summary['failed']}, skipped {summary['skipped']} of {summary['items']} "
+          f"in {summary['seconds']}s; {summary['calls']} {GRADING_MODEL} calls, "
+          f"{summary['inputTokens']} input / {summary['outputTokens']} output tokens, ${summary['costUsd']}. Results: {args.output}")
+    if summary["interrupted"]:
+        return 130
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
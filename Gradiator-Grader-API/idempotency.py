@@ -0,0 +1,273 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Idempotency Configuration ---
+# A client that retries a POST (flaky connection, frontend retry) sends the same
+# Idempotency-Key header again. The first request with a key runs; its response
+# is kept for IDEMPOTENCY_TTL_SECONDS and replayed for every repeat, and a repeat
+# that arrives while the first is still running waits for it. So a retried
+# submission is stored once and a retried /api/grade is graded (and paid) once.
+# Server errors (5xx) are not kept, so those can be retried for real, and
+# neither are client errors that a later try can get past (401, 403, 404, 408,
+# 409, 429, ...): only the ones in STORED_CLIENT_ERRORS, which depend on the
+# request alone, are replayed. The store lives in this process.
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(1024 * 1024)))  # larger ones aren't kept
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "300"))  # how long a repeat waits for the original
+IDEMPOTENCY_SPOOL_BYTES = int(os.getenv("IDEMPOTENCY_SPOOL_BYTES", str(1024 * 1024)))  # larger request bodies go to a temp file
+BODY_CHUNK_BYTES = 64 * 1024
+METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+STORED_CLIENT_ERRORS = {400, 413, 415, 422}
+_KEY_PATTERN = re.compile(r"^[\x21-\x7e]{1,255}$")
+_BOUNDARY_PATTERN = re.compile(r"boundary=\"?([^\";]+)\"?")
+
+StoredResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]  # status, raw headers, body
+
+
+def is_final(status: int) -> bool:
+    """Whether a response is the outcome for its key, rather than worth running again."""
+    return status < 400 or status in STORED_CLIENT_ERRORS
+
+
+class Fingerprint:
+    """
+    What a repeat must match: method, path, query and body, hashed as the body
+    arrives. The multipart boundary is left out, since a browser picks a new one
+    for every attempt.
+    """
+
+    def __init__(self, scope: Scope):
+        content_type = Headers(scope=scope).get("content-type", "")
+        boundary = _BOUNDARY_PATTERN.search(content_type)
+        self.boundary = boundary.group(1).encode("latin-1") if boundary else b""
+        if boundary:
+            content_type = content_type[:boundary.start()]
+        self.digest = hashlib.sha256()
+        self.tail = b""  # end of the last chunk, which may hold the start of a boundary
+        for part in (scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), content_type):
+            self.digest.update(part.encode() + b"\0")
+
+    def update(self, chunk: bytes) -> None:
+        if not self.boundary:
+            self.digest.update(chunk)
+            return
+        data = self.tail + chunk
+        # Hash up to where a boundary could still be cut in half, but never cut one that is already complete.
+        cut = max(len(data) - len(self.boundary) + 1, 0)
+        last = data.rfind(self.boundary)
+        if last != -1 and last + len(self.boundary) > cut:
+            cut = last + len(self.boundary)
+        self.digest.update(data[:cut].replace(self.boundary, b""))
+        self.tail = data[cut:]
+
+    def hexdigest(self) -> str:
+        self.digest.update(self.tail.replace(self.boundary, b"") if self.boundary else self.tail)
+        self.tail = b""
+        return self.digest.hexdigest()
+
+
+def fingerprint(scope: Scope, body: bytes) -> str:
+    """Fingerprint of a request whose body is already in memory."""
+    result = Fingerprint(scope)
+    result.update(body)
+    return result.hexdigest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "done", "response", "expires")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = asyncio.Event()
+        self.response: Optional[StoredResponse] = None
+        self.expires = float("inf")  # while in flight
+
+
+class IdempotencyStore:
+    """Key -> response, expiring after a TTL and bounded by dropping the oldest keys first."""
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry
+
+    def begin(self, key: str, request_fingerprint: str) -> Optional[_Entry]:
+        """
+        Mark a key as in flight, or return None if the store is full of requests
+        that are still running. Those are never dropped: a repeat would run again.
+        """
+        entry = _Entry(request_fingerprint)
+        now = time.monotonic()
+        with self._lock:
+            while self._entries and next(iter(self._entries.values())).expires < now:
+                self._entries.popitem(last=False)
+            if len(self._entries) >= self.max_keys:
+                # Drop the oldest stored responses, skipping the ones in flight.
+                excess = len(self._entries) - self.max_keys + 1
+                dropped = []
+                for old_key, old in self._entries.items():
+                    if old.response is not None:
+                        dropped.append(old_key)
+                        if len(dropped) == excess:
+                            break
+                for old_key in dropped:
+                    del self._entries[old_key]
+                if len(self._entries) >= self.max_keys:
+                    return None
+            self._entries[key] = entry
+        return entry
+
+    def finish(self, key: str, entry: _Entry, response: Optional[StoredResponse]) -> None:
+        """Keep the response for replays, or forget the key (None) so the request can run again."""
+        with self._lock:
+            if response is None:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            else:
+                entry.response = response
+                entry.expires = time.monotonic() + self.ttl_seconds
+        entry.done.set()
+
+
+class IdempotencyMiddleware:
+    """Runs a mutating request once per Idempotency-Key and replays its response for repeats."""
+
+    def __init__(self, app: ASGIApp, store: Optional[IdempotencyStore] = None) -> None:
+        self.app = app
+        self.store = store or IdempotencyStore()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get("idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not _KEY_PATTERN.match(key):
+            await JSONResponse({"detail": "Idempotency-Key must be 1-255 printable ASCII characters"}, status_code=400)(scope, receive, send)
+            return
+
+        # The body is part of the fingerprint, so it is read (and hashed as it
+        # arrives) before the app sees it. Large bodies are spooled to disk.
+        body = tempfile.SpooledTemporaryFile(max_size=IDEMPOTENCY_SPOOL_BYTES)
+        try:
+            request_fingerprint = Fingerprint(scope)
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                chunk = message.get("body", b"")
+                request_fingerprint.update(chunk)
+                body.write(chunk)
+                if not message.get("more_body", False):
+                    break
+            body_size = body.tell()
+            body.seek(0)
+            await self._handle(scope, receive, send, key, request_fingerprint.hexdigest(), body, body_size)
+        finally:
+            body.close()
+
+    async def _handle(self, scope: Scope, receive: Receive, send: Send, key: str, request_fingerprint: str,
+                      body: "tempfile.SpooledTemporaryFile[bytes]", body_size: int) -> None:
+        waited = False
+        while True:
+            entry = self.store.get(key)
+            if entry is None:
+                entry = self.store.begin(key, request_fingerprint)
+                if entry is None:
+                    metrics.IDEMPOTENCY_REQUESTS.labels("full").inc()
+                    await JSONResponse(
+                        {"detail": "Too many requests with an Idempotency-Key are in progress"}, status_code=503,
+                        headers={"Retry-After": "1"}
+                    )(scope, receive, send)
+                    return
+                break
+            if entry.fingerprint != request_fingerprint:
+                metrics.IDEMPOTENCY_REQUESTS.labels("conflict").inc()
+                await JSONResponse(
+                    {"detail": "This Idempotency-Key was already used for a different request"}, status_code=422
+                )(scope, receive, send)
+                return
+            if entry.response is not None:
+                metrics.IDEMPOTENCY_REQUESTS.labels("waited" if waited else "replayed").inc()
+                await self._replay(entry.response, send)
+                return
+            try:
+                await asyncio.wait_for(entry.done.wait(), IDEMPOTENCY_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                metrics.IDEMPOTENCY_REQUESTS.labels("timeout").inc()
+                await JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409
+                )(scope, receive, send)
+                return
+            waited = True  # replay its response, or run the request if the original failed
+
+        metrics.IDEMPOTENCY_REQUESTS.labels("executed").inc()
+        body_sent = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                chunk = body.read(BODY_CHUNK_BYTES)
+                body_sent = body.tell() >= body_size
+                return {"type": "http.request", "body": chunk, "more_body": not body_sent}
+            return await receive()
+
+        status = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        response_chunks: List[bytes] = []
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, headers, size
+            if message["type"] == "http.response.start":
+                status, headers = message["status"], list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if size <= IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        stored: Optional[StoredResponse] = None
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+            if is_final(status) and size <= IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                stored = (status, headers, b"".join(response_chunks))
+        finally:
+            self.store.finish(key, entry, stored)
+
+    @staticmethod
+    async def _replay(response: StoredResponse, send: Send) -> None:
+        status, headers, body = response
+        await send({"type": "http.response.start", "status": status, "headers": headers + [(b"idempotent-replayed", b"true")]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,270 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# A tiny in-process metrics registry rendered in the Prometheus text format.
+# Observations take one lock and a couple of additions, so it is cheap enough
+# to leave on every request, database call and model call.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1024, 16 * 1024, 128 * 1024, 1024 ** 2, 8 * 1024 ** 2, 64 * 1024 ** 2, 512 * 1024 ** 2)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values: str, **kwargs: str):
+        """Get (or create) the child metric for a set of label values."""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterator[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        children = sorted(self._children.items()) if self.labelnames else [((), self)]
+        for values, child in children:
+            for suffix, extra, value in child._samples():
+                lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def _samples(self):
+        yield "_total", "", self.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. requests in flight."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def _samples(self):
+        yield "", "", self.value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield "_bucket", f'le="{_format_value(bound)}"', cumulative
+        cumulative += self.counts[-1]
+        yield "_bucket", 'le="+Inf"', cumulative
+        yield "_sum", "", self.sum
+        yield "_count", "", cumulative
+
+
+class Registry:
+    """Collection of metrics rendered together by the /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- HTTP ---
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "gradiator_http_request_duration_seconds", "HTTP request latency by route and status.", ("method", "route", "status")))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "gradiator_http_requests_in_flight", "HTTP requests currently being handled."))
+UPLOAD_BYTES = REGISTRY.register(Counter(
+    "gradiator_upload_bytes", "Bytes of uploaded files stored, by upload kind.", ("kind",)))
+IDEMPOTENCY_REQUESTS = REGISTRY.register(Counter(
+    "gradiator_idempotency_requests", "Requests with an Idempotency-Key, by outcome (executed, replayed, waited, conflict, timeout, full).", ("outcome",)))
+
+# --- Storage ---
+DB_LOAD_DURATION = REGISTRY.register(Histogram(
+    "gradiator_db_load_duration_seconds", "Time spent loading a database collection file.", ("collection",)))
+DB_SAVE_DURATION = REGISTRY.register(Histogram(
+    "gradiator_db_save_duration_seconds", "Time spent saving a database collection file.", ("collection",)))
+DB_LOAD_BYTES = REGISTRY.register(Histogram(
+    "gradiator_db_load_bytes", "Size of database collection files read.", ("collection",), BYTES_BUCKETS))
+DB_SAVE_BYTES = REGISTRY.register(Histogram(
+    "gradiator_db_save_bytes", "Size of database collection files written.", ("collection",), BYTES_BUCKETS))
+
+# --- Grading ---
+GRADING_IN_FLIGHT = REGISTRY.register(Gauge(
+    "gradiator_grading_in_flight", "Grading jobs currently running."))
+GRADING_DURATION = REGISTRY.register(Histogram(
+    "gradiator_grading_duration_seconds", "End-to-end grading time.", ("outcome",)))
+GEMINI_STAGE_DURATION = REGISTRY.register(Histogram(
+    "gradiator_gemini_stage_duration_seconds", "Gemini call latency by stage (upload, generate, parse).", ("stage",)))
+GEMINI_TOKENS = REGISTRY.register(Counter(
+    "gradiator_gemini_tokens", "Gemini tokens used, by model and direction.", ("model", "direction")))
+GEMINI_PARSE_FAILURES = REGISTRY.register(Counter(
+    "gradiator_gemini_parse_failures", "Gemini responses that could not be parsed into a grade."))
+PRESCREEN_PAGES = REGISTRY.register(Counter(
+    "gradiator_prescreen_pages", "Solution pages checked by the pre-screen, by result (passed, blank, blurry, ...).", ("result",)))
+GRADING_TIER_RESULTS = REGISTRY.register(Counter(
+    "gradiator_grading_tier_results", "Cascade tier outcomes, by model (accepted, escalated, error, skipped).", ("model", "outcome")))
+GRADING_TIER_DURATION = REGISTRY.register(Histogram(
+    "gradiator_grading_tier_duration_seconds", "Time spent grading in one cascade tier.", ("model",)))
+GRADING_TIER_COST = REGISTRY.register(Counter(
+    "gradiator_grading_tier_cost_usd", "Estimated cost of grading calls, by model.", ("model",)))
+GRADING_RECHECK_DISAGREEMENTS = REGISTRY.register(Counter(
+    "gradiator_grading_recheck_disagreements", "Sampled re-checks where the stronger model's score differed too much, by checked model.", ("model",)))
+DUPLICATE_MATCHES = REGISTRY.register(Counter(
+    "gradiator_duplicate_matches", "Grades reused from a graded near-duplicate submission, by match (exact, near).", ("match",)))
+
+# --- Text Extraction ---
+OCR_PAGES = REGISTRY.register(Counter(
+    "gradiator_ocr_pages", "Pages run through text extraction, by backend and outcome (extracted, cached, error).", ("backend", "outcome")))
+OCR_DURATION = REGISTRY.register(Histogram(
+    "gradiator_ocr_batch_duration_seconds", "Time per batched text extraction call.", ("backend",)))
+
+# --- Scheduler ---
+SCHEDULER_JOBS = REGISTRY.register(Counter(
+    "gradiator_scheduler_jobs", "Scheduled jobs run, by kind (due, autograde) and outcome (done, deferred, error).", ("kind", "outcome")))
+AUTOGRADE_SUBMISSIONS = REGISTRY.register(Counter(
+    "gradiator_autograde_submissions", "Submissions graded by the off-peak auto-grader, by outcome (graded, error).", ("outcome",)))
+
+# --- Bulk Import ---
+IMPORT_ROWS = REGISTRY.register(Counter(
+    "gradiator_import_rows", "Rows read by bulk imports, by kind and outcome (created, updated, error).", ("kind", "outcome")))
+IMPORT_BATCH_DURATION = REGISTRY.register(Histogram(
+    "gradiator_import_batch_duration_seconds", "Time to write one bulk import batch.", ("kind",)))
+
+
+class MetricsMiddleware:
+    """Records latency per route template and status for every HTTP request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # FastAPI stores the matched route in the scope; using its path
+            # template keeps label cardinality bounded.
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,445 @@
+import os
+import re
+import json
+import time
+import queue
+import hashlib
+import logging
+import mimetypes
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import accounting
+import database as db
+import metrics
+from blobstore import BlobStore, key_from_url
+
+logger = logging.getLogger(__name__)
+
+# --- OCR Configuration ---
+# OCR_BACKEND: none (default, text extraction off), gemini, vision (Google
+# Cloud Vision, needs google-cloud-vision) or stub (decodes UTF-8 files; for
+# tests and local development). Backend calls count against the grading
+# budgets and are recorded in the usage ledger.
+OCR_BACKEND = os.getenv("OCR_BACKEND", "none")
+OCR_MODEL = os.getenv("OCR_MODEL", "gemini-1.5-flash")
+OCR_DIR = os.getenv("OCR_DIR", os.path.join(db.DB_PATH, "ocr"))
+# Pages arriving within OCR_BATCH_WINDOW_SECONDS of each other are sent to the
+# backend together, up to OCR_BATCH_SIZE per call.
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+OCR_BATCH_WINDOW_SECONDS = float(os.getenv("OCR_BATCH_WINDOW_SECONDS", "0.5"))
+# Grading uses the extracted text instead of the page images when every page
+# reaches this quality (0-1). Only pages whose backend reported a confidence
+# qualify (vision, stub): Gemini transcripts are always graded from images.
+# Set it above 1 to always grade from images.
+TEXT_ONLY_MIN_QUALITY = float(os.getenv("OCR_TEXT_ONLY_MIN_QUALITY", "0.85"))
+MIN_CHARS_PER_PAGE = 40
+
+PAGE_MARKER = re.compile(r"^=== PAGE (\d+) ===\s*$", re.MULTILINE)
+WORD_PATTERN = re.compile(r"\w")
+
+Page = Tuple[str, bytes, str]  # (content hash, data, mime type)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def text_quality(text: str, confidence: Optional[float] = None) -> float:
+    """
+    Rough 0-1 score of how usable extracted text is: the share of tokens that
+    contain a letter or digit, scaled down for nearly empty pages and capped by
+    the backend's own confidence when it reports one.
+    """
+    tokens = text.split()
+    if not tokens:
+        return 0.0
+    wordlike = sum(1 for token in tokens if WORD_PATTERN.search(token)) / len(tokens)
+    quality = wordlike * min(1.0, len(text.strip()) / MIN_CHARS_PER_PAGE)
+    if confidence is not None:
+        quality = min(quality, confidence)
+    return round(quality, 3)
+
+
+# --- Text Store ---
+class TextStore:
+    """Extracted text by content hash, so identical pages are only read once."""
+
+    def __init__(self, root: str = OCR_DIR):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.json")
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(digest)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, digest: str, result: Dict[str, Any]) -> None:
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+
+text_store = TextStore()
+
+
+# --- Backends ---
+def new_usage(model: str) -> Dict[str, Any]:
+    """Empty usage record for OCR calls, in the shape of the grading ledger."""
+    return {"model": model, "mode": "ocr", "calls": 0, "inputTokens": 0, "outputTokens": 0, "imageBytes": 0, "latencyMs": 0.0}
+
+def _count_call(usage: Dict[str, Any], pages: List[Page], elapsed: float, response: Any = None) -> None:
+    usage["calls"] += 1
+    usage["latencyMs"] = round(usage["latencyMs"] + elapsed * 1000, 3)
+    usage["imageBytes"] += sum(len(data) for _, data, _ in pages)
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata is not None:
+        usage["inputTokens"] += getattr(usage_metadata, "prompt_token_count", 0) or 0
+        usage["outputTokens"] += getattr(usage_metadata, "candidates_token_count", 0) or 0
+
+def _split_usage(usage: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """Share a batch's usage out over its pages, so each submission pays for its own."""
+    shares = []
+    for index in range(count):
+        share = dict(usage)
+        for field in ("calls", "inputTokens", "outputTokens", "imageBytes"):
+            # Integer shares; the first pages take the remainder.
+            share[field] = usage[field] // count + (1 if index < usage[field] % count else 0)
+        share["latencyMs"] = round(usage["latencyMs"] / count, 3)
+        shares.append(share)
+    return shares
+
+
+class OcrBackend:
+    """
+    Extracts text from a batch of pages; returns (text, confidence or None) per
+    page and adds its calls to `usage`.
+    """
+    name = ""
+    model = ""
+
+    def extract_batch(self, pages: List[Page], usage: Dict[str, Any]) -> List[Tuple[str, Optional[float]]]:
+        raise NotImplementedError
+
+
+class StubOcr(OcrBackend):
+    """Treats pages as UTF-8 text; anything else yields no text."""
+    name = "stub"
+    model = "stub"
+
+    def extract_batch(self, pages: List[Page], usage: Dict[str, Any]) -> List[Tuple[str, Optional[float]]]:
+        results = []
+        for _, data, _ in pages:
+            try:
+                results.append((data.decode("utf-8"), 1.0))
+            except UnicodeDecodeError:
+                results.append(("", 0.0))
+        _count_call(usage, pages, 0.0)
+        return results
+
+
+class GeminiOcr(OcrBackend):
+    """Transcribes a batch of pages in one Gemini call, split by page markers."""
+    name = "gemini"
+
+    PROMPT = (
+        "Transcribe the text of each of the following pages of a student's homework exactly as written, "
+        "including formulas (use plain text or LaTeX). Do not correct, summarise or comment. "
+        "Start each page with a line '=== PAGE <n> ===' where <n> is the page number given before it."
+    )
+
+    def __init__(self, model: str = OCR_MODEL):
+        self.model = model
+
+    def extract_batch(self, pages: List[Page], usage: Dict[str, Any]) -> List[Tuple[str, Optional[float]]]:
+        from grading import get_genai
+
+        content: List[Any] = [self.PROMPT]
+        for number, (_, data, mime_type) in enumerate(pages, start=1):
+            content.append(f"[Page {number}]")
+            content.append({"mime_type": mime_type, "data": data})
+        start = time.perf_counter()
+        with metrics.GEMINI_STAGE_DURATION.labels("ocr").time():
+            response = get_genai().GenerativeModel(self.model).generate_content(content)
+        _count_call(usage, pages, time.perf_counter() - start, response)
+
+        texts = self._split(response.text, len(pages))
+        if texts is None:
+            if len(pages) == 1:
+                return [(response.text.strip(), None)]
+            # The model did not keep to the markers; fall back to one call per page.
+            return [result for page in pages for result in self.extract_batch([page], usage)]
+        return [(text, None) for text in texts]
+
+    @staticmethod
+    def _split(text: str, expected: int) -> Optional[List[str]]:
+        parts = PAGE_MARKER.split(text)
+        # parts = [preamble, "1", text1, "2", text2, ...]
+        numbered = {int(number): body.strip() for number, body in zip(parts[1::2], parts[2::2])}
+        if sorted(numbered) != list(range(1, expected + 1)):
+            return None
+        return [numbered[number] for number in range(1, expected + 1)]
+
+
+class VisionOcr(OcrBackend):
+    """Google Cloud Vision document text detection, batched per request."""
+    name = "vision"
+    model = "vision"
+
+    def __init__(self, client: Any = None):
+        if client is None:
+            try:
+                from google.cloud import vision
+            except ImportError:
+                raise RuntimeError("The vision OCR backend needs google-cloud-vision. Install it with: pip install google-cloud-vision")
+            client = vision.ImageAnnotatorClient()
+        self.client = client
+
+    def extract_batch(self, pages: List[Page], usage: Dict[str, Any]) -> List[Tuple[str, Optional[float]]]:
+        from google.cloud import vision
+
+        requests = [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=data),
+                features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+            )
+            for _, data, _ in pages
+        ]
+        start = time.perf_counter()
+        response = self.client.batch_annotate_images(requests=requests)
+        _count_call(usage, pages, time.perf_counter() - start)
+        results = []
+        for annotation in response.responses:
+            if annotation.error.message:
+                logger.warning(f"OCR - Vision error: {annotation.error.message}")
+                results.append(("", 0.0))
+                continue
+            document = annotation.full_text_annotation
+            confidences = [block.confidence for page in document.pages for block in page.blocks]
+            results.append((document.text, sum(confidences) / len(confidences) if confidences else None))
+        return results
+
+
+def create_backend(name: str = OCR_BACKEND) -> Optional[OcrBackend]:
+    if name == "none":
+        return None
+    if name == "stub":
+        return StubOcr()
+    if name == "vision":
+        return VisionOcr()
+    if name == "gemini":
+        return GeminiOcr()
+    raise ValueError(f"Unknown OCR_BACKEND: {name}")
+
+
+# --- Batching ---
+class _Batcher:
+    """Collects pages from concurrent callers into batched backend calls on one worker thread."""
+
+    def __init__(self, backend: OcrBackend, batch_size: int = OCR_BATCH_SIZE, window: float = OCR_BATCH_WINDOW_SECONDS):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.window = window
+        self._queue: "queue.Queue[Tuple[Page, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, page: Page) -> Future:
+        future: Future = Future()
+        self._queue.put((page, future))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+                self._thread.start()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple[Page, Future]]) -> None:
+        start = time.perf_counter()
+        usage = new_usage(self.backend.model)
+        try:
+            results = self.backend.extract_batch([page for page, _ in batch], usage)
+        except Exception as e:
+            logger.error(f"OCR - {self.backend.name} batch of {len(batch)} page(s) failed: {e}", exc_info=True)
+            metrics.OCR_PAGES.labels(self.backend.name, "error").inc(len(batch))
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.OCR_DURATION.labels(self.backend.name).observe(time.perf_counter() - start)
+        metrics.OCR_PAGES.labels(self.backend.name, "extracted").inc(len(batch))
+        for (_, future), result, share in zip(batch, results, _split_usage(usage, len(batch))):
+            future.set_result((*result, share))
+
+
+_batcher: Optional[_Batcher] = None
+_batcher_lock = threading.Lock()
+_in_flight: Dict[str, Future] = {}
+
+def _get_batcher() -> Optional[_Batcher]:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            backend = create_backend()
+            if backend is None:
+                return None
+            _batcher = _Batcher(backend)
+        return _batcher
+
+
+# --- Pipeline ---
+def extract_pages(pages: List[Page], usage: Optional[Dict[str, Any]] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Extracted text for each page, from the store or the backend (None if
+    extraction failed). The backend usage of the pages read is added to `usage`.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(pages)
+    waiting: List[Tuple[int, str, Future, bool]] = []
+    batcher = _get_batcher()
+
+    for index, (digest, data, mime_type) in enumerate(pages):
+        cached = text_store.get(digest)
+        if cached is not None:
+            metrics.OCR_PAGES.labels(cached.get("backend", ""), "cached").inc()
+            results[index] = cached
+            continue
+        if batcher is None:
+            continue
+        with _batcher_lock:
+            # Identical pages being extracted right now share one backend call.
+            future = _in_flight.get(digest)
+            owner = future is None
+            if owner:
+                future = _in_flight[digest] = batcher.submit((digest, data, mime_type))
+        waiting.append((index, digest, future, owner))
+
+    for index, digest, future, owner in waiting:
+        try:
+            text, confidence, share = future.result()
+        except Exception:
+            continue
+        finally:
+            if owner:
+                with _batcher_lock:
+                    _in_flight.pop(digest, None)
+        result = {
+            "hash": digest,
+            "backend": batcher.backend.name,
+            "text": text,
+            "confidence": confidence,
+            "quality": text_quality(text, confidence),
+            "extractedAt": datetime.now().isoformat(),
+        }
+        if owner:
+            text_store.put(digest, result)
+            if usage is not None:
+                # Pages shared with another caller are paid for by the one that sent them.
+                for field in ("calls", "inputTokens", "outputTokens", "imageBytes"):
+                    usage[field] += share[field]
+                usage["latencyMs"] = round(usage["latencyMs"] + share["latencyMs"], 3)
+        results[index] = result
+    return results
+
+
+def extract_submission(store: BlobStore, submission_id: str) -> Optional[Dict[str, Any]]:
+    """Extract the text of every page of a submission and record a summary on it."""
+    submission = db.get_submission_by_id(submission_id)
+    if not submission:
+        return None
+    assignment_id = submission.get("assignmentId")
+    subject_id = (db.get_assignment_by_id(assignment_id) or {}).get("subjectId") if assignment_id else None
+
+    over_budget = accounting.check_budget(subject_id, assignment_id)
+    if over_budget:
+        logger.warning(f"OCR - Submission {submission_id} skipped: {over_budget}")
+        summary = {"status": "skipped", "reason": over_budget, "pages": [], "quality": None, "extractedAt": datetime.now().isoformat()}
+        db.set_submission_text_extraction(submission_id, summary)
+        return summary
+
+    pages: List[Page] = []
+    for url in submission.get("files") or []:
+        key = key_from_url(url)
+        data = store.read(key)
+        mime_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        pages.append((content_hash(data), data, mime_type))
+
+    batcher = _get_batcher()
+    usage = new_usage(batcher.backend.model if batcher else "")
+    results = extract_pages(pages, usage)
+    if usage["calls"]:
+        accounting.record_usage(usage, subject_id, assignment_id, submission_id)
+    summary = {
+        "status": "done" if all(results) else "partial" if any(results) else "failed",
+        "pages": [
+            {"file": url, "hash": digest, "quality": result["quality"] if result else None, "chars": len(result["text"]) if result else 0}
+            for url, (digest, _, _), result in zip(submission.get("files") or [], pages, results)
+        ],
+        "quality": min((r["quality"] for r in results if r), default=None) if all(results) else None,
+        "extractedAt": datetime.now().isoformat(),
+    }
+    db.set_submission_text_extraction(submission_id, summary)
+    logger.info(f"OCR - Submission {submission_id}: {len(pages)} page(s), status {summary['status']}, quality {summary['quality']}")
+    return summary
+
+
+def extract_submission_safely(store: BlobStore, submission_id: str) -> None:
+    """Background-task wrapper: extraction failures are logged, never raised."""
+    try:
+        extract_submission(store, submission_id)
+    except Exception as e:
+        logger.error(f"OCR - Text extraction for submission {submission_id} failed: {e}", exc_info=True)
+
+
+def submission_text(submission_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Stored text of each page of a submission, in page order."""
+    submission = db.get_submission_by_id(submission_id)
+    if not submission:
+        return None
+    extraction = submission.get("textExtraction") or {}
+    pages = []
+    for page in extraction.get("pages", []):
+        stored = text_store.get(page["hash"]) if page.get("hash") else None
+        pages.append({**page, "text": stored["text"] if stored else None})
+    return pages
+
+
+def usable_texts(paths: List[str]) -> Optional[List[str]]:
+    """Stored texts for these files if every one is good enough to grade from, else None."""
+    if TEXT_ONLY_MIN_QUALITY > 1:
+        return None
+    texts = []
+    for path in paths:
+        stored = text_store.get(file_hash(path))
+        # Without the backend's own confidence the quality score only measures
+        # how word-like the text looks, not whether it is what was written.
+        if not stored or stored.get("confidence") is None or stored["quality"] < TEXT_ONLY_MIN_QUALITY:
+            return None
+        texts.append(stored["text"])
+    return texts
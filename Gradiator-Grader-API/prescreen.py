@@ -0,0 +1,106 @@
+import os
+import math
+import logging
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Pre-screen Configuration ---
+# Solution pages are checked locally before any model call. A page is rejected
+# when it is too small, has almost no ink (blank page), almost no detail
+# (lens covered, black frame) or no sharp edges (badly blurred). Thresholds
+# were chosen with benchmarks/bench_prescreen.py on the sample homework images.
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "1") == "1"
+MIN_SIDE = int(os.getenv("PRESCREEN_MIN_SIDE", "400"))
+MIN_INK = float(os.getenv("PRESCREEN_MIN_INK", "0.002"))
+MIN_ENTROPY = float(os.getenv("PRESCREEN_MIN_ENTROPY", "2.5"))
+MIN_SHARPNESS = float(os.getenv("PRESCREEN_MIN_SHARPNESS", "20"))
+# Result returned instead of a model call when every page is rejected.
+REJECTED_SCORE = int(os.getenv("PRESCREEN_SCORE", "0"))
+REJECTED_FEEDBACK = os.getenv(
+    "PRESCREEN_FEEDBACK",
+    "The submitted pages could not be graded automatically ({reasons}). The submission has been flagged for manual review."
+)
+
+ANALYSIS_SIDE = 1024   # pages are downscaled to this before measuring
+INK_DELTA = 40         # how much darker than the local background ink must be
+BACKGROUND_RADIUS = 15
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.heic', '.heif')
+LAPLACIAN = ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=128)
+
+
+def _entropy(gray: Image.Image) -> float:
+    histogram = gray.histogram()
+    total = sum(histogram)
+    return max(0.0, -sum(n / total * math.log2(n / total) for n in histogram if n))
+
+def _laplacian(gray: Image.Image) -> Image.Image:
+    # Drop the 1px border, where the kernel sees the image edge as an edge.
+    width, height = gray.size
+    return gray.filter(LAPLACIAN).crop((1, 1, max(2, width - 1), max(2, height - 1)))
+
+def measure(image: Image.Image) -> Dict[str, Any]:
+    """Size, ink coverage, histogram entropy (bits) and sharpness (variance of the Laplacian) of a page."""
+    width, height = image.size
+    gray = ImageOps.exif_transpose(image).convert("L")
+    gray.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE))
+
+    # Ink: pixels clearly darker than their blurred surroundings, so uneven
+    # lighting and shadows across the page don't count as writing.
+    background = gray.filter(ImageFilter.BoxBlur(BACKGROUND_RADIUS))
+    darker = ImageChops.subtract(background, gray)
+    ink_pixels = sum(darker.histogram()[INK_DELTA:])
+
+    return {
+        "width": width,
+        "height": height,
+        "ink": round(ink_pixels / (gray.size[0] * gray.size[1]), 5),
+        "entropy": round(_entropy(gray), 3),
+        "sharpness": round(ImageStat.Stat(_laplacian(gray)).var[0], 2),
+    }
+
+def classify(measures: Dict[str, Any]) -> Optional[str]:
+    """Why a page should not be sent to the model, or None if it looks gradable."""
+    if min(measures["width"], measures["height"]) < MIN_SIDE:
+        return "too small"
+    if measures["entropy"] < MIN_ENTROPY:
+        return "no detail"
+    if measures["ink"] < MIN_INK:
+        return "blank"
+    if measures["sharpness"] < MIN_SHARPNESS:
+        return "blurry"
+    return None
+
+def screen_page(path: str) -> Dict[str, Any]:
+    """Measure and classify one solution file; non-image files are always passed."""
+    if not path.lower().endswith(IMAGE_EXTENSIONS):
+        return {"file": os.path.basename(path), "rejected": None}
+    try:
+        with Image.open(path) as image:
+            measures = measure(image)
+    except (OSError, ValueError) as e:
+        return {"file": os.path.basename(path), "rejected": "unreadable", "error": str(e)}
+    return {"file": os.path.basename(path), "rejected": classify(measures), **measures}
+
+def screen(solution_paths: List[str]) -> Dict[str, Any]:
+    """Pre-screen all solution pages; 'gradable' is False when none of them is worth a model call."""
+    pages = [screen_page(path) for path in solution_paths]
+    for page in pages:
+        metrics.PRESCREEN_PAGES.labels(page["rejected"] or "passed").inc()
+    rejected = [page for page in pages if page["rejected"]]
+    return {"gradable": len(rejected) < len(pages), "rejectedPages": len(rejected), "pages": pages}
+
+def rejected_result(report: Dict[str, Any]) -> Dict[str, Any]:
+    """The configured grade for a submission whose pages were all rejected."""
+    reasons = ", ".join(sorted({page["rejected"] for page in report["pages"] if page["rejected"]}))
+    return {
+        "score": REJECTED_SCORE,
+        "feedback": REJECTED_FEEDBACK.format(reasons=reasons),
+        "needsReview": True,
+        "prescreen": report,
+    }
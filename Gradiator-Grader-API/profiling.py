@@ -0,0 +1,287 @@
+import os
+import io
+import sys
+import hmac
+import time
+import uuid
+import random
+import asyncio
+import marshal
+import pstats
+import threading
+import contextvars
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# --- Profiling Configuration ---
+# A request is profiled when it carries PROFILE_HEADER with the PROFILE_TOKEN
+# value, or at random with probability PROFILE_SAMPLE_RATE. With neither set the
+# middleware is not installed at all, so profiling costs nothing when disabled.
+#
+# Profiles are sampled: every PROFILE_INTERVAL_MS the stacks of all threads are
+# read, and a stack counts for the profiled request when it is the request's
+# work: on the event loop while one of the request's tasks runs, and in the
+# default executor's threads while they run something the request passed to
+# asyncio.to_thread (grading, OCR, analytics, search, ...).
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "20"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_HEADER = "x-profile-token"
+
+MAX_STACK_DEPTH = 64
+
+FuncKey = Tuple[str, int, str]
+Stack = Tuple[FuncKey, ...]  # outermost call first
+Samples = Dict[Stack, Tuple[int, float]]  # stack -> (samples, seconds)
+
+
+def profiling_enabled() -> bool:
+    """Whether the profiling middleware should be installed."""
+    return bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+def token_matches(token: Optional[str]) -> bool:
+    """Check a profile token in constant time."""
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+class ProfileStore:
+    """Bounded ring buffer with the most recent request profiles."""
+
+    def __init__(self, size: int = PROFILE_BUFFER_SIZE):
+        self._profiles: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of the stored profiles, newest first."""
+        with self._lock:
+            return [{k: v for k, v in p.items() if k not in ("stats", "stacks")} for p in reversed(self._profiles)]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for profile in self._profiles:
+                if profile["id"] == profile_id:
+                    return profile
+        return None
+
+
+store = ProfileStore()
+
+
+# --- Export Formats ---
+def _frame_name(func: FuncKey) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{name}:{line}"
+
+def to_pstats(stats: Dict[FuncKey, Any]) -> bytes:
+    """Serialize stats in the marshal format read by pstats, snakeviz and flameprof."""
+    return marshal.dumps(stats)
+
+def to_text(stats: Dict[FuncKey, Any], limit: int = 50) -> str:
+    """Human-readable summary sorted by cumulative time."""
+    output = io.StringIO()
+    loaded = pstats.Stats(_StatsHolder(stats), stream=output)
+    loaded.sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+def to_collapsed(stacks: Samples) -> str:
+    """Collapsed stacks ("a;b;c <microseconds>") for flamegraph.pl, speedscope or inferno."""
+    lines = [
+        ";".join(_frame_name(f) for f in stack[-MAX_STACK_DEPTH:]) + f" {int(seconds * 1_000_000)}"
+        for stack, (_, seconds) in stacks.items()
+    ]
+    return "\n".join(sorted(lines)) + "\n"
+
+def stats_from_samples(stacks: Samples) -> Dict[FuncKey, Any]:
+    """
+    pstats-format stats from sampled stacks: call counts are sample counts,
+    own time is the time a function was the innermost frame and cumulative
+    time the time it was anywhere on the stack.
+    """
+    stats: Dict[FuncKey, List[Any]] = {}
+    for stack, (count, elapsed) in stacks.items():
+        for depth, func in enumerate(stack):
+            entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+            leaf = depth == len(stack) - 1
+            if func not in stack[depth + 1:]:  # recursion counts once per sample
+                entry[0] += count
+                entry[1] += count
+                entry[3] += elapsed
+            if leaf:
+                entry[2] += elapsed
+            if depth:
+                caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                caller[0] += count
+                caller[1] += count
+                caller[2] += elapsed if leaf else 0.0
+                caller[3] += elapsed
+    return {func: (cc, nc, tt, ct, {c: tuple(v) for c, v in callers.items()}) for func, (cc, nc, tt, ct, callers) in stats.items()}
+
+
+class _StatsHolder:
+    """Adapter so pstats.Stats can load an already-collected stats dict."""
+
+    def __init__(self, stats: Dict[FuncKey, Any]):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+# --- Sampling ---
+_session: contextvars.ContextVar[Optional["_Session"]] = contextvars.ContextVar("profile_session", default=None)
+
+
+class _Session:
+    """The profile of one request: its tasks, the threads working for it and the sampled stacks."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.interval = interval
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self.threads: Set[int] = set()
+        self.stacks: Dict[Stack, List[Any]] = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+
+    def run_in_thread(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run executor work for the request, so the sampler counts this thread meanwhile."""
+        ident = threading.get_ident()
+        self.threads.add(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.threads.discard(ident)
+
+    def _sample(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            # Weighted by the time since the last sample, which is longer than the
+            # interval when this thread waits for the GIL.
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == self.loop_thread:
+                    if asyncio.current_task(self.loop) not in self.tasks:
+                        continue  # another request's coroutine (or the loop itself)
+                elif ident not in self.threads:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                entry = self.stacks.setdefault(tuple(reversed(stack)), [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+
+class _TrackingExecutor(ThreadPoolExecutor):
+    """Default executor that lets a profiled request's sampler see the work it hands to threads."""
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any):
+        # Called on the event loop, in the context of the task that awaits the result.
+        session = _session.get()
+        if session is None:
+            return super().submit(fn, *args, **kwargs)
+        return super().submit(session.run_in_thread, fn, *args, **kwargs)
+
+
+def _task_factory(loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any) -> asyncio.Task:
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    # Tasks started by a profiled request (e.g. by middleware) belong to its profile.
+    session = kwargs["context"].get(_session) if kwargs.get("context") else _session.get()
+    if session is not None:
+        session.tasks.add(task)
+    return task
+
+
+def install(loop: asyncio.AbstractEventLoop) -> None:
+    """Hook the loop's task creation and default executor; call before the loop uses the executor."""
+    if loop.get_task_factory() is None:
+        loop.set_task_factory(_task_factory)
+    loop.set_default_executor(_TrackingExecutor(thread_name_prefix="asyncio"))
+
+
+# --- Middleware ---
+class ProfilingMiddleware:
+    """
+    Profiles selected requests by sampling (see above) and keeps them in `store`.
+
+    Only one request is profiled at a time; concurrent candidates are simply
+    not profiled. Work in threads the request didn't start through the
+    loop's default executor (e.g. sync endpoints) is not captured.
+    """
+
+    def __init__(self, app: ASGIApp, profile_store: ProfileStore = store) -> None:
+        self.app = app
+        self.store = profile_store
+        self._active = threading.Lock()
+
+    def _selected(self, scope: Scope) -> bool:
+        if token_matches(Headers(scope=scope).get(PROFILE_HEADER)):
+            return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._selected(scope) or not self._active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", []).append((b"x-profile-id", profile_id.encode()))
+            await send(message)
+
+        session = _Session(asyncio.get_running_loop(), PROFILE_INTERVAL_MS / 1000)
+        session.tasks.add(asyncio.current_task())
+        token = _session.set(session)
+        start = time.perf_counter()
+        try:
+            session.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                session.stop()
+                _session.reset(token)
+        finally:
+            self._active.release()
+
+        stacks = {stack: (count, seconds) for stack, (count, seconds) in session.stacks.items()}
+        self.store.add({
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "durationMs": round((time.perf_counter() - start) * 1000, 3),
+            "samples": sum(count for count, _ in stacks.values()),
+            "intervalMs": PROFILE_INTERVAL_MS,
+            "createdAt": datetime.now().isoformat(),
+            "stacks": stacks,
+            "stats": stats_from_samples(stacks),
+        })
@@ -0,0 +1,371 @@
+import os
+import json
+import time
+import heapq
+import shutil
+import asyncio
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import database as db
+import accounting
+import metrics
+from blobstore import BlobStore, key_from_url
+
+logger = logging.getLogger(__name__)
+
+# --- Scheduler Configuration ---
+# Time-driven work (closing assignments at their due date, off-peak AI
+# grading) is kept in a min-heap of (time, kind, assignment) jobs. The heap is
+# saved to SCHEDULE_FILE on every change, so jobs survive restarts, and it is
+# filled from the database writes (see on_change). Only one process should run
+# it: set SCHEDULER_ENABLED=0 on the others. Writes by those (and by the bulk
+# import CLI) send this process no events, so every RECONCILE_SECONDS it checks
+# the assignments' versions and catches up on the assignments they changed.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULE_FILE = os.getenv("SCHEDULE_FILE", os.path.join(db.DB_PATH, "schedule.json"))
+# Grade the submissions of closed assignments with AI inside a daily window
+# (local time, "HH:MM-HH:MM", may wrap past midnight). Budgets still apply.
+AUTOGRADE_ENABLED = os.getenv("AUTOGRADE_ENABLED", "0") == "1"
+AUTOGRADE_WINDOW = os.getenv("AUTOGRADE_WINDOW", "01:00-06:00")
+AUTOGRADE_WORKERS = int(os.getenv("AUTOGRADE_WORKERS", "1"))
+RECONCILE_SECONDS = float(os.getenv("SCHEDULER_RECONCILE_SECONDS", "30"))
+
+Job = Tuple[float, str, str]  # (run at, kind, assignment ID)
+
+
+# --- Deadlines ---
+def due_timestamp(assignment: Dict[str, Any]) -> Optional[float]:
+    due = db.parse_due_date(assignment.get("dueDate"))
+    return due.timestamp() if due else None
+
+def is_closed(assignment: Dict[str, Any]) -> bool:
+    """Whether the due date has been applied (for the current due date)."""
+    due = db.parse_due_date(assignment.get("dueDate"))
+    if not due or not assignment.get("closedAt"):
+        return False
+    return assignment.get("appealDeadline") == (due + timedelta(days=db.APPEAL_WINDOW_DAYS)).isoformat()
+
+
+# --- Off-peak Window ---
+def _window() -> Tuple[int, int]:
+    start, end = AUTOGRADE_WINDOW.split("-")
+    to_minutes = lambda value: int(value.split(":")[0]) * 60 + int(value.split(":")[1])
+    return to_minutes(start), to_minutes(end)
+
+def in_window(when: float) -> bool:
+    start, end = _window()
+    moment = datetime.fromtimestamp(when)
+    minute = moment.hour * 60 + moment.minute
+    return start <= minute < end if start <= end else minute >= start or minute < end
+
+def next_window_start(after: float) -> float:
+    """`after` if it is inside the window, otherwise the next time the window opens."""
+    if in_window(after):
+        return after
+    start, _ = _window()
+    moment = datetime.fromtimestamp(after)
+    opening = moment.replace(hour=start // 60, minute=start % 60, second=0, microsecond=0)
+    if opening <= moment:
+        opening += timedelta(days=1)
+    return opening.timestamp()
+
+
+class Scheduler:
+    """Persisted min-heap of jobs; a job is replaced by scheduling the same (kind, assignment) again."""
+
+    def __init__(self, path: str = SCHEDULE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._heap: List[Job] = []
+        self._jobs: Dict[Tuple[str, str], float] = {}  # current time of each job; heap entries not matching are stale
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._seen: Optional[Tuple[int, str, int]] = None  # (external writes, epoch, version) of assignments reconciled
+        self.loaded = False
+
+    # Persistence
+    def load(self) -> bool:
+        """Read the saved jobs; False if there is no schedule file yet."""
+        with self._lock:
+            self.loaded = True
+            if not os.path.exists(self.path):
+                return False
+            try:
+                with open(self.path) as f:
+                    saved = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.error(f"Scheduler - Could not read {self.path}, rebuilding the schedule: {e}")
+                return False
+            self._jobs = {(job["kind"], job["assignmentId"]): job["runAt"] for job in saved.get("jobs", [])}
+            if saved.get("assignments"):
+                # Catch up from the version reconciled last time (the write count is per process).
+                self._seen = (-1, saved["assignments"]["epoch"], saved["assignments"]["version"])
+            self._heap = [(when, kind, assignment_id) for (kind, assignment_id), when in self._jobs.items()]
+            heapq.heapify(self._heap)
+            return True
+
+    def _save(self) -> None:
+        jobs = [{"kind": kind, "assignmentId": assignment_id, "runAt": when, "at": datetime.fromtimestamp(when).isoformat()}
+                for (kind, assignment_id), when in self._jobs.items()]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"jobs": jobs, "assignments": {"epoch": self._seen[1], "version": self._seen[2]} if self._seen else None}, f)
+        os.replace(tmp_path, self.path)
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _notify(self) -> None:
+        # Writes happen in worker threads; the loop sleeps until the earliest job.
+        if self._loop and self._wake:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # Jobs
+    def schedule(self, kind: str, assignment_id: str, when: float) -> None:
+        self.schedule_many([(when, kind, assignment_id)])
+
+    def schedule_many(self, jobs: List[Job]) -> None:
+        with self._lock:
+            changed = False
+            for when, kind, assignment_id in jobs:
+                if self._jobs.get((kind, assignment_id)) == when:
+                    continue
+                self._jobs[(kind, assignment_id)] = when
+                heapq.heappush(self._heap, (when, kind, assignment_id))
+                changed = True
+            if not changed:
+                return
+            if len(self._heap) > 2 * len(self._jobs) + 64:
+                # Drop stale entries left behind by rescheduled and cancelled jobs.
+                self._heap = [(w, k, a) for (k, a), w in self._jobs.items()]
+                heapq.heapify(self._heap)
+            self._save()
+        self._notify()
+
+    def cancel(self, kind: str, assignment_id: str) -> None:
+        with self._lock:
+            if self._jobs.pop((kind, assignment_id), None) is not None:
+                self._save()  # the heap entry is skipped when it comes up
+
+    def pop_due(self, now: float) -> List[Job]:
+        due: List[Job] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, kind, assignment_id = heapq.heappop(self._heap)
+                if self._jobs.get((kind, assignment_id)) == when:
+                    del self._jobs[(kind, assignment_id)]
+                    due.append((when, kind, assignment_id))
+            if due:
+                self._save()
+        return due
+
+    def next_run(self) -> Optional[float]:
+        with self._lock:
+            while self._heap and self._jobs.get((self._heap[0][1], self._heap[0][2])) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            upcoming = heapq.nsmallest(limit, ((w, k, a) for (k, a), w in self._jobs.items()))
+        return [{"kind": kind, "assignmentId": assignment_id, "runAt": datetime.fromtimestamp(when).isoformat()}
+                for when, kind, assignment_id in upcoming]
+
+    def has(self, kind: str, assignment_id: str) -> bool:
+        with self._lock:
+            return (kind, assignment_id) in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def reconcile(self) -> int:
+        """
+        Catch up on assignments written by other processes since the last
+        call: only the changed ones when the versions can tell, else all.
+        Returns the number of assignments looked at.
+        """
+        external = db.VERSIONS.external_writes("assignments")
+        if self._seen is not None and self._seen[0] == external:
+            return 0
+        # Versions are taken before loading: a write meanwhile is looked at again next time.
+        epoch, version, _ = db.VERSIONS.version("assignments")
+        changed = None
+        if self._seen is not None and self._seen[1] == epoch:
+            changed = db.VERSIONS.changed_since("assignments", self._seen[2])
+        count = backfill(changed)
+        with self._lock:
+            self._seen = (external, epoch, version)
+            self._save()
+        return count
+
+    # Running
+    async def run(self, store: BlobStore) -> None:
+        """Run jobs as they come due, forever."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        await asyncio.to_thread(self.load)
+        # Also when the schedule was saved: assignments may have been written while no scheduler ran.
+        await asyncio.to_thread(self.reconcile)
+        logger.info(f"Scheduler - {len(self)} job(s) scheduled, auto-grading {'on (' + AUTOGRADE_WINDOW + ')' if AUTOGRADE_ENABLED else 'off'}")
+        grading_slots = asyncio.Semaphore(max(1, AUTOGRADE_WORKERS))
+        grading: Dict[str, asyncio.Task] = {}
+        while True:
+            for _, kind, assignment_id in self.pop_due(time.time()):
+                if kind == "autograde":
+                    if assignment_id in grading and not grading[assignment_id].done():
+                        # Still grading; look again for submissions that arrived meanwhile.
+                        self.schedule(kind, assignment_id, time.time() + 60)
+                    else:
+                        grading[assignment_id] = asyncio.create_task(self._autograde(grading_slots, store, assignment_id))
+                    continue
+                try:
+                    await asyncio.to_thread(close_due_assignment, assignment_id)
+                    metrics.SCHEDULER_JOBS.labels(kind, "done").inc()
+                except Exception as e:
+                    metrics.SCHEDULER_JOBS.labels(kind, "error").inc()
+                    logger.error(f"Scheduler - Closing assignment {assignment_id} failed: {e}", exc_info=True)
+            next_run = self.next_run()
+            self._wake.clear()
+            timeout = RECONCILE_SECONDS if next_run is None else min(RECONCILE_SECONDS, max(0.0, next_run - time.time()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.reconcile)
+            except Exception as e:
+                logger.error(f"Scheduler - Catching up on other processes' writes failed: {e}", exc_info=True)
+
+    async def _autograde(self, slots: asyncio.Semaphore, store: BlobStore, assignment_id: str) -> None:
+        async with slots:
+            try:
+                outcome = await asyncio.to_thread(autograde_assignment, store, assignment_id)
+                metrics.SCHEDULER_JOBS.labels("autograde", outcome).inc()
+            except Exception as e:
+                metrics.SCHEDULER_JOBS.labels("autograde", "error").inc()
+                logger.error(f"Scheduler - Auto-grading assignment {assignment_id} failed: {e}", exc_info=True)
+
+
+scheduler = Scheduler()
+
+
+# --- Jobs ---
+def backfill(assignment_ids: Optional[List[str]] = None) -> int:
+    """
+    Schedule the due date of every assignment that hasn't been closed and drop
+    it for the others; only for `assignment_ids` if given (other IDs, such as
+    submissions', are ignored). Late submissions to those get auto-graded.
+    Returns the number of assignments looked at.
+    """
+    if assignment_ids is None:
+        assignments = db.get_assignments()
+    else:
+        assignments = list(db.get_assignments_by_ids(assignment_ids).values())
+    jobs: List[Job] = []
+    for assignment in assignments:
+        when = due_timestamp(assignment)
+        if when is not None and not is_closed(assignment):
+            jobs.append((when, "due", assignment["id"]))
+        else:
+            scheduler.cancel("due", assignment["id"])
+            if (AUTOGRADE_ENABLED and assignment_ids is not None and assignment.get("closedAt")
+                    and _ungraded(assignment) and not scheduler.has("autograde", assignment["id"])):
+                jobs.append((next_window_start(time.time()), "autograde", assignment["id"]))
+    scheduler.schedule_many(jobs)
+    if jobs:
+        logger.info(f"Scheduler - Scheduled {len(jobs)} job(s) after looking at {len(assignments)} assignment(s)")
+    return len(assignments)
+
+def close_due_assignment(assignment_id: str) -> None:
+    assignment = db.close_assignment(assignment_id)
+    if not assignment:
+        return
+    logger.info(f"Scheduler - Assignment {assignment_id} is due; appeals close {assignment.get('appealDeadline')}")
+    if AUTOGRADE_ENABLED and _ungraded(assignment):
+        scheduler.schedule("autograde", assignment_id, next_window_start(time.time()))
+
+def _ungraded(assignment: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [s for s in assignment.get("submissions") or [] if s.get("status") != "graded" and s.get("files")]
+
+def autograde_assignment(store: BlobStore, assignment_id: str) -> str:
+    """
+    Grade the ungraded submissions of an assignment with AI while the off-peak
+    window is open and the budgets allow it; the rest is rescheduled.
+    """
+    from grading import grade_homework_with_task_file  # loads the grading stack only when needed
+
+    assignment = db.get_assignment_by_id(assignment_id)
+    if not assignment or not assignment.get("files") or not assignment.get("criteria"):
+        logger.info(f"Scheduler - Assignment {assignment_id} has no task file or criteria, not auto-grading")
+        return "done"
+    subject_id = assignment.get("subjectId")
+    max_grade = assignment.get("maxGrade") or 100
+
+    workdir = tempfile.mkdtemp(prefix="autograde_")
+    try:
+        task_key = key_from_url(assignment["files"][0])
+        task_path = os.path.join(workdir, "task_" + os.path.basename(task_key))
+        store.download_to(task_key, task_path)
+
+        for submission in _ungraded(assignment):
+            if not in_window(time.time()):
+                scheduler.schedule("autograde", assignment_id, next_window_start(time.time()))
+                return "deferred"
+            over_budget = accounting.check_budget(subject_id, assignment_id)
+            if over_budget:
+                logger.warning(f"Scheduler - Auto-grading deferred: {over_budget}")
+                scheduler.schedule("autograde", assignment_id, next_window_start(time.time() + accounting.seconds_until_tomorrow()))
+                return "deferred"
+
+            paths = []
+            try:
+                for i, url in enumerate(submission["files"]):
+                    key = key_from_url(url)
+                    paths.append(os.path.join(workdir, f"{submission['id']}_{i}_{os.path.basename(key)}"))
+                    store.download_to(key, paths[-1])
+                result = grade_homework_with_task_file(task_path, paths, assignment["criteria"])
+            except FileNotFoundError as e:
+                result = {"error": f"File not found: {e}"}
+            finally:
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            if result.get("usage", {}).get("calls"):
+                accounting.record_usage(result["usage"], subject_id, assignment_id, submission["id"])
+            if "error" in result:
+                metrics.AUTOGRADE_SUBMISSIONS.labels("error").inc()
+                logger.warning(f"Scheduler - Could not auto-grade submission {submission['id']}: {result['error']}")
+                continue
+            db.grade_submission(submission["id"], round(result["score"] * max_grade / 100), result.get("feedback", ""))
+            if result.get("needsReview"):
+                db.flag_submission_for_review(submission["id"], "Auto-graded with pages rejected by the pre-screen", result.get("prescreen"))
+            metrics.AUTOGRADE_SUBMISSIONS.labels("graded").inc()
+        return "done"
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def on_change(event_type: str, data: Dict[str, Any]) -> None:
+    """Follow due date changes and late submissions."""
+    if not scheduler.loaded:
+        return  # the schedule is read (or backfilled) when the scheduler starts
+    if event_type == "assignment.saved":
+        assignment = data["assignment"]
+        when = due_timestamp(assignment)
+        if when is None or is_closed(assignment):
+            scheduler.cancel("due", assignment["id"])
+        else:
+            scheduler.schedule("due", assignment["id"], when)
+    elif event_type == "submission.created" and AUTOGRADE_ENABLED:
+        assignment = db.get_assignment_by_id(data["assignmentId"])
+        if assignment and assignment.get("closedAt"):
+            scheduler.schedule("autograde", assignment["id"], next_window_start(time.time()))
+
+db.subscribe(on_change)
@@ -0,0 +1,331 @@
+import os
+import re
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# --- Search Configuration ---
+# Subjects, assignments, materials and grading feedback are indexed in an
+# SQLite FTS5 table next to the JSON files. The index follows the writes
+# reported by database.py. It also stores the collection versions it is known
+# to be complete through. Before each search, writes it got no event for (made
+# while nothing was indexing, or by another process such as a second worker or
+# the bulk import CLI) are caught up from the record versions (see versions.py).
+# It is rebuilt when that can't be done record by record.
+SEARCH_DB_PATH = os.getenv("SEARCH_DB_PATH", os.path.join(db.DB_PATH, "search.sqlite"))
+# Title matches count this many times as much as body matches.
+TITLE_WEIGHT = float(os.getenv("SEARCH_TITLE_WEIGHT", "5"))
+# BM25 has to score every match before the best can be picked. Queries
+# matching more documents than this (very common words) are returned newest
+# first instead, which SQLite can stop after one page, and their total is
+# only reported as "more than RANK_LIMIT".
+RANK_LIMIT = int(os.getenv("SEARCH_RANK_LIMIT", "20000"))
+# Catching up on more changed records than this rebuilds the index instead.
+CATCH_UP_LIMIT = int(os.getenv("SEARCH_CATCH_UP_LIMIT", "2000"))
+SNIPPET_TOKENS = 16
+
+DOCUMENT_TYPES = ("subject", "assignment", "material", "feedback")
+INDEXED_COLLECTIONS = ("subjects", "assignments", "materials")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    type TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    title TEXT,
+    subject_id TEXT,
+    assignment_id TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_assignment ON documents(assignment_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body, tags, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+# --- Documents ---
+Document = Tuple[str, str, str, str, Optional[str], Optional[str]]  # (type, id, title, body, subjectId, assignmentId)
+
+def _tag(kind: str, value: Optional[str]) -> str:
+    # Filters are indexed as single alphanumeric tokens, so FTS5 intersects them
+    # with the words instead of SQLite checking every match afterwards.
+    return kind + hashlib.md5((value or "").encode()).hexdigest()[:16]
+
+def _tags(document: "Document") -> str:
+    doc_type, _, _, _, subject_id, _ = document
+    return f"{_tag('t', doc_type)} {_tag('s', subject_id)}"
+
+def _join(*parts: Any) -> str:
+    return "\n".join(str(part) for part in parts if part)
+
+def subject_document(subject: Dict[str, Any]) -> Document:
+    return ("subject", subject["id"], subject.get("name") or subject.get("title") or "",
+            _join(subject.get("description"), subject.get("code")), subject["id"], None)
+
+def assignment_document(assignment: Dict[str, Any]) -> Document:
+    return ("assignment", assignment["id"], assignment.get("title") or "",
+            _join(assignment.get("description"), assignment.get("criteria")), assignment.get("subjectId"), assignment["id"])
+
+def material_document(material: Dict[str, Any]) -> Document:
+    file_name = os.path.basename(material.get("fileUrl") or "")
+    return ("material", material["id"], material.get("title") or "",
+            _join(material.get("description"), material.get("type"), file_name), material.get("subjectId"), None)
+
+def feedback_document(assignment: Dict[str, Any], submission: Dict[str, Any]) -> Optional[Document]:
+    """Feedback (and appeal) text of a submission; None if there is nothing to find."""
+    appeal = submission.get("appeal") or {}
+    body = _join(submission.get("feedback"), appeal.get("reason"))
+    if not body:
+        return None
+    title = f"{submission.get('studentName') or submission.get('studentId') or ''} - {assignment.get('title') or ''}"
+    return ("feedback", submission["id"], title, body, assignment.get("subjectId"), assignment["id"])
+
+def _assignment_documents(assignment: Dict[str, Any]) -> List[Document]:
+    documents = [assignment_document(assignment)]
+    for submission in assignment.get("submissions") or []:
+        document = feedback_document(assignment, submission)
+        if document:
+            documents.append(document)
+    return documents
+
+
+class SearchIndex:
+    """FTS5 index with one read connection per thread and serialized writes."""
+
+    def __init__(self, path: str = SEARCH_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._checked = False
+        # External write counts and versions at the last check: with no
+        # external writes since, every write was indexed from its event.
+        self._external_seen: Optional[Tuple[int, ...]] = None
+        self._versions_seen: Optional[Dict[str, Tuple[str, int]]] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    # Writing
+    def _upsert(self, connection: sqlite3.Connection, document: Document) -> None:
+        doc_type, record_id, title, body, subject_id, assignment_id = document
+        row = connection.execute(
+            "INSERT INTO documents(key, type, record_id, title, subject_id, assignment_id) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET title = excluded.title, subject_id = excluded.subject_id, "
+            "assignment_id = excluded.assignment_id RETURNING id",
+            (f"{doc_type}:{record_id}", doc_type, record_id, title, subject_id, assignment_id),
+        ).fetchone()
+        connection.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+        connection.execute("INSERT INTO documents_fts(rowid, title, body, tags) VALUES (?, ?, ?, ?)",
+                           (row[0], title, body, _tags(document)))
+
+    @staticmethod
+    def _data_versions() -> Dict[str, Tuple[str, int]]:
+        return {name: db.VERSIONS.version(name)[:2] for name in INDEXED_COLLECTIONS}
+
+    @staticmethod
+    def _external_writes() -> Tuple[int, ...]:
+        return tuple(db.VERSIONS.external_writes(name) for name in INDEXED_COLLECTIONS)
+
+    def _record_versions(self, connection: sqlite3.Connection, versions: Dict[str, Tuple[str, int]]) -> None:
+        """Store the versions the index is complete through (read before the data was)."""
+        connection.executemany(
+            "INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+            [(f"version:{name}", f"{epoch}-{version}") for name, (epoch, version) in versions.items()],
+        )
+
+    def index(self, documents: Iterable[Document]) -> None:
+        """Add or replace documents in one transaction."""
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                for document in documents:
+                    self._upsert(connection, document)
+
+    def rebuild(self) -> int:
+        """Re-index everything from the JSON files."""
+        external = self._external_writes()
+        versions = self._data_versions()
+        with self._write_lock:
+            connection = self._connection()
+            # Hold the write lock while loading, so no other process can index a
+            # newer version of a record before this older one is written.
+            connection.execute("BEGIN IMMEDIATE")
+            with connection:
+                documents: List[Document] = [subject_document(s) for s in db.get_subjects()]
+                documents += [material_document(m) for m in db.get_materials()]
+                for assignment in db.get_assignments():
+                    documents += _assignment_documents(assignment)
+                connection.execute("DELETE FROM documents")
+                connection.execute("DELETE FROM documents_fts")
+                # Bulk insert with explicit row IDs: much faster than one upsert per document.
+                connection.executemany(
+                    "INSERT INTO documents(id, key, type, record_id, title, subject_id, assignment_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((rowid, f"{d[0]}:{d[1]}", d[0], d[1], d[2], d[4], d[5]) for rowid, d in enumerate(documents, start=1)),
+                )
+                connection.executemany(
+                    "INSERT INTO documents_fts(rowid, title, body, tags) VALUES (?, ?, ?, ?)",
+                    ((rowid, d[2], d[3], _tags(d)) for rowid, d in enumerate(documents, start=1)),
+                )
+                self._record_versions(connection, versions)
+            connection.execute("INSERT INTO documents_fts(documents_fts) VALUES ('optimize')")
+            connection.commit()
+        self._external_seen, self._versions_seen = external, versions
+        self._checked = True
+        logger.info(f"Search - Index rebuilt with {len(documents)} documents")
+        return len(documents)
+
+    def _catch_up(self, versions: Dict[str, Tuple[str, int]]) -> bool:
+        """Re-index the records written since the stored versions; False if only a rebuild can do it."""
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")  # see rebuild()
+            with connection:
+                stored = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+                changed: Dict[str, List[str]] = {}
+                for name, (epoch, version) in versions.items():
+                    stored_epoch, _, stored_version = (stored.get(f"version:{name}") or "").partition("-")
+                    if stored_epoch != epoch or not stored_version.isdigit():
+                        return False
+                    record_ids = db.VERSIONS.changed_since(name, int(stored_version))
+                    if record_ids is None:
+                        return False
+                    changed[name] = record_ids
+                if sum(len(record_ids) for record_ids in changed.values()) > CATCH_UP_LIMIT:
+                    return False
+
+                documents = [subject_document(s) for s in map(db.get_subject_by_id, changed["subjects"]) if s]
+                documents += [material_document(m) for m in map(db.get_material_by_id, changed["materials"]) if m]
+                # Submission IDs are versioned in the assignments collection too, but
+                # every write to a submission also lists its assignment.
+                for assignment in db.get_assignments_by_ids(changed["assignments"]).values():
+                    documents += _assignment_documents(assignment)
+                for document in documents:
+                    self._upsert(connection, document)
+                self._record_versions(connection, versions)
+        if documents:
+            logger.info(f"Search - Caught up on {len(documents)} documents changed outside this process")
+        return True
+
+    def ensure_current(self) -> None:
+        """Index the writes this process got no event for; checked before every search."""
+        with self._check_lock:
+            # External counts first: a write landing in between is caught next time.
+            external = self._external_writes()
+            versions = self._data_versions()
+            if self._checked and external == self._external_seen:
+                # Only this process wrote since the last check, and indexed each write.
+                if versions != self._versions_seen:
+                    with self._write_lock:
+                        connection = self._connection()
+                        with connection:
+                            self._record_versions(connection, versions)
+                    self._versions_seen = versions
+                return
+            if not self._catch_up(versions):
+                self.rebuild()
+                return
+            self._external_seen, self._versions_seen = external, versions
+            self._checked = True
+
+    @property
+    def active(self) -> bool:
+        """Whether the index has been checked against the data and follows writes."""
+        return self._checked
+
+    # Reading
+    def search(self, query: str, types: Optional[List[str]] = None, subject_id: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """BM25-ranked matches for all words of `query`; the last word may be a prefix."""
+        self.ensure_current()
+        match = to_match_expression(query)
+        if not match:
+            return {"query": query, "total": 0, "totalExact": True, "ranked": True, "limit": limit, "offset": offset, "results": []}
+        if types:
+            match += " AND tags : (" + " OR ".join(_tag("t", t) for t in types) + ")"
+        if subject_id:
+            match += f" AND tags : {_tag('s', subject_id)}"
+
+        connection = self._connection()
+        total = connection.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM documents_fts WHERE documents_fts MATCH ? LIMIT ?)", (match, RANK_LIMIT + 1)
+        ).fetchone()[0]
+        ranked = total <= RANK_LIMIT
+        rows = connection.execute(
+            f"SELECT d.type, d.record_id, d.title, d.subject_id, d.assignment_id, "
+            f"bm25(documents_fts, ?, 1.0, 0.0) AS rank, "
+            f"snippet(documents_fts, 1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) "
+            f"FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            f"WHERE documents_fts MATCH ? ORDER BY {'rank' if ranked else 'documents_fts.rowid DESC'} LIMIT ? OFFSET ?",
+            (TITLE_WEIGHT, match, limit, offset),
+        ).fetchall()
+        return {
+            "query": query,
+            "total": min(total, RANK_LIMIT),
+            "totalExact": ranked,
+            "ranked": ranked,
+            "limit": limit,
+            "offset": offset,
+            "results": [
+                {
+                    "type": doc_type, "id": record_id, "title": title, "subjectId": subject, "assignmentId": assignment,
+                    # bm25() is lower for better matches; report a positive score.
+                    "score": round(-rank, 6), "snippet": snippet,
+                }
+                for doc_type, record_id, title, subject, assignment, rank, snippet in rows
+            ],
+        }
+
+
+def to_match_expression(query: str) -> str:
+    """FTS5 expression requiring every word of the query in the title or body; the last word may be a prefix."""
+    tokens = TOKEN_PATTERN.findall(query)
+    if not tokens:
+        return ""
+    # Quoted, so words like AND/OR/NEAR and punctuation are never operators.
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return "{title body} : (" + " ".join(terms) + ")"
+
+
+index = SearchIndex()
+
+
+def on_change(event_type: str, data: Dict[str, Any]) -> None:
+    """Keep the index in step with database writes."""
+    if not index.active:
+        return  # built (or checked against the data versions) on first search
+    if event_type == "subject.saved":
+        index.index([subject_document(data["subject"])])
+    elif event_type == "material.saved":
+        index.index([material_document(data["material"])])
+    elif event_type == "assignment.saved":
+        # The title is part of every feedback document of the assignment.
+        index.index(_assignment_documents(data["assignment"]))
+    elif event_type in ("submission.graded", "appeal.created", "appeal.reviewed"):
+        # appeal.created carries the appeal, not the submission.
+        submission_id = data.get("submissionId") or (data.get("appeal") or {}).get("submissionId")
+        submission = data.get("submission") or db.get_submission_by_id(submission_id)
+        assignment = db.get_assignment_by_id(data["assignmentId"])
+        document = feedback_document(assignment, submission) if assignment and submission else None
+        if document:
+            index.index([document])
+
+db.subscribe(on_change)
@@ -0,0 +1,187 @@
+import gc
+import os
+import mmap
+import struct
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# --- Snapshot Configuration ---
+# Every collection file written by database.save_json gets a binary snapshot
+# next to it (assignments.json -> assignments.snapshot): a header with the
+# record IDs and byte offsets, followed by each record encoded on its own.
+# Readers map the file and decode only the records they touch, so a lookup
+# by ID costs one small decode instead of parsing the whole JSON file, and a
+# full load uses orjson instead of the stdlib parser. The JSON file stays the
+# source of truth: a snapshot that doesn't match it (size and mtime) is
+# ignored and rebuilt from the JSON on the next load. A save only makes the
+# snapshot stale, so a burst of writes pays for one rebuild, on the first read.
+SNAPSHOTS_ENABLED = os.getenv("DB_SNAPSHOTS", "1") == "1"
+MAGIC = b"GRDSNAP1"
+_PREFIX = struct.Struct("<8sQ")  # magic, header length
+# Nested records indexed by their own ID, e.g. submission ID -> assignment.
+CHILD_INDEXES = {"assignments": "submissions"}
+
+
+def snapshot_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".snapshot"
+
+def source_of(stat: os.stat_result) -> List[int]:
+    """What a snapshot remembers of the JSON file it was built from."""
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# --- Writing ---
+def write(json_path: str, data: Any, source: List[int]) -> bool:
+    """
+    Write the snapshot of `data`, the contents of `json_path` when it had the
+    given `source` (taken from the same file handle, so a concurrent writer
+    makes the snapshot stale rather than wrong). False if it can't be encoded.
+    """
+    path = snapshot_path(json_path)
+    if isinstance(data, dict):
+        kind, keys, values = "dict", list(data), list(data.values())
+    elif isinstance(data, list):
+        kind, values = "list", data
+        keys = [record.get("id") if isinstance(record, dict) else None for record in data]
+    else:
+        _remove(path)
+        return False
+    try:
+        blobs = [orjson.dumps(value) for value in values]
+    except orjson.JSONEncodeError as e:
+        # e.g. integers beyond 64 bits; readers fall back to the JSON file.
+        logger.warning(f"Snapshot - Cannot encode {os.path.basename(json_path)}, using JSON only: {e}")
+        _remove(path)
+        return False
+
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    children: Dict[str, int] = {}
+    child_field = CHILD_INDEXES.get(os.path.splitext(os.path.basename(json_path))[0])
+    if child_field:
+        for position, value in enumerate(values):
+            for child in (value.get(child_field) if isinstance(value, dict) else None) or []:
+                if isinstance(child, dict) and child.get("id"):
+                    children.setdefault(child["id"], position)
+    header = orjson.dumps({"kind": kind, "source": source, "keys": keys, "offsets": offsets, "children": children})
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return True
+
+
+# --- Reading ---
+class Snapshot:
+    """A memory-mapped snapshot; records are decoded on access and never cached (callers modify them)."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = _PREFIX.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a snapshot")
+        header = orjson.loads(self._map[_PREFIX.size:_PREFIX.size + header_length])
+        self._data_start = _PREFIX.size + header_length
+        self.size = len(self._map)
+        self.kind: str = header["kind"]
+        self.source: List[int] = header["source"]
+        self.keys: List[Optional[str]] = header["keys"]
+        self._offsets: List[int] = header["offsets"]
+        self._children: Dict[str, int] = header["children"]
+        self._positions: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def record(self, position: int) -> Any:
+        start = self._data_start + self._offsets[position]
+        return orjson.loads(self._map[start:self._data_start + self._offsets[position + 1]])
+
+    def get(self, key: str) -> Any:
+        """The record with this ID (list collections) or key (dict collections), or None."""
+        if self._positions is None:
+            self._positions = {}
+            for i, k in enumerate(self.keys):
+                if k is not None:
+                    self._positions.setdefault(k, i)  # first match, like a scan would return
+        position = self._positions.get(key)
+        return None if position is None else self.record(position)
+
+    def parent_of(self, child_id: str) -> Any:
+        """The record containing the nested record with this ID (see CHILD_INDEXES), or None."""
+        position = self._children.get(child_id)
+        return None if position is None else self.record(position)
+
+    def load(self) -> Any:
+        """Decode the whole collection, as json.load would return it."""
+        start, offsets, view = self._data_start, self._offsets, self._map
+        # Decoding allocates millions of objects that all stay alive; the cyclic GC
+        # would repeatedly scan them for nothing.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            values = [orjson.loads(view[start + offsets[i]:start + offsets[i + 1]]) for i in range(len(self.keys))]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return dict(zip(self.keys, values)) if self.kind == "dict" else values
+
+
+_open: Dict[str, Tuple[Tuple[int, int, int], Snapshot]] = {}
+_open_lock = threading.Lock()
+_unencodable: Set[Tuple[str, int, int]] = set()
+
+def current(json_path: str) -> Optional[Snapshot]:
+    """The snapshot of `json_path` if it matches the JSON file, else None."""
+    if not SNAPSHOTS_ENABLED:
+        return None
+    path = snapshot_path(json_path)
+    try:
+        json_stat = os.stat(json_path)
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _open_lock:
+        cached = _open.get(json_path)
+    if cached and cached[0] == identity:
+        snapshot = cached[1]
+    else:
+        # Replaced by a write (here or in another process): map the new file.
+        try:
+            snapshot = Snapshot(path)
+        except (ValueError, OSError, struct.error, orjson.JSONDecodeError) as e:
+            logger.warning(f"Snapshot - Ignoring unreadable {path}: {e}")
+            return None
+        with _open_lock:
+            _open[json_path] = (identity, snapshot)
+    if snapshot.source != source_of(json_stat):
+        return None
+    return snapshot
+
+def refresh(json_path: str, data: Any, source: List[int]) -> None:
+    """Write the snapshot of data just read from or written to the JSON file; failures are only logged."""
+    if not SNAPSHOTS_ENABLED or (json_path, *source) in _unencodable:
+        return
+    try:
+        if not write(json_path, data, source):
+            _unencodable.add((json_path, *source))
+    except OSError as e:
+        logger.warning(f"Snapshot - Could not write the snapshot of {json_path}: {e}")
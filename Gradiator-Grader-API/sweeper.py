@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+import database as db
+from blobstore import BlobStore, key_from_url
+
+logger = logging.getLogger(__name__)
+
+# --- Sweeper Configuration ---
+# How often the background sweep runs (0 disables it).
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", "3600"))
+# Unreferenced uploads younger than this are kept: the file is written before
+# the record that points to it, so a fresh upload is not an orphan yet.
+SWEEP_GRACE_SECONDS = int(os.getenv("SWEEP_GRACE_SECONDS", str(24 * 3600)))
+# Grading temp files are only needed for the duration of a request.
+TEMP_GRACE_SECONDS = int(os.getenv("SWEEP_TEMP_GRACE_SECONDS", "3600"))
+# The background sweep deletes, so disk usage stays bounded without manual
+# cleanup; set SWEEP_DRY_RUN=1 to have it only log what it would delete. The
+# admin endpoint reports only unless asked to delete (dry_run=false).
+SWEEP_DRY_RUN = os.getenv("SWEEP_DRY_RUN", "0") == "1"
+
+
+def _record(report: Dict[str, Any], name: str, size: int) -> None:
+    report["deleted"].append(name)
+    report["reclaimedBytes"] += size
+
+def sweep(
+    store: BlobStore,
+    temp_dir: str,
+    dry_run: Optional[bool] = None,
+    grace_seconds: Optional[int] = None,
+    temp_grace_seconds: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Delete uploads that no database record references and stale temp files.
+
+    Returns a report with the scanned file count, the deleted paths and the
+    number of bytes reclaimed (or that would be reclaimed on a dry run).
+    """
+    dry_run = SWEEP_DRY_RUN if dry_run is None else dry_run
+    grace_seconds = SWEEP_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    temp_grace_seconds = TEMP_GRACE_SECONDS if temp_grace_seconds is None else temp_grace_seconds
+
+    now = time.time()
+    referenced = {key_from_url(url) for url in db.get_referenced_files()}
+    report = {"dryRun": dry_run, "scanned": 0, "deleted": [], "reclaimedBytes": 0}
+
+    # Uploads: anything in the blob store that no record points to, including
+    # .part files left behind by uploads that crashed before they finished.
+    for key, size, modified in store.iter_blobs():
+        report["scanned"] += 1
+        if key in referenced or now - modified < grace_seconds:
+            continue
+        if not dry_run:
+            try:
+                store.delete(key)
+            except Exception as e:
+                logger.warning(f"Sweeper - Could not delete upload {key}: {e}")
+                continue
+        _record(report, key, size)
+
+    # Temp files: leftovers from grading requests that never reached their cleanup.
+    if os.path.isdir(temp_dir):
+        with os.scandir(temp_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                report["scanned"] += 1
+                stat = entry.stat()
+                if now - stat.st_mtime < temp_grace_seconds:
+                    continue
+                if not dry_run:
+                    try:
+                        os.remove(entry.path)
+                    except OSError as e:
+                        logger.warning(f"Sweeper - Could not delete {entry.path}: {e}")
+                        continue
+                _record(report, entry.path, stat.st_size)
+
+    logger.info(
+        f"Sweeper - Scanned {report['scanned']} files, "
+        f"{'would delete' if dry_run else 'deleted'} {len(report['deleted'])} "
+        f"({report['reclaimedBytes']} bytes)."
+    )
+    return report
+
+async def run_periodically(store: BlobStore, temp_dir: str, interval: int = SWEEP_INTERVAL_SECONDS) -> None:
+    """Run the sweep forever in a worker thread, once every `interval` seconds."""
+    while True:
+        try:
+            await asyncio.to_thread(sweep, store, temp_dir)
+        except Exception as e:
+            logger.error(f"Sweeper - Sweep failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
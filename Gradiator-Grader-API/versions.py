@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process only
+    fcntl = None
+
+# --- Data Versions ---
+# Every collection has a counter that is incremented on each write. Records
+# remember the counter value of their last change; records without an entry
+# share the collection's "floor" (the version of the last write that replaced
+# the whole collection, or of the oldest pruned entry). A record's version
+# therefore changes whenever the record does, and checking it needs nothing
+# but this small file, never the collection itself.
+#
+# Several server processes (and the bulk import CLI) can share a database
+# directory: bump() holds an exclusive lock on versions.json.lock while it
+# re-reads, increments and rewrites the file, so no two writes get the same
+# version, and readers re-read the file whenever it has been replaced. Writes
+# by other processes are counted per collection (external_writes), so caches
+# that are otherwise kept current by this process's change events can tell
+# when they missed one.
+
+RECORD_LIMIT = int(os.getenv("VERSION_RECORD_LIMIT", "5000"))
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on `path`.lock shared by every process on this machine (no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class VersionStore:
+    def __init__(self, path: str, record_limit: int = RECORD_LIMIT):
+        self.path = path
+        self.record_limit = record_limit
+        self._lock = threading.Lock()
+        self._file_id: Optional[Tuple[int, int]] = None  # (inode, mtime) of the state last read or written
+        self._state: Dict[str, Any] = {"epoch": uuid.uuid4().hex[:8], "collections": {}}
+        self._external: Dict[str, int] = {}
+
+    def _refresh(self, force: bool = False) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        # Every save replaces the file, so a new inode means a new state even
+        # when the mtime is too coarse to tell.
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if force or file_id != self._file_id:
+            try:
+                with open(self.path) as f:
+                    state = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                return  # keep the last good state; the next write replaces the file
+            self._count_external(state)
+            self._state = state
+            self._file_id = file_id
+
+    def _count_external(self, state: Dict[str, Any]) -> None:
+        """Count the writes in `state` that this process has not made or seen yet."""
+        same_epoch = state.get("epoch") == self._state.get("epoch")
+        for name, collection in state.get("collections", {}).items():
+            known = self._state["collections"].get(name, {}).get("version", 0) if same_epoch else -1
+            if collection["version"] != known:
+                self._external[name] = self._external.get(name, 0) + max(collection["version"] - known, 1)
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._file_id = (stat.st_ino, stat.st_mtime_ns)
+
+    def _collection(self, name: str) -> Dict[str, Any]:
+        return self._state["collections"].setdefault(
+            name, {"version": 0, "modified": 0.0, "floor": 0, "floorModified": 0.0, "records": {}}
+        )
+
+    def bump(self, name: str, record_ids: Optional[Iterable[str]] = None) -> int:
+        """Record a write to a collection; None means every record may have changed."""
+        with self._lock, file_lock(self.path):
+            self._refresh(force=True)
+            collection = self._collection(name)
+            now = time.time()
+            collection["version"] += 1
+            collection["modified"] = now
+            if record_ids is None:
+                collection["floor"] = collection["version"]
+                collection["floorModified"] = now
+                collection["records"] = {}
+            else:
+                for record_id in record_ids:
+                    if record_id:
+                        collection["records"][record_id] = [collection["version"], now]
+                self._prune(collection)
+            self._save()
+            return collection["version"]
+
+    def _prune(self, collection: Dict[str, Any]) -> None:
+        records = collection["records"]
+        if len(records) <= self.record_limit:
+            return
+        # Drop the oldest half; they fall back to the (raised) floor.
+        ordered = sorted(records.items(), key=lambda item: item[1][0])
+        dropped = ordered[:len(ordered) // 2]
+        collection["floor"], collection["floorModified"] = dropped[-1][1]
+        collection["records"] = dict(ordered[len(ordered) // 2:])
+
+    def version(self, name: str, record_id: Optional[str] = None) -> Tuple[str, int, float]:
+        """(epoch, version, modified time) of a collection or one of its records."""
+        with self._lock:
+            self._refresh()
+            collection = self._state["collections"].get(name)
+            epoch = self._state["epoch"]
+            if collection is None:
+                return epoch, 0, 0.0
+            if record_id is None:
+                return epoch, collection["version"], collection["modified"]
+            version, modified = collection["records"].get(record_id, (collection["floor"], collection["floorModified"]))
+            return epoch, version, modified
+
+    def changed_since(self, name: str, version: int) -> Optional[List[str]]:
+        """
+        IDs of the records written after `version` of a collection; None when
+        that can't be told (a later write replaced the whole collection, or
+        the records' entries have been pruned).
+        """
+        with self._lock:
+            self._refresh()
+            collection = self._state["collections"].get(name)
+            if collection is None:
+                return []
+            if collection["floor"] > version:
+                return None
+            return [record_id for record_id, (record_version, _) in collection["records"].items() if record_version > version]
+
+    def external_writes(self, name: str) -> int:
+        """
+        Writes to a collection by other processes that this one has noticed so
+        far. A cache kept current by change events compares it with the count
+        at build time to find writes it got no event for.
+        """
+        with self._lock:
+            self._refresh()
+            return self._external.get(name, 0)
+
+    def etag(self, name: str, record_id: Optional[str] = None) -> Tuple[str, float]:
+        """Weak ETag and modification time for a collection or record."""
+        epoch, version, modified = self.version(name, record_id)
+        # Weak: the same version may be sent with different content encodings.
+        return f'W/"{epoch}-{name}-{version}"', modified
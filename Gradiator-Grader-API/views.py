@@ -0,0 +1,134 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# --- Dashboard Views ---
+# What a dashboard needs, kept precomputed so /api/bootstrap and
+# /api/subjects/{id}/overview answer without loading the assignments file
+# with every submission embedded:
+#
+# - a summary of each assignment: the assignment without its submission list,
+#   plus its counters (submitted, graded, pending appeals, mean grade, ...)
+# - every student's own submissions, by assignment
+#
+# Both are built in one pass over the assignments on first use and updated
+# from database events, one assignment at a time. A write from another process
+# (the bulk import CLI, a second worker) comes with no event here; it is found
+# through the assignments' external write count and triggers a rebuild.
+
+STUDENT_ROLE = "student"
+
+
+class DashboardViews:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._external: Optional[int] = None  # external writes at the last build; None until built
+        self._changes = 0  # local writes seen, to tell whether one landed during a build
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._by_subject: Dict[str, List[str]] = {}
+        self._by_student: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}  # student -> assignment -> submissions
+        self._students_of: Dict[str, List[str]] = {}  # assignment -> students with submissions
+
+    # --- Building ---
+    def _ensure_current(self) -> None:
+        external = db.VERSIONS.external_writes("assignments")
+        with self._lock:
+            if self._external == external:
+                return
+            changes = self._changes
+        assignments = db.get_assignments()
+        with self._lock:
+            self._summaries, self._by_subject, self._by_student, self._students_of = {}, {}, {}, {}
+            for assignment in assignments:
+                self._put(assignment)
+            # A local write that landed while loading may be missing: build again next time.
+            self._external = external if changes == self._changes else None
+        logger.info(f"Views - Built dashboard views for {len(assignments)} assignments")
+
+    def _put(self, assignment: Dict[str, Any]) -> None:
+        """Add or replace one assignment (the lock is held)."""
+        assignment_id = assignment["id"]
+        previous = self._summaries.get(assignment_id)
+        if not previous or previous.get("subjectId") != assignment.get("subjectId"):
+            if previous:
+                self._by_subject[previous.get("subjectId")].remove(assignment_id)
+            self._by_subject.setdefault(assignment.get("subjectId"), []).append(assignment_id)
+
+        stats = db.summarize_stats(db.compute_assignment_stats(assignment))
+        summary = {k: v for k, v in assignment.items() if k != "submissions"}
+        summary["stats"] = {k: v for k, v in stats.items() if k not in ("assignmentId", "subjectId")}
+        self._summaries[assignment_id] = summary
+
+        for student_id in self._students_of.pop(assignment_id, []):
+            self._by_student.get(student_id, {}).pop(assignment_id, None)
+        students: Dict[str, List[Dict[str, Any]]] = {}
+        for submission in assignment.get("submissions") or []:
+            students.setdefault(submission.get("studentId"), []).append(submission)
+        for student_id, submissions in students.items():
+            self._by_student.setdefault(student_id, {})[assignment_id] = submissions
+        self._students_of[assignment_id] = list(students)
+
+    def on_change(self, event_type: str, data: Dict[str, Any]) -> None:
+        """Refresh the assignment a write touched."""
+        if not event_type.startswith(("assignment.", "submission.", "appeal.")):
+            return
+        with self._lock:
+            self._changes += 1
+            if self._external is None:
+                return  # built on first use
+        assignment = data.get("assignment") or db.get_assignment_by_id(data.get("assignmentId"))
+        if assignment is None:
+            return
+        with self._lock:
+            self._put(assignment)
+
+    # --- Reading ---
+    def _for_user(self, assignment_ids: List[str], user: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Summaries with counters for graders; for students without the class counters but with their own submissions."""
+        if user.get("role") != STUDENT_ROLE:
+            return [dict(self._summaries[a]) for a in assignment_ids]
+        own = self._by_student.get(user["id"], {})
+        return [
+            {**{k: v for k, v in self._summaries[a].items() if k != "stats"}, "submissions": list(own.get(a, []))}
+            for a in assignment_ids
+        ]
+
+    def bootstrap(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Everything the dashboard of `user` shows first, in one response."""
+        self._ensure_current()
+        with self._lock:
+            assignments = self._for_user(list(self._summaries), user)
+        return {
+            "user": user,
+            "role": user.get("role"),
+            "subjects": db.get_subjects(),
+            "assignments": assignments,
+            "materials": db.get_materials(),
+        }
+
+    def subject_overview(self, subject: Dict[str, Any], user: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        One subject's page: its assignments and materials. Graders get every
+        submission of the subject's assignments, students only their own.
+        """
+        self._ensure_current()
+        with self._lock:
+            assignment_ids = list(self._by_subject.get(subject["id"], []))
+            summaries = self._for_user(assignment_ids, user)
+        if user.get("role") != STUDENT_ROLE:
+            full = db.get_assignments_by_ids(summary["id"] for summary in summaries)
+            for summary in summaries:
+                summary["submissions"] = (full.get(summary["id"]) or {}).get("submissions") or []
+        return {
+            "subject": subject,
+            "assignments": summaries,
+            "materials": db.get_materials_for_subject(subject["id"]),
+        }
+
+
+views = DashboardViews()
+db.subscribe(views.on_change)
@@ -1,5 +1,5 @@
 
-import React, { createContext, useContext, useState, useEffect } from "react";
+import React, { createContext, useContext, useState, useEffect, useRef } from "react";
 import { 
   Subject, 
   Assignment, 
@@ -9,6 +9,8 @@ import {
 } from "@/types/education";
 import { useToast } from "@/components/ui/use-toast";
 import { databaseService } from "@/services/DatabaseService";
+import { ChangeEvent } from "@/services/ApiService";
+import { useAuth } from "@/context/AuthContext";
 
 interface EducationContextType {
   subjects: Subject[];
@@ -27,6 +29,7 @@ interface EducationContextType {
   getSubmissionsForAssignment: (assignmentId: string) => Submission[];
   gradeSubmission: (submissionId: string, grade: number, feedback: string) => Promise<void>;
   refreshData: () => Promise<void>;
+  loadSubjectOverview: (subjectId: string) => Promise<void>;
   loading: boolean;
 }
 
@@ -47,6 +50,7 @@ const EducationContext = createContext<EducationContextType>({
   getSubmissionsForAssignment: () => [],
   gradeSubmission: async () => {},
   refreshData: async () => {},
+  loadSubjectOverview: async () => {},
   loading: false,
 });
 
@@ -56,19 +60,32 @@ export const EducationProvider: React.FC<{ children: React.ReactNode }> = ({ chi
   const [materials, setMaterials] = useState<Material[]>([]);
   const [loading, setLoading] = useState(true);
   const { toast } = useToast();
+  const { currentUser } = useAuth();
+
+  // Subject page that is open: its assignments come with every submission
+  // for graders, so a refresh fetches its overview again.
+  const openSubjectId = useRef<string | null>(null);
+
+  const mergeSubject = <T extends { subjectId: string }>(all: T[], subjectId: string, forSubject: T[]) =>
+    [...all.filter(item => item.subjectId !== subjectId), ...forSubject];
+
+  const upsert = <T extends { id: string }>(all: T[], item: T) =>
+    all.some(existing => existing.id === item.id)
+      ? all.map(existing => existing.id === item.id ? { ...existing, ...item } : existing)
+      : [...all, item];
 
   const refreshData = async () => {
     setLoading(true);
     try {
-      const [fetchedSubjects, fetchedAssignments, fetchedMaterials] = await Promise.all([
-        databaseService.getSubjects(),
-        databaseService.getAssignments(),
-        databaseService.getMaterials()
+      const subjectId = openSubjectId.current;
+      const [dashboard, overview] = await Promise.all([
+        databaseService.getDashboard(currentUser),
+        subjectId && currentUser ? databaseService.getSubjectOverview(subjectId, currentUser) : null
       ]);
       
-      setSubjects(fetchedSubjects);
-      setAssignments(fetchedAssignments);
-      setMaterials(fetchedMaterials);
+      setSubjects(dashboard.subjects);
+      setAssignments(overview ? mergeSubject(dashboard.assignments, subjectId!, overview.assignments) : dashboard.assignments);
+      setMaterials(overview ? mergeSubject(dashboard.materials, subjectId!, overview.materials) : dashboard.materials);
     } catch (error) {
       console.error("Error fetching data:", error);
       toast({
@@ -81,9 +98,114 @@ export const EducationProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     }
   };
 
+  const loadSubjectOverview = async (subjectId: string) => {
+    openSubjectId.current = subjectId;
+    if (!currentUser) return;
+    try {
+      const overview = await databaseService.getSubjectOverview(subjectId, currentUser);
+      setAssignments(prev => mergeSubject(prev, subjectId, overview.assignments));
+      setMaterials(prev => mergeSubject(prev, subjectId, overview.materials));
+    } catch (error) {
+      console.error("Error fetching subject overview:", error);
+    }
+  };
+
   useEffect(() => {
     refreshData();
-  }, []);
+  }, [currentUser?.id]);
+
+  // Change feed: apply the deltas other users (and background jobs) write,
+  // instead of refetching. A reset means events were missed: refetch once.
+  const updateSubmission = (
+    assignmentId: string,
+    submissionId: string,
+    update: (submission?: Submission) => Submission | undefined
+  ) => {
+    setAssignments(prev => prev.map(assignment => {
+      if (assignment.id !== assignmentId) return assignment;
+      const submissions = assignment.submissions ?? [];
+      const existing = submissions.find(s => s.id === submissionId);
+      const updated = update(existing);
+      if (!updated) return assignment;
+      return {
+        ...assignment,
+        submissions: existing
+          ? submissions.map(s => s.id === submissionId ? updated : s)
+          : [...submissions, updated],
+      };
+    }));
+  };
+
+  const applyChange = (event: ChangeEvent) => {
+    const data = event.data;
+    const isStudent = currentUser?.role === "student";
+    // Students only follow their own submissions; graders get every
+    // submission of the subject page that is open.
+    const follows = data.studentId === currentUser?.id
+      || (!isStudent && data.subjectId === openSubjectId.current);
+    if (data.studentId && isStudent && data.studentId !== currentUser?.id) return;
+
+    switch (event.type) {
+      case "subject.saved":
+        setSubjects(prev => upsert(prev, data.subject));
+        break;
+      case "material.saved":
+        setMaterials(prev => upsert(prev, data.material));
+        break;
+      case "assignment.saved":
+        // The feed leaves out the submissions: keep the ones already loaded
+        setAssignments(prev => upsert(prev, data.assignment));
+        break;
+      case "assignment.closed":
+        setAssignments(prev => prev.map(assignment => assignment.id === data.assignmentId
+          ? { ...assignment, status: data.status, appealDeadline: data.appealDeadline ?? assignment.appealDeadline }
+          : assignment));
+        break;
+      case "submission.created":
+      case "submission.graded":
+      case "appeal.reviewed":
+        updateSubmission(data.assignmentId, data.submission.id,
+          existing => (existing || follows) ? { ...existing, ...data.submission } : undefined);
+        break;
+      case "appeal.created":
+        updateSubmission(data.assignmentId, data.appeal.submissionId,
+          existing => existing && { ...existing, appeal: data.appeal });
+        break;
+      case "submission.text_extracted":
+        updateSubmission(data.assignmentId, data.submissionId,
+          existing => existing && { ...existing, textExtraction: data.textExtraction });
+        break;
+      case "submission.hashed":
+        updateSubmission(data.assignmentId, data.submissionId,
+          existing => existing && { ...existing, imageHashes: data.imageHashes });
+        break;
+      case "submission.flagged":
+        updateSubmission(data.assignmentId, data.submissionId,
+          existing => existing && { ...existing, needsReview: true, reviewReason: data.reason });
+        break;
+    }
+  };
+
+  useEffect(() => {
+    if (!currentUser) return;
+    let unsubscribe: (() => void) | undefined;
+    let cancelled = false;
+    databaseService.subscribeToChanges(applyChange, {
+      types: [
+        "subject.saved", "material.saved", "assignment.saved", "assignment.closed",
+        "submission.created", "submission.graded", "submission.text_extracted", "submission.hashed",
+        "submission.flagged", "appeal.created", "appeal.reviewed",
+      ],
+      onReset: refreshData,
+    }).then(stop => {
+      if (cancelled) stop();
+      else unsubscribe = stop;
+    });
+    return () => {
+      cancelled = true;
+      unsubscribe?.();
+    };
+  }, [currentUser?.id]);
 
   const addAssignment = async (assignmentData: Omit<Assignment, "id">) => {
     try {
@@ -284,6 +406,7 @@ export const EducationProvider: React.FC<{ children: React.ReactNode }> = ({ chi
         getSubmissionsForAssignment,
         gradeSubmission,
         refreshData,
+        loadSubjectOverview,
         loading
       }}
     >
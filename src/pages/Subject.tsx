@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useState, useEffect } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import { useAuth } from "@/context/AuthContext";
 import { useEducation } from "@/context/EducationContext";
@@ -35,7 +35,8 @@ const Subject = () => {
     submitAppeal,
     reviewAppeal,
     loading,
-    refreshData
+    refreshData,
+    loadSubjectOverview
   } = useEducation();
   const navigate = useNavigate();
   
@@ -52,6 +53,12 @@ const Subject = () => {
   const [appealReason, setAppealReason] = useState("");
   const [newGrade, setNewGrade] = useState(0);
   const [newFeedback, setNewFeedback] = useState("");
+
+  useEffect(() => {
+    if (subjectId) {
+      loadSubjectOverview(subjectId);
+    }
+  }, [subjectId, currentUser?.id]);
   
   if (loading) {
     return (
@@ -1,10 +1,101 @@
 import { Subject, Assignment, Material, Submission, Appeal } from "@/types/education";
 import { User } from "@/types/auth";
 
+export const CHANGE_EVENT_TYPES = [
+  "submission.created",
+  "submission.graded",
+  "submission.text_extracted",
+  "submission.flagged",
+  "submission.hashed",
+  "appeal.created",
+  "appeal.reviewed",
+  "assignment.saved",
+  "assignment.closed",
+  "material.saved",
+  "subject.saved",
+  "user.saved",
+  "user.deleted",
+] as const;
+
+export type ChangeEventType = typeof CHANGE_EVENT_TYPES[number];
+
+export interface ChangeEvent {
+  seq: number;
+  type: ChangeEventType;
+  at: string;
+  data: Record<string, any>;
+}
+
+export type SearchResultType = "subject" | "assignment" | "material" | "feedback";
+
+export interface SearchResult {
+  type: SearchResultType;
+  id: string;
+  title: string;
+  subjectId?: string;
+  assignmentId?: string;
+  score: number;
+  snippet: string;
+}
+
+export interface SearchResponse {
+  query: string;
+  total: number;
+  totalExact: boolean;
+  ranked: boolean;
+  limit: number;
+  offset: number;
+  results: SearchResult[];
+}
+
+// Assignment as sent by the dashboard endpoints: graders get its counters,
+// students only their own submissions.
+export interface DashboardAssignment extends Assignment {
+  stats?: Record<string, number | null>;
+}
+
+export interface Bootstrap {
+  user: User;
+  role: User["role"];
+  subjects: Subject[];
+  assignments: DashboardAssignment[];
+  materials: Material[];
+}
+
+export interface SubjectOverview {
+  subject: Subject;
+  assignments: DashboardAssignment[];
+  materials: Material[];
+}
+
 // API service for interacting with the FastAPI backend
 class ApiService {
   private readonly apiUrl = "http://localhost:8000";
 
+  // POST that is safe to retry: every attempt carries the same Idempotency-Key, so the
+  // server runs it once and replays its response to the retries.
+  private async postIdempotent(url: string, init: RequestInit, attempts = 3): Promise<Response> {
+    const key = crypto.randomUUID();
+    for (let attempt = 1; ; attempt++) {
+      try {
+        const response = await fetch(url, {
+          ...init,
+          method: "POST",
+          headers: { ...(init.headers as Record<string, string> | undefined), "Idempotency-Key": key },
+        });
+        // Only gateway errors are retried; other failures are real answers.
+        if (![502, 503, 504].includes(response.status) || attempt >= attempts) {
+          return response;
+        }
+      } catch (error) {
+        if (attempt >= attempts) {
+          throw error;
+        }
+      }
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** (attempt - 1)));
+    }
+  }
+
   // User endpoints
   async getUsers(): Promise<User[]> {
     const response = await fetch(`${this.apiUrl}/api/users`);
@@ -226,8 +317,7 @@ class ApiService {
       formData.append("files", file);
     }
     
-    const response = await fetch(`${this.apiUrl}/api/assignments/${assignmentId}/submit`, {
-      method: "POST",
+    const response = await this.postIdempotent(`${this.apiUrl}/api/assignments/${assignmentId}/submit`, {
       body: formData,
     });
     
@@ -239,8 +329,7 @@ class ApiService {
   }
 
   async gradeSubmission(submissionId: string, grade: number, feedback: string): Promise<Submission> {
-    const response = await fetch(`${this.apiUrl}/api/submissions/${submissionId}/grade`, {
-      method: "POST",
+    const response = await this.postIdempotent(`${this.apiUrl}/api/submissions/${submissionId}/grade`, {
       headers: {
         "Content-Type": "application/json",
       },
@@ -256,8 +345,7 @@ class ApiService {
 
   // Appeal endpoints
   async submitAppeal(submissionId: string, reason: string): Promise<Appeal> {
-    const response = await fetch(`${this.apiUrl}/api/submissions/${submissionId}/appeal`, {
-      method: "POST",
+    const response = await this.postIdempotent(`${this.apiUrl}/api/submissions/${submissionId}/appeal`, {
       headers: {
         "Content-Type": "application/json",
       },
@@ -287,6 +375,64 @@ class ApiService {
     return response.json();
   }
 
+  // Dashboard endpoints: everything a page shows first, in one request
+  async getBootstrap(userId: string): Promise<Bootstrap> {
+    const response = await fetch(`${this.apiUrl}/api/bootstrap?user_id=${encodeURIComponent(userId)}`);
+    if (!response.ok) {
+      throw new Error(`Failed to fetch dashboard: ${response.statusText}`);
+    }
+    return response.json();
+  }
+
+  async getSubjectOverview(subjectId: string, userId: string): Promise<SubjectOverview> {
+    const response = await fetch(
+      `${this.apiUrl}/api/subjects/${subjectId}/overview?user_id=${encodeURIComponent(userId)}`
+    );
+    if (!response.ok) {
+      throw new Error(`Failed to fetch subject overview: ${response.statusText}`);
+    }
+    return response.json();
+  }
+
+  // Search endpoint: ranked server-side search instead of filtering downloaded collections
+  async search(
+    query: string,
+    options: { types?: SearchResultType[]; subjectId?: string; limit?: number; offset?: number } = {}
+  ): Promise<SearchResponse> {
+    const params = new URLSearchParams({ q: query });
+    if (options.types?.length) params.set("types", options.types.join(","));
+    if (options.subjectId) params.set("subject_id", options.subjectId);
+    if (options.limit !== undefined) params.set("limit", String(options.limit));
+    if (options.offset !== undefined) params.set("offset", String(options.offset));
+
+    const response = await fetch(`${this.apiUrl}/api/search?${params}`);
+    if (!response.ok) {
+      throw new Error(`Failed to search: ${response.statusText}`);
+    }
+    return response.json();
+  }
+
+  // Change feed: pushes small deltas instead of refetching whole collections.
+  // EventSource reconnects by itself and resumes from the last event it saw;
+  // onReset means events were missed and the data should be refetched once.
+  subscribeToChanges(
+    onChange: (event: ChangeEvent) => void,
+    options: { types?: ChangeEventType[]; subjectId?: string; onReset?: () => void } = {}
+  ): () => void {
+    const params = new URLSearchParams();
+    if (options.types?.length) params.set("types", options.types.join(","));
+    if (options.subjectId) params.set("subject_id", options.subjectId);
+
+    const source = new EventSource(`${this.apiUrl}/api/changes/stream?${params}`);
+    const types: readonly ChangeEventType[] = options.types ?? CHANGE_EVENT_TYPES;
+    types.forEach(type => {
+      source.addEventListener(type, (message) => onChange(JSON.parse((message as MessageEvent).data)));
+    });
+    source.addEventListener("reset", () => options.onReset?.());
+
+    return () => source.close();
+  }
+
   // AI Grading endpoint
   async gradeHomework(taskFile: File, solutionFile: File, criteria: string): Promise<{ score: number, feedback: string }> {
     const formData = new FormData();
@@ -299,8 +445,7 @@ class ApiService {
     console.log("Solution file:", solutionFile.name, "Size:", solutionFile.size);
     console.log("Criteria length:", criteria.length);
     
-    const response = await fetch(`${this.apiUrl}/api/grade`, {
-      method: "POST",
+    const response = await this.postIdempotent(`${this.apiUrl}/api/grade`, {
       body: formData,
     });
     
@@ -1,7 +1,7 @@
 
 import { Subject, Assignment, Material, Submission, Appeal } from "@/types/education";
 import { User } from "@/types/auth";
-import { apiService } from "./ApiService";
+import { apiService, Bootstrap, ChangeEvent, ChangeEventType, SubjectOverview } from "./ApiService";
 import { toast } from "@/hooks/use-toast";
 
 // This service serves as an adapter between the frontend and the FastAPI backend
@@ -9,10 +9,11 @@ import { toast } from "@/hooks/use-toast";
 class DatabaseService {
   private storagePrefix = "gradiator_";
   private useLocalStorage = true; // Default to localStorage for offline functionality
+  private apiChecked: Promise<void>;
 
   constructor() {
     // Check if API is available
-    this.checkApiAvailability();
+    this.apiChecked = this.checkApiAvailability();
   }
 
   // Check if the API is available and set useLocalStorage accordingly
@@ -106,6 +107,39 @@ class DatabaseService {
     }
   }
 
+  // Dashboard: one request for what a page shows first, or the separate
+  // collection requests when the backend (or the endpoint) is unavailable
+  async getDashboard(user: User | null): Promise<Pick<Bootstrap, "subjects" | "assignments" | "materials">> {
+    if (user && !this.useLocalStorage) {
+      try {
+        return await apiService.getBootstrap(user.id);
+      } catch (error) {
+        console.error("Error fetching dashboard from API, falling back to separate requests:", error);
+      }
+    }
+    const [subjects, assignments, materials] = await Promise.all([
+      this.getSubjects(),
+      this.getAssignments(),
+      this.getMaterials()
+    ]);
+    return { subjects, assignments, materials };
+  }
+
+  async getSubjectOverview(subjectId: string, user: User): Promise<Pick<SubjectOverview, "assignments" | "materials">> {
+    if (!this.useLocalStorage) {
+      try {
+        return await apiService.getSubjectOverview(subjectId, user.id);
+      } catch (error) {
+        console.error("Error fetching subject overview from API, falling back to separate requests:", error);
+      }
+    }
+    const [assignments, materials] = await Promise.all([
+      this.getAssignmentsForSubject(subjectId),
+      this.getMaterialsForSubject(subjectId)
+    ]);
+    return { assignments, materials };
+  }
+
   // Subject management
   async getSubjects(): Promise<Subject[]> {
     if (this.useLocalStorage) {
@@ -597,6 +631,19 @@ class DatabaseService {
     }
   }
 
+  // Change feed: live updates from the backend; nothing to follow in localStorage mode.
+  // Resolves to the function that unsubscribes.
+  async subscribeToChanges(
+    onChange: (event: ChangeEvent) => void,
+    options: { types?: ChangeEventType[]; subjectId?: string; onReset?: () => void } = {}
+  ): Promise<() => void> {
+    await this.apiChecked;
+    if (this.useLocalStorage) {
+      return () => {};
+    }
+    return apiService.subscribeToChanges(onChange, options);
+  }
+
   // AI Grading
   async gradeHomework(taskFile: File, solutionFile: File, criteria: string): Promise<{ score: number, feedback: string }> {
     try {
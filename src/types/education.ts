@@ -7,7 +7,7 @@ export interface Subject {
   imageUrl?: string;
 }
 
-export type AssignmentStatus = "upcoming" | "submitted" | "graded";
+export type AssignmentStatus = "upcoming" | "closed" | "submitted" | "graded";
 export type AssignmentType = "homework" | "exam" | "quiz";
 
 export interface Assignment {
@@ -25,6 +25,7 @@ export interface Assignment {
   files?: string[];
   submissions?: Submission[];
   appealDeadline?: string;
+  closedAt?: string;
   hasAppeal?: boolean;
 }
 
@@ -41,6 +42,10 @@ export interface Submission {
   grade?: number;
   feedback?: string;
   appeal?: Appeal;
+  needsReview?: boolean;
+  reviewReason?: string;
+  textExtraction?: Record<string, unknown>;
+  imageHashes?: Record<string, unknown>;
 }
 
 export type AppealStatus = "pending" | "reviewed";